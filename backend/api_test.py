@@ -100,11 +100,6 @@ except requests.RequestException as e:
 
 # Step 5: Perform synchronization with live audio frames
 synchronization_url = f"{BASE_URL}/synchronization"
-headers = {"Content-Type": "application/json", "session-token": session_token}
-
-soloist_times = []
-estimated_times = []
-accompanist_times = []
 
 # Load the solo audio file using librosa
 source_file = os.path.join(
@@ -116,29 +111,74 @@ source_file = os.path.join(
 )
 source_audio, sample_rate = librosa.load(source_file, sr=44100)
 
-accompanist_time = 0
-
-input("Press Enter to start the performance")
-
-for i in range(0, source_audio.shape[-1], 8192):
-    frames = source_audio[i : i + 8192].tolist()
-    soloist_time = i / sample_rate
-    payload = {"frames": frames, "timestamp": accompanist_time}
-    try:
-        response = requests.post(synchronization_url, headers=headers, json=payload)
-        if response.status_code == 200:
-            playback_rate = response.json().get("playback_rate")
-            estimated_time = response.json().get("estimated_position")
-            accompanist_time += playback_rate * 8192 / sample_rate
 
-            soloist_times.append(soloist_time)
-            estimated_times.append(estimated_time)
-            accompanist_times.append(accompanist_time)
+def post_json(frames, accompanist_time):
+    """Send the frames as a JSON list of samples."""
+    payload = {"frames": frames.tolist(), "timestamp": accompanist_time}
+    return requests.post(
+        synchronization_url,
+        headers={"Content-Type": "application/json", "session-token": session_token},
+        json=payload,
+    )
+
+
+def post_binary(frames, accompanist_time):
+    """Send the frames as raw little-endian float32 samples."""
+    return requests.post(
+        synchronization_url,
+        headers={
+            "Content-Type": "application/octet-stream",
+            "session-token": session_token,
+            "X-Sample-Format": "float32",
+            "X-Timestamp": str(accompanist_time),
+        },
+        data=frames.astype("<f4").tobytes(),
+    )
+
+
+def perform(post):
+    """Stream the solo audio through `post` and print the synchronization results."""
+    soloist_times = []
+    estimated_times = []
+    accompanist_times = []
+    accompanist_time = 0
+
+    for i in range(0, source_audio.shape[-1], 8192):
+        frames = source_audio[i : i + 8192]
+        soloist_time = i / sample_rate
+        try:
+            response = post(frames, accompanist_time)
+            if response.status_code == 200:
+                playback_rate = response.json().get("playback_rate")
+                estimated_time = response.json().get("estimated_position")
+                accompanist_time += playback_rate * 8192 / sample_rate
+
+                soloist_times.append(soloist_time)
+                estimated_times.append(estimated_time)
+                accompanist_times.append(accompanist_time)
+
+                print(
+                    f"Soloist time: {soloist_time:.2f}, Estimated time: {estimated_time:.2f}, Accompanist time: {accompanist_time:.2f}, Playback rate: {playback_rate:.2f}"
+                )
+            else:
+                print(f"Error: {response.status_code}, Message: {response.text}")
+        except requests.RequestException as e:
+            print(f"Exception occurred while calling synchronization: {e}")
+
+
+input("Press Enter to start the performance (JSON frames)")
+perform(post_json)
+
+# Step 6: Perform again, sending the frames as binary audio
+# Synthesizing again gives the session a new synchronizer
+try:
+    audio_response = requests.get(synthesize_audio_url, headers=headers)
+    if audio_response.status_code != 200:
+        print(
+            f"Failed to synthesize audio. Status code: {audio_response.status_code}, Message: {audio_response.text}"
+        )
+except requests.RequestException as e:
+    print(f"Exception occurred while synthesizing audio: {e}")
 
-            print(
-                f"Soloist time: {soloist_time:.2f}, Estimated time: {estimated_time:.2f}, Accompanist time: {accompanist_time:.2f}, Playback rate: {playback_rate:.2f}"
-            )
-        else:
-            print(f"Error: {response.status_code}, Message: {response.text}")
-    except requests.RequestException as e:
-        print(f"Exception occurred while calling synchronization: {e}")
+input("Press Enter to start the performance (binary frames)")
+perform(post_binary)
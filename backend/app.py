@@ -1,6 +1,12 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
 import os
+import gzip
+import json
+import struct
+import threading
 from flask_cors import CORS
 import librosa
 import numpy as np
@@ -8,31 +14,324 @@ import io
 import base64
 import soundfile as sf
 import secrets
-from src.audio_generator import AudioGenerator
+from src.feature_registry import FeatureRegistry
+from src.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    MetricsRegistry,
+    process_cpu_seconds,
+    process_resident_memory_bytes,
+)
+from src.render_cache import RenderCache
+from src.score_catalogue import ScoreCatalogue
+from src.session_store import SessionStore
 from src.synchronizer import Synchronizer
+from src.synthesis_jobs import SynthesisJob, SynthesisJobQueue, render_instruments
+from src.warmup import Warmup
+from src import tracing
 import sys
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes and origins
+sock = Sock(app)
 
 BASE_DIR = os.path.dirname(
     os.path.abspath(__file__)
 )  # setting a constant base directory
 MUSICXML_FOLDER = os.path.join(BASE_DIR, "data", "musicxml")
-SESSIONS = {}
+SCORE_CATALOGUE = ScoreCatalogue(
+    MUSICXML_FOLDER, index_path=os.path.join(BASE_DIR, "data", "cache", "scores.json")
+)
+SOUNDFONT_PATH = os.path.join(BASE_DIR, "soundfonts", "FluidR3_GM.sf2")
+SAMPLE_RATE = 44100
+
+# Client sessions, removed after SESSION_TTL seconds without a request or, least
+# recently used first, when their combined footprint exceeds SESSION_MAX_BYTES
+SESSION_TTL = float(os.environ.get("SESSION_TTL", 1800))
+SESSION_MAX_BYTES = int(os.environ.get("SESSION_MAX_BYTES", 4 * 1024**3))
+SESSIONS = SessionStore(ttl=SESSION_TTL, max_bytes=SESSION_MAX_BYTES)
+SESSIONS.start_reaper(interval=60)
+
+# Token required by the /admin endpoints. If unset, they only answer local requests.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+# Span tracing of the alignment hot paths, off unless TRACE=1 (see /admin/trace)
+if os.environ.get("TRACE") == "1":
+    tracing.enable(int(os.environ.get("TRACE_CAPACITY", tracing.DEFAULT_CAPACITY)))
+
+# Rendered instrument audio shared by all sessions, keyed by score content and settings
+RENDER_CACHE_MAX_BYTES = 2 * 1024**3
+RENDER_CACHE_DIR = os.path.join(BASE_DIR, "data", "cache", "renders")
+RENDER_CACHE = RenderCache(RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES)
+
+# Settings of the synchronizer created for each session
+SYNCHRONIZER_SETTINGS = dict(
+    Kp=0.05,
+    Ki=0.0,
+    Kd=0.0,
+    sample_rate=SAMPLE_RATE,
+    channels=1,
+    win_length=8192,
+    hop_length=2048,
+    c=50,
+    min_c=10,
+    max_run_count=3,
+    diag_weight=0.4,
+    silence_threshold=-60,
+    catch_up_latency=0.25,  # Narrow the OTW search above this latency (seconds)
+    drop_latency=1.0,  # Stop analysing stale audio above this latency (seconds)
+    # OTW keeps the costs of the last 512 live windows (about 24 s of audio), about
+    # 10 MB for a 3-minute score instead of 300 MB for the whole performance
+    max_history=512,
+    on_deadline_miss=lambda record: DEADLINE_MISSES.inc(mode=record["mode"]),
+)
+
+# Frozen reference features shared by all sessions that use the same reference audio.
+# With SHARED_FEATURES=1 they are kept in shared memory for all server processes.
+FEATURE_REGISTRY = FeatureRegistry(
+    shared_memory=os.environ.get("SHARED_FEATURES") == "1",
+    cache_dir=os.path.join(BASE_DIR, "data", "cache", "features"),
+)
+
+# Background rendering and reference feature extraction for /synthesis-jobs
+SYNTHESIS_WORKERS = int(os.environ.get("SYNTHESIS_WORKERS", 2))
+SYNTHESIS_JOBS = SynthesisJobQueue(
+    RENDER_CACHE_DIR,
+    RENDER_CACHE_MAX_BYTES,
+    SOUNDFONT_PATH,
+    SAMPLE_RATE,
+    SYNCHRONIZER_SETTINGS["win_length"],
+    SYNCHRONIZER_SETTINGS["hop_length"],
+    max_workers=SYNTHESIS_WORKERS,
+    feature_registry=FEATURE_REGISTRY,
+    render_cache=RENDER_CACHE,
+)
+
+# Renders every score at these tempos and caches its reference features at startup
+WARMUP_TEMPOS = [
+    int(tempo) for tempo in os.environ.get("WARMUP_TEMPOS", "100,120").split(",") if tempo
+]
+WARMUP = Warmup(
+    MUSICXML_FOLDER,
+    WARMUP_TEMPOS,
+    RENDER_CACHE,
+    FEATURE_REGISTRY,
+    SOUNDFONT_PATH,
+    SAMPLE_RATE,
+    SYNCHRONIZER_SETTINGS["win_length"],
+    SYNCHRONIZER_SETTINGS["hop_length"],
+    max_workers=int(os.environ.get("WARMUP_WORKERS", 1)),
+)
+
+# Little-endian PCM sample formats accepted by /synchronization as raw bytes
+PCM_FORMATS = {"float32": np.dtype("<f4"), "int16": np.dtype("<i2")}
+
+# Little-endian float64 player timestamp that prefixes each binary /stream message
+STREAM_TIMESTAMP = struct.Struct("<d")
+
+# Largest number of chunks accepted in one batched /synchronization request
+MAX_BATCH_CHUNKS = 64
+
+# Prometheus metrics served on /metrics
+METRICS = MetricsRegistry()
+STEP_SECONDS = METRICS.histogram(
+    "companion_step_seconds",
+    "Time spent per synchronization request in each stage of Synchronizer.step",
+    ["stage"],
+)
+OTW_EFFECTIVE_C = METRICS.histogram(
+    "companion_otw_effective_c",
+    "Width of the OTW search window used by each synchronization request",
+    buckets=(5, 10, 15, 20, 25, 30, 40, 50, 75, 100),
+)
+DECODE_SECONDS = METRICS.histogram(
+    "companion_decode_seconds",
+    "Time spent decoding the audio of a synchronization request",
+)
+STEP_MODES = METRICS.counter(
+    "companion_synchronization_requests_total",
+    "Synchronization requests by how the synchronizer processed them",
+    ["mode"],
+)
+DEADLINE_MISSES = METRICS.counter(
+    "companion_deadline_misses_total",
+    "Synchronization steps that took longer than the audio they processed, by mode",
+    ["mode"],
+)
+METRICS.gauge(
+    "companion_active_sessions",
+    "Number of active sessions",
+    function=lambda: len(SESSIONS),
+)
+METRICS.gauge(
+    "companion_session_bytes",
+    "Memory held by each session, excluding shared reference features",
+    ["session"],
+    function=lambda: {(s["session"],): s["nbytes"] for s in SESSIONS.snapshot()},
+)
+METRICS.counter(
+    "companion_session_evictions_total",
+    "Sessions removed to stay within the memory budget",
+    function=lambda: SESSIONS.evictions,
+)
+METRICS.counter(
+    "companion_session_expirations_total",
+    "Sessions removed after being idle for too long",
+    function=lambda: SESSIONS.expirations,
+)
+METRICS.counter(
+    "companion_cache_hits_total",
+    "Lookups served from the render cache or the reference feature registry",
+    ["cache"],
+    function=lambda: {
+        ("render",): RENDER_CACHE.hits,
+        ("features",): FEATURE_REGISTRY.hits,
+    },
+)
+METRICS.counter(
+    "companion_cache_misses_total",
+    "Lookups that had to render audio or compute reference features",
+    ["cache"],
+    function=lambda: {
+        ("render",): RENDER_CACHE.misses,
+        ("features",): FEATURE_REGISTRY.misses,
+    },
+)
+METRICS.gauge(
+    "companion_synthesis_jobs",
+    "Synthesis jobs by status; the queue is made of queued, rendering and "
+    "extracting_features jobs",
+    ["status"],
+    function=lambda: {
+        (status,): count for status, count in SYNTHESIS_JOBS.status_counts().items()
+    },
+)
+METRICS.counter(
+    "process_cpu_seconds_total",
+    "User and system CPU time of the server process",
+    function=process_cpu_seconds,
+)
+METRICS.gauge(
+    "process_resident_memory_bytes",
+    "Resident memory of the server process",
+    function=process_resident_memory_bytes,
+)
+
+
+def observe_step(synchronizer: Synchronizer):
+    """Record the stage timings, OTW width and mode of the latest synchronizer step."""
+    for stage, seconds in synchronizer.timings.items():
+        STEP_SECONDS.observe(seconds, stage=stage)
+    OTW_EFFECTIVE_C.observe(synchronizer.effective_c)
+    STEP_MODES.inc(mode=synchronizer.mode)
 
 
 def generate_session_token():
     return secrets.token_hex(32)  # Generates a 64-character hexadecimal string
 
 
+def cacheable_response(data: bytes, mimetype: str, etag: str, gzipped: bytes = None):
+    """Build a response that honours If-None-Match and is gzipped if the client accepts it.
+
+    Clients must revalidate with the ETag before reusing a cached copy.
+    """
+    if request.accept_encodings["gzip"]:
+        response = Response(
+            gzipped if gzipped is not None else gzip.compress(data, mtime=0),
+            mimetype=mimetype,
+        )
+        response.headers["Content-Encoding"] = "gzip"
+        response.set_etag(f"{etag}-gzip")  # Each encoding needs its own strong ETag
+    else:
+        response = Response(data, mimetype=mimetype)
+        response.set_etag(etag)
+    response.vary.add("Accept-Encoding")
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def send_accompaniment(accompaniment_path):
+    response = send_file(accompaniment_path, mimetype="audio/wav")
+    response.headers["X-Sample-Rate"] = SAMPLE_RATE  # Add the sample rate as a custom header
+    return response
+
+
+def decode_pcm(data: bytes, sample_format: str) -> np.ndarray:
+    """Decode raw little-endian PCM bytes into float32 samples in [-1, 1].
+
+    float32 input is wrapped without copying; int16 input is scaled to float32.
+    Raises ValueError for an unknown format or a truncated sample.
+    """
+    dtype = PCM_FORMATS.get(sample_format)
+    if dtype is None:
+        raise ValueError(f"Unsupported sample format: {sample_format}")
+    if len(data) % dtype.itemsize != 0:
+        raise ValueError("Audio data is not a whole number of samples")
+
+    frames = np.frombuffer(data, dtype=dtype)
+    if dtype.kind == "i":
+        frames = frames.astype(np.float32) / 32768.0
+    return frames
+
+
+def parse_synchronization_chunks():
+    """Return the audio chunks and timestamps of a /synchronization request.
+
+    The body holds either one chunk or a batch of consecutive chunks, as JSON
+    (`{"frames", "timestamp"}` or `{"chunks": [{"frames", "timestamp"}, ...]}`) or as
+    raw PCM with an `X-Timestamp` header, or an `X-Timestamps` header listing one
+    timestamp per equal-length chunk. Raises ValueError for a malformed body.
+
+    Returns
+    -------
+    chunks : List[np.ndarray]
+        Audio frames of each chunk, shaped (1, n)
+    timestamps : List[float]
+        Accompanist time when each chunk was sent
+    batched : bool
+        Whether the request used the batch format
+    """
+    if request.mimetype == "application/octet-stream":
+        frames = decode_pcm(
+            request.get_data(), request.headers.get("X-Sample-Format", "float32")
+        )
+        batched = "X-Timestamps" in request.headers
+        if batched:
+            timestamps = [float(t) for t in request.headers["X-Timestamps"].split(",")]
+            if len(frames) % len(timestamps) != 0:
+                raise ValueError("Audio data does not split into one chunk per timestamp")
+            chunks = np.split(frames, len(timestamps))
+        else:
+            if "X-Timestamp" not in request.headers:
+                raise ValueError("Missing X-Timestamp header")
+            timestamps = [float(request.headers["X-Timestamp"])]
+            chunks = [frames]
+    elif request.is_json:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        batched = "chunks" in data
+        items = data["chunks"] if batched else [data]
+        if not isinstance(items, list) or not all(isinstance(i, dict) for i in items):
+            raise ValueError("Expected a list of chunks")
+        if any(i.get("frames") is None or i.get("timestamp") is None for i in items):
+            raise ValueError("Each chunk needs frames and a timestamp")
+        chunks = [np.asarray(item["frames"], np.float32) for item in items]
+        timestamps = [float(item["timestamp"]) for item in items]
+    else:
+        raise ValueError("Unsupported content type")
+
+    if not chunks or len(chunks) > MAX_BATCH_CHUNKS:
+        raise ValueError(f"Expected between 1 and {MAX_BATCH_CHUNKS} chunks")
+    return [chunk.reshape((1, -1)) for chunk in chunks], timestamps, batched
+
+
 @app.route("/start-session", methods=["POST"])
 def start_session():
     try:
         # Generate a new session token
         session_token = generate_session_token()
-        # Create a new session entry in the SESSIONS dictionary
-        SESSIONS[session_token] = {}
+        # Create a new session entry in the session store
+        SESSIONS.create(session_token)
         # Return the session token to the client
         return jsonify({"session_token": session_token}), 200
     except Exception as e:
@@ -42,8 +341,17 @@ def start_session():
 @app.route("/scores", methods=["GET"])
 def get_scores():
     try:
-        files = [f for f in os.listdir(MUSICXML_FOLDER) if f.endswith(".musicxml")]
-        return jsonify({"files": files}), 200
+        scores = [
+            {
+                key: entry[key]
+                for key in ("filename", "size", "sha256", "metadata", "error")
+            }
+            for entry in SCORE_CATALOGUE.scores()
+        ]
+        body = json.dumps(
+            {"files": [score["filename"] for score in scores], "scores": scores}
+        ).encode("utf-8")
+        return cacheable_response(body, "application/json", SCORE_CATALOGUE.etag)
     except Exception as e:
         return str(e), 500
 
@@ -53,11 +361,17 @@ def get_score(filename):
     # session_token = request.headers.get('session-token')
     # SESSIONS[session_token]['filename'] = filename
     try:
-        file_path = os.path.join(MUSICXML_FOLDER, filename)
-        if os.path.exists(file_path):
-            return send_file(file_path, mimetype="application/xml"), 200
-        else:
+        # Only indexed scores are served, so the filename cannot escape the folder
+        entry = SCORE_CATALOGUE.get(filename)
+        if entry is None:
             return "File not found", 404
+
+        if request.accept_encodings["gzip"]:
+            data, gzipped = None, SCORE_CATALOGUE.gzipped(filename)
+        else:
+            with open(SCORE_CATALOGUE.path(filename), "rb") as f:
+                data, gzipped = f.read(), None
+        return cacheable_response(data, "application/xml", entry["sha256"], gzipped)
     except Exception as e:
         return str(e), 500
 
@@ -77,35 +391,27 @@ def synthesize_audio(filename, tempo):
     if not os.path.exists(file_path):
         return "MusicXML file not found", 404
 
-    SESSIONS[session_token]["filename"] = filename
+    SESSIONS.set(session_token, "filename", filename)
 
-    generator = AudioGenerator(file_path)
-    output_dir = os.path.join(
-        BASE_DIR, "data", "audio", filename.replace(".musicxml", "")
+    # Solo (reference) and accompaniment audio, served from the render cache if possible
+    reference, accompaniment_path = render_instruments(
+        RENDER_CACHE, file_path, tempo, SOUNDFONT_PATH, SAMPLE_RATE, (0, 1)
     )
-    print(output_dir)
-    generator.generate_audio(output_dir, tempo)
-    # Create a synchronizer object
-    reference = os.path.join(output_dir, "instrument_0.wav")
 
+    # Create a synchronizer object around the shared reference features
+    ref_features = FEATURE_REGISTRY.get(
+        reference,
+        SAMPLE_RATE,
+        SYNCHRONIZER_SETTINGS["win_length"],
+        SYNCHRONIZER_SETTINGS["hop_length"],
+    )
     synchronizer = Synchronizer(
-        reference=reference,
-        Kp=0.05,
-        Ki=0.0,
-        Kd=0.0,
-        sample_rate=44100,
-        channels=1,
-        win_length=8192,
-        hop_length=2048,
-        c=50,
-        max_run_count=3,
-        diag_weight=0.4,
+        reference=str(reference), ref_features=ref_features, **SYNCHRONIZER_SETTINGS
     )
-    # Store the synchronizer in the SESSIONS dictionary
-    SESSIONS[session_token]["synchronizer"] = synchronizer
+    # Store the synchronizer in the session store
+    SESSIONS.set(session_token, "synchronizer", synchronizer)
 
     # Return the accompaniment audio data to the client
-    accompaniment_path = os.path.join(output_dir, "instrument_1.wav")
     # accompaniment, sr = librosa.load(os.path.join(output_dir, 'instrument_1.wav'), sr=44100, mono=True, dtype=np.float32)
     # accompaniment = accompaniment.tolist()
     # print(accompaniment)
@@ -123,9 +429,97 @@ def synthesize_audio(filename, tempo):
     #     "audio_data" : accompaniment,
     #     "sr" : sr
     # }
-    response = send_file(accompaniment_path, mimetype="audio/wav")
-    response.headers["X-Sample-Rate"] = 44100  # Add the sample rate as a custom header
-    return response, 200
+    return send_accompaniment(accompaniment_path), 200
+
+
+@app.route("/synthesis-jobs", methods=["POST"])
+def submit_synthesis_job():
+    session_token = request.headers.get("session-token")
+    if not session_token or session_token not in SESSIONS:
+        return "Missing or invalid session token", 401
+
+    data = request.get_json(silent=True) or {}
+    filename = data.get("filename")
+    tempo = data.get("tempo")
+    if not isinstance(filename, str) or not isinstance(tempo, int) or tempo <= 0:
+        return "Expected a JSON body with a filename and a positive integer tempo", 400
+
+    # Only indexed scores are rendered, so the filename cannot escape the folder
+    if SCORE_CATALOGUE.get(filename) is None:
+        return "MusicXML file not found", 404
+    file_path = SCORE_CATALOGUE.path(filename)
+
+    job = SYNTHESIS_JOBS.submit(session_token, file_path, filename, tempo)
+    SESSIONS.set(session_token, "filename", filename)
+    SESSIONS.set(session_token, "synthesis_job", job.job_id)
+
+    response = jsonify(job.to_dict())
+    response.headers["Location"] = f"/synthesis-jobs/{job.job_id}"
+    return response, 202
+
+
+def get_session_job(job_id):
+    """Return the job `job_id` if it belongs to the requesting session, else None."""
+    job = SYNTHESIS_JOBS.get(job_id)
+    if job is None or job.session_token != request.headers.get("session-token"):
+        return None
+    return job
+
+
+@app.route("/synthesis-jobs/<job_id>", methods=["GET"])
+def get_synthesis_job(job_id):
+    job = get_session_job(job_id)
+    if job is None:
+        return "Job not found", 404
+    return jsonify(job.to_dict()), 200
+
+
+@app.route("/synthesis-jobs/<job_id>/events", methods=["GET"])
+def stream_synthesis_job(job_id):
+    job = get_session_job(job_id)
+    if job is None:
+        return "Job not found", 404
+
+    def events():
+        # Server-sent events: one message per status change, ending when the job finishes
+        status = None
+        while True:
+            current = job.to_dict()
+            if current["status"] != status:
+                status = current["status"]
+                yield f"data: {json.dumps(current)}\n\n"
+            if status in (SynthesisJob.DONE, SynthesisJob.FAILED):
+                break
+            job.wait(timeout=1.0)
+
+    return Response(events(), mimetype="text/event-stream")
+
+
+@app.route("/synthesis-jobs/<job_id>/result", methods=["GET"])
+def get_synthesis_job_result(job_id):
+    job = get_session_job(job_id)
+    if job is None:
+        return "Job not found", 404
+    if job.status == SynthesisJob.FAILED:
+        return f"Synthesis failed: {job.error}", 500
+    if job.status != SynthesisJob.DONE:
+        return jsonify(job.to_dict()), 409
+
+    session = SESSIONS.get(job.session_token)
+    if session is None:
+        return "Missing or invalid session token", 401
+
+    # The reference features were prepared by the job, so this is cheap
+    if session.get("synchronizer_job") != job.job_id:
+        synchronizer = Synchronizer(
+            reference=str(job.reference_path),
+            ref_features=job.ref_features,
+            **SYNCHRONIZER_SETTINGS,
+        )
+        SESSIONS.set(job.session_token, "synchronizer", synchronizer)
+        SESSIONS.set(job.session_token, "synchronizer_job", job.job_id)
+
+    return send_accompaniment(job.accompaniment_path), 200
 
 
 @app.route("/synchronization", methods=["POST"])
@@ -135,7 +529,7 @@ def synchronization():
     if not session_token:
         return "Missing or invalid session token", 401
 
-    # Retrieve the session data from the SESSIONS dictionary
+    # Retrieve the session data from the session store
     session_data = SESSIONS.get(session_token)
     if not session_data:
         return "Session not found or expired", 404
@@ -148,26 +542,101 @@ def synchronization():
         return "Synchronizer not found", 404
 
     # Parse the incoming data
-    if not request.is_json:
-        return "Invalid request data", 400
-
-    data = request.get_json()
-    frames = data.get("frames")
-    timestamp = data.get("timestamp")
-
-    if frames is None or timestamp is None:
+    try:
+        with DECODE_SECONDS.time():
+            chunks, timestamps, batched = parse_synchronization_chunks()
+    except (TypeError, ValueError):
         return "Invalid request data", 400
 
-    frames = np.asarray(frames, np.float32)
-    frames = frames.reshape((1, -1))
-    print(frames.shape)
-    print(timestamp)
-    playback_rate, estimated_position = synchronizer.step(frames, timestamp)
+    if not batched:
+        playback_rate, estimated_position = synchronizer.step(chunks[0], timestamps[0])
+        observe_step(synchronizer)
+        return jsonify(
+            {
+                "playback_rate": playback_rate,
+                "estimated_position": estimated_position,
+                "mode": synchronizer.mode,
+                "latency": synchronizer.latency,
+            }
+        ), 200
+
+    # Batch of chunks: step through all of them, report each result and the latest
+    results = synchronizer.step_batch(chunks, timestamps)
+    observe_step(synchronizer)
+    playback_rate, estimated_position = results[-1]
     return jsonify(
-        {"playback_rate": playback_rate, "estimated_position": estimated_position}
+        {
+            "playback_rate": playback_rate,
+            "estimated_position": estimated_position,
+            "mode": synchronizer.mode,
+            "latency": synchronizer.latency,
+            "results": [
+                {"playback_rate": rate, "estimated_position": position}
+                for rate, position in results
+            ],
+        }
     ), 200
 
 
+@sock.route("/stream")
+def stream(ws):
+    """Persistent alternative to /synchronization for one session.
+
+    The client sends binary messages made of a float64 player timestamp followed
+    by raw PCM frames (format given by the `sample_format` query parameter). The
+    server answers each one with a JSON text message holding the playback rate and
+    estimated position as soon as the synchronizer has stepped.
+    """
+    # Browsers cannot set headers on WebSockets, so also accept a query parameter
+    session_token = request.headers.get("session-token") or request.args.get(
+        "session_token"
+    )
+    session_data = SESSIONS.get(session_token) if session_token else None
+    if not session_data or not session_data.get("synchronizer"):
+        ws.close(reason=1008, message="Session or synchronizer not found")
+        return
+
+    synchronizer: Synchronizer = session_data["synchronizer"]
+    sample_format = request.args.get("sample_format", "float32")
+
+    try:
+        while SESSIONS.get(session_token) is not None:  # Keeps the session alive
+            message = ws.receive()
+            if (
+                not isinstance(message, (bytes, bytearray))
+                or len(message) < STREAM_TIMESTAMP.size
+            ):
+                ws.send(json.dumps({"error": "Invalid request data"}))
+                continue
+
+            try:
+                with DECODE_SECONDS.time():
+                    (timestamp,) = STREAM_TIMESTAMP.unpack_from(message)
+                    frames = decode_pcm(
+                        memoryview(message)[STREAM_TIMESTAMP.size :], sample_format
+                    )
+            except ValueError as e:
+                ws.send(json.dumps({"error": str(e)}))
+                continue
+
+            playback_rate, estimated_position = synchronizer.step(
+                frames.reshape((1, -1)), timestamp
+            )
+            observe_step(synchronizer)
+            ws.send(
+                json.dumps(
+                    {
+                        "playback_rate": float(playback_rate),
+                        "estimated_position": float(estimated_position),
+                        "mode": synchronizer.mode,
+                        "latency": synchronizer.latency,
+                    }
+                )
+            )
+    except ConnectionClosed:
+        pass
+
+
 @app.route("/stop-session", methods=["POST"])
 def stop_session():
     # Get the session token from the request headers
@@ -176,14 +645,131 @@ def stop_session():
         return "Missing or invalid session token", 401
 
     try:
-        # Remove the session data from the SESSIONS dictionary
-        if session_token in SESSIONS:
-            del SESSIONS[session_token]
+        # Remove the session data from the session store, closing its synchronizer
+        SESSIONS.remove(session_token)
 
         return "Session stopped", 200
     except Exception as e:
         return str(e), 500
 
 
+def check_admin():
+    """Return an error response if the request may not use the /admin endpoints, else None."""
+    if ADMIN_TOKEN is not None:
+        if not secrets.compare_digest(
+            request.headers.get("admin-token", ""), ADMIN_TOKEN
+        ):
+            return "Missing or invalid admin token", 401
+    elif request.remote_addr not in ("127.0.0.1", "::1"):
+        return "Forbidden", 403
+    return None
+
+
+@app.route("/admin/sessions", methods=["GET"])
+def admin_sessions():
+    error = check_admin()
+    if error:
+        return error
+
+    return jsonify(
+        {
+            "sessions": SESSIONS.snapshot(),
+            "count": len(SESSIONS),
+            "nbytes": SESSIONS.nbytes(),
+            "max_bytes": SESSIONS.max_bytes,
+            "ttl": SESSIONS.ttl,
+            "evictions": SESSIONS.evictions,
+            "expirations": SESSIONS.expirations,
+            "reference_features": {
+                "count": len(FEATURE_REGISTRY),
+                "nbytes": FEATURE_REGISTRY.nbytes(),
+                "shared_memory": FEATURE_REGISTRY.shared_memory,
+            },
+        }
+    ), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Serve the metrics in the Prometheus text format, for a local scraper."""
+    error = check_admin()
+    if error:
+        return error
+
+    return Response(METRICS.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route("/admin/trace", methods=["GET", "POST"])
+def admin_trace():
+    """Download the recorded spans as a Chrome trace, or start and stop tracing."""
+    error = check_admin()
+    if error:
+        return error
+
+    if request.method == "GET":
+        return jsonify(tracing.TRACER.chrome_trace()), 200
+
+    data = request.get_json(silent=True) or {}
+    capacity = data.get("capacity")
+    if capacity is not None and (not isinstance(capacity, int) or capacity < 1):
+        return "capacity must be a positive integer", 400
+    if data.get("clear"):
+        tracing.TRACER.clear()
+    if data.get("enabled", True):
+        tracing.TRACER.enable(capacity)
+    else:
+        tracing.TRACER.disable()
+    return jsonify(
+        {
+            "enabled": tracing.TRACER.enabled,
+            "capacity": tracing.TRACER.capacity,
+            "spans": len(tracing.TRACER),
+        }
+    ), 200
+
+
+@app.route("/admin/warmup", methods=["GET", "POST"])
+def admin_warmup():
+    error = check_admin()
+    if error:
+        return error
+
+    # POST starts a new pass, e.g. after scores were added
+    if request.method == "POST" and not WARMUP.start():
+        return jsonify(WARMUP.progress()), 409
+    return jsonify(WARMUP.progress()), 202 if request.method == "POST" else 200
+
+
+_background_tasks_started = False
+_background_tasks_lock = threading.Lock()
+
+
+def start_background_tasks():
+    """
+    Index the scores and warm up in the background, once per process.
+
+    WARMUP_ON_START=0 skips them, e.g. for the in-process load test.
+    """
+    global _background_tasks_started
+    if os.environ.get("WARMUP_ON_START", "1") == "0":
+        return
+    with _background_tasks_lock:
+        if _background_tasks_started:
+            return
+        _background_tasks_started = True
+    threading.Thread(target=SCORE_CATALOGUE.refresh, daemon=True).start()
+    WARMUP.start()
+
+
+@app.before_request
+def ensure_background_tasks():
+    # Started by the first request of every server process (flask run, gunicorn
+    # workers) rather than on import, so importing the app renders nothing
+    start_background_tasks()
+
+
 if __name__ == "__main__":
+    # The reloader runs the server in a child process; warm up only there
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_tasks()
     app.run(debug=True, host="0.0.0.0")
@@ -0,0 +1,395 @@
+"""
+Benchmarks of the alignment and audio hot paths.
+
+Times feature extraction (streaming and batch) for each Features subclass, OTW
+updates at several search widths and piece lengths (and once with span tracing
+enabled, to show its overhead), the phase vocoder at several playback rates,
+calculate_warped_times and AudioGenerator rendering. Fixtures are
+synthesized from the bundled MIDI files with sine tones, so they are identical on
+every machine. Results can be written as JSON and compared against a stored
+baseline; the script exits with status 1 if a benchmark got slower than the
+baseline by more than --threshold. Run from the backend directory.
+
+Example:
+    python benchmark.py --save-baseline benchmark_baseline.json
+    python benchmark.py --baseline benchmark_baseline.json --output results.json
+"""
+
+import argparse
+import gc
+import importlib
+import json
+import os
+import platform
+import subprocess
+import tempfile
+from datetime import datetime
+from time import perf_counter
+
+import numpy as np
+import pretty_midi
+import soundfile as sf
+
+from src.features_cens import CENSFeatures
+from src.features_f0 import F0Features
+from src.features_mel_spec import MelSpecFeatures
+from src.otw import OnlineTimeWarping
+from src import tracing
+
+# Settings of the server's synchronizer
+SAMPLE_RATE = 44100
+WIN_LENGTH = 8192
+HOP_LENGTH = 2048
+MAX_RUN_COUNT = 3
+DIAG_WEIGHT = 0.4
+
+REFERENCE_MIDI = os.path.join("data", "midi", "ode_to_joy_baseline.mid")
+LIVE_MIDI = os.path.join("data", "midi", "ode_to_joy_altered.mid")
+SOUNDFONT = os.path.join("soundfonts", "FluidR3_GM.sf2")
+
+# Features subclasses and their window lengths. F0Features holds a fixed number of
+# yin frames (FEATURE_LEN), which matches 4096-sample windows as used by main.py
+FEATURE_CLASSES = (
+    (CENSFeatures, WIN_LENGTH),
+    (MelSpecFeatures, WIN_LENGTH),
+    (F0Features, 4096),
+)
+OTW_WIDTHS = (10, 50, 100)
+PIECE_SECONDS = (30, 120)
+PLAYBACK_RATES = (0.5, 1.0, 1.5, 2.0)
+
+
+class SkipBenchmark(Exception):
+    """Raised by a benchmark's setup when it cannot run on this machine."""
+
+
+def import_or_skip(module: str, name: str):
+    """Return `name` from `module`, or skip the benchmark if it cannot be imported."""
+    try:
+        return getattr(importlib.import_module(module), name)
+    except ImportError as e:
+        raise SkipBenchmark(str(e))
+
+
+class Fixtures:
+    """Audio and features shared by the benchmarks, built on first use."""
+
+    def __init__(self, tmp_dir):
+        self.tmp_dir = tmp_dir
+        self._cache = {}
+
+    def _cached(self, key, make):
+        if key not in self._cache:
+            self._cache[key] = make()
+        return self._cache[key]
+
+    def audio(self, midi_path, seconds):
+        """Sine-tone rendering of `midi_path`, looped to `seconds`."""
+
+        def make():
+            y = pretty_midi.PrettyMIDI(midi_path).synthesize(fs=SAMPLE_RATE)
+            y = np.tile(y, int(np.ceil(seconds * SAMPLE_RATE / len(y))))
+            return y[: int(seconds * SAMPLE_RATE)].astype(np.float32)
+
+        return self._cached(("audio", midi_path, seconds), make)
+
+    def wav(self, midi_path, seconds):
+        """Path of a WAV file holding `audio(midi_path, seconds)`."""
+
+        def make():
+            path = os.path.join(
+                self.tmp_dir, f"{os.path.basename(midi_path)}_{seconds}.wav"
+            )
+            sf.write(path, self.audio(midi_path, seconds), SAMPLE_RATE)
+            return path
+
+        return self._cached(("wav", midi_path, seconds), make)
+
+    def features(self, midi_path, seconds, features_cls=CENSFeatures):
+        return self._cached(
+            ("features", midi_path, seconds, features_cls),
+            lambda: features_cls.from_audio(
+                self.audio(midi_path, seconds), SAMPLE_RATE, WIN_LENGTH, HOP_LENGTH
+            ).freeze(),
+        )
+
+    def note_onsets(self, midi_path, seconds):
+        """Onset times of the notes of `midi_path`, looped to `seconds`."""
+        midi = pretty_midi.PrettyMIDI(midi_path)
+        onsets = np.array(sorted(n.start for i in midi.instruments for n in i.notes))
+        length = midi.get_end_time()
+        loops = int(np.ceil(seconds / length))
+        onsets = np.concatenate([onsets + k * length for k in range(loops)])
+        return onsets[onsets < seconds]
+
+
+def windows(audio, win_length=WIN_LENGTH):
+    """Split `audio` into the windows the score follower would analyse."""
+    num_windows = (len(audio) - win_length) // HOP_LENGTH + 1
+    return [
+        audio[m * HOP_LENGTH : m * HOP_LENGTH + win_length] for m in range(num_windows)
+    ]
+
+
+def features_stream(fixtures, features_cls, win_length):
+    audio_windows = windows(fixtures.audio(LIVE_MIDI, 30), win_length)
+
+    def setup():
+        features = features_cls(SAMPLE_RATE, win_length, len(audio_windows))
+
+        def run():
+            for window in audio_windows:
+                features.insert(window)
+
+        return run, len(audio_windows)
+
+    return setup
+
+
+def features_batch(fixtures, features_cls, win_length):
+    audio = fixtures.audio(LIVE_MIDI, 30)
+    num_windows = len(windows(audio, win_length))
+
+    def setup():
+        def run():
+            features_cls.from_audio(audio, SAMPLE_RATE, win_length, HOP_LENGTH)
+
+        return run, num_windows
+
+    return setup
+
+
+def otw_insert(fixtures, c, seconds, traced=False):
+    ref = fixtures.features(REFERENCE_MIDI, seconds)
+    live = fixtures.features(LIVE_MIDI, seconds)
+    live_features = [live.get_feature(i) for i in range(live.num_features)]
+
+    def setup():
+        otw = OnlineTimeWarping(
+            ref, SAMPLE_RATE, WIN_LENGTH, c, MAX_RUN_COUNT, DIAG_WEIGHT
+        )
+
+        def run():
+            # Features are precomputed so that only the OTW update is timed
+            if traced:
+                tracing.enable()
+            try:
+                for feature in live_features:
+                    otw.insert_feature(feature)
+            finally:
+                if traced:
+                    tracing.disable()
+                    tracing.TRACER.clear()
+
+        return run, len(live_features)
+
+    return setup
+
+
+def phase_vocoder(fixtures, playback_rate):
+    PhaseVocoder = import_or_skip("src.phase_vocoder", "PhaseVocoder")
+    path = fixtures.wav(REFERENCE_MIDI, 30)
+    num_calls = 200  # Fits in the audio at the fastest rate
+
+    def setup():
+        vocoder = PhaseVocoder(
+            path,
+            playback_rate=playback_rate,
+            sample_rate=SAMPLE_RATE,
+            n_fft=WIN_LENGTH,
+            win_length=WIN_LENGTH,
+            hop_length=HOP_LENGTH,
+        )
+
+        def run():
+            for _ in range(num_calls):
+                vocoder.get_next_frames(HOP_LENGTH)
+
+        return run, num_calls
+
+    return setup
+
+
+def warped_times(fixtures, seconds):
+    calculate_warped_times = import_or_skip(
+        "src.alignment_eval_tools", "calculate_warped_times"
+    )
+    num_frames = len(windows(fixtures.audio(REFERENCE_MIDI, seconds)))
+    # Warping path of a performance that is 10% slower than the reference
+    ref_indices = np.arange(num_frames)
+    warping_path = np.column_stack((ref_indices, np.round(ref_indices * 1.1)))
+    ref_times = fixtures.note_onsets(REFERENCE_MIDI, seconds)
+
+    def setup():
+        def run():
+            calculate_warped_times(warping_path, ref_times)
+
+        return run, len(ref_times)
+
+    return setup
+
+
+def audio_generator(fixtures):
+    AudioGenerator = import_or_skip("src.audio_generator", "AudioGenerator")
+
+    def setup():
+        try:
+            generator = AudioGenerator(REFERENCE_MIDI, SOUNDFONT)
+        except (FileNotFoundError, RuntimeError) as e:
+            raise SkipBenchmark(str(e))
+        output_file = os.path.join(fixtures.tmp_dir, "rendered.wav")
+
+        def run():
+            generator.generate_solo(output_file, tempo=120, sample_rate=SAMPLE_RATE)
+
+        return run, 1
+
+    return setup
+
+
+def benchmarks():
+    """Yield the name, unit, setup factory and factory arguments of every benchmark."""
+    for features_cls, win_length in FEATURE_CLASSES:
+        name = features_cls.__name__
+        args = (features_cls, win_length)
+        yield f"features_stream[{name}]", "window", features_stream, args
+        yield f"features_batch[{name}]", "window", features_batch, args
+    for seconds in PIECE_SECONDS:
+        for c in OTW_WIDTHS:
+            yield f"otw_insert[c={c},{seconds}s]", "frame", otw_insert, (c, seconds)
+    args = (OTW_WIDTHS[1], PIECE_SECONDS[0], True)
+    yield f"otw_insert[c={args[0]},{args[1]}s,traced]", "frame", otw_insert, args
+    for rate in PLAYBACK_RATES:
+        yield f"phase_vocoder[rate={rate}]", "call", phase_vocoder, (rate,)
+    for seconds in PIECE_SECONDS:
+        yield f"calculate_warped_times[{seconds}s]", "note", warped_times, (seconds,)
+    yield "audio_generator[render]", "render", audio_generator, ()
+
+
+def measure(setup, repeats: int, warmup: int = 1) -> dict:
+    """Time `repeats` runs after `warmup` untimed ones, with a fresh setup for each."""
+    times = []
+    for i in range(warmup + repeats):
+        run, units = setup()
+        gc.collect()
+        gc.disable()
+        try:
+            start = perf_counter()
+            run()
+            elapsed = perf_counter() - start
+        finally:
+            gc.enable()
+        if i >= warmup:
+            times.append(elapsed / units)
+    return {
+        "median": float(np.median(times)),
+        "min": float(np.min(times)),
+        "max": float(np.max(times)),
+        "units": units,
+        "repeats": times,
+    }
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "system": platform.platform(),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Return the names of the benchmarks that are slower than the baseline."""
+    regressions = []
+    print(f"\n{'benchmark':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results.items():
+        reference = baseline["results"].get(name)
+        if reference is None or "median" not in result or "median" not in reference:
+            continue
+        ratio = result["median"] / reference["median"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 / (1 + threshold):
+            flag = "  faster"
+        print(
+            f"{name:<40} {format_time(reference['median']):>12} "
+            f"{format_time(result['median']):>12} {ratio - 1:>+8.0%}{flag}"
+        )
+    if baseline.get("environment", {}).get("machine") != platform.machine():
+        print("\nWarning: the baseline was recorded on a different kind of machine")
+    return regressions
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--save-baseline", help="Also write the results to this file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Slowdown relative to the baseline reported as a regression",
+    )
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fixtures = Fixtures(tmp_dir)
+        print(f"{'benchmark':<40} {'median':>12} {'min':>12}  per")
+        for name, unit, factory, factory_args in benchmarks():
+            if args.filter and args.filter not in name:
+                continue
+            try:
+                result = measure(factory(fixtures, *factory_args), args.repeats)
+            except SkipBenchmark as e:
+                results[name] = {"unit": unit, "skipped": str(e)}
+                print(f"{name:<40} skipped: {e}")
+                continue
+            results[name] = dict(result, unit=unit)
+            print(
+                f"{name:<40} {format_time(result['median']):>12} "
+                f"{format_time(result['min']):>12}  {unit}"
+            )
+
+    report = {"environment": environment(), "results": results}
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
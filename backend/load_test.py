@@ -0,0 +1,281 @@
+"""
+Load generator for the Flask backend.
+
+Simulates several soloists at once: each client starts a session, synthesizes a
+score, then streams a WAV file to /synchronization in chunks paced at the audio
+rate. For each number of clients it reports the request latency percentiles, the
+throughput, the CPU and memory use of the server process, and how many chunks took
+longer to process than they last. By default the app runs in this process behind
+the Flask test client; use --url to load a running server (python app.py) instead.
+
+Example:
+    python load_test.py --score ode_to_joy_baseline.musicxml --tempo 100 \
+        --audio data/audio/ode_to_joy_baseline/instrument_0.wav --clients 1,2,4,8
+"""
+
+import argparse
+import json
+import os
+import threading
+from collections import Counter
+from time import perf_counter, sleep
+
+import librosa
+import numpy as np
+import requests
+
+
+class HttpTransport:
+    """Sends requests to a running server."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.session = requests.Session()
+
+    def request(self, method: str, path: str, headers=None, data=None):
+        response = self.session.request(
+            method, self.url + path, headers=headers, data=data
+        )
+        return response.status_code, response.content
+
+
+class InProcessTransport:
+    """Sends requests to the app in this process through the Flask test client."""
+
+    def __init__(self):
+        # A warm-up rendering every score would compete with the measured requests
+        os.environ.setdefault("WARMUP_ON_START", "0")
+        from app import app
+
+        self.client = app.test_client()
+
+    def request(self, method: str, path: str, headers=None, data=None):
+        response = self.client.open(path, method=method, headers=headers, data=data)
+        return response.status_code, response.get_data()
+
+
+def read_process_metrics(transport, admin_token=None):
+    """Return the server's CPU seconds and resident memory, or None if unavailable."""
+    headers = {"admin-token": admin_token} if admin_token else None
+    status, body = transport.request("GET", "/metrics", headers=headers)
+    values = {}
+    if status == 200:
+        for line in body.decode("utf-8").splitlines():
+            if line.startswith("process_"):
+                name, value = line.rsplit(" ", 1)
+                values[name] = float(value)
+    return (
+        values.get("process_cpu_seconds_total"),
+        values.get("process_resident_memory_bytes"),
+    )
+
+
+def run_client(transport, args, audio, ready, start, result):
+    """Start a session, synthesize the score and stream `audio` in real time."""
+    headers = None
+    try:
+        try:
+            status, body = transport.request("POST", "/start-session")
+            if status != 200:
+                result["error"] = f"/start-session returned {status}"
+            else:
+                headers = {"session-token": json.loads(body)["session_token"]}
+                status, _ = transport.request(
+                    "GET",
+                    f"/synthesize-audio/{args.score}/{args.tempo}",
+                    headers=headers,
+                )
+                if status != 200:
+                    result["error"] = f"/synthesize-audio returned {status}"
+        except Exception as e:
+            result["error"] = repr(e)
+
+        # Start streaming together with the other clients; a failed client still
+        # reaches the barrier, which would otherwise wait for it forever
+        ready.wait()
+        if result["error"]:
+            return
+        start.wait()
+        stream(transport, headers, args, audio, result)
+    except Exception as e:
+        result["error"] = repr(e)
+    finally:
+        if headers is not None:
+            try:
+                transport.request("POST", "/stop-session", headers=headers)
+            except Exception as e:
+                result["error"] = result["error"] or repr(e)
+
+
+def stream(transport, headers, args, audio, result):
+    """Send `audio` to /synchronization in chunks paced at the audio rate."""
+    chunk_duration = args.chunk / args.sample_rate
+    accompanist_time = 0.0
+    began = perf_counter()
+    for i in range(0, audio.shape[-1], args.chunk):
+        sleep(max(0.0, began + i / args.sample_rate - perf_counter()))
+
+        sent = perf_counter()
+        status, body = transport.request(
+            "POST",
+            "/synchronization",
+            headers={
+                **headers,
+                "Content-Type": "application/octet-stream",
+                "X-Timestamp": str(accompanist_time),
+            },
+            data=audio[i : i + args.chunk].tobytes(),
+        )
+        latency = perf_counter() - sent
+        if status != 200:
+            result["error"] = f"/synchronization returned {status}"
+            return
+
+        reply = json.loads(body)
+        result["latencies"].append(latency)
+        result["modes"][reply.get("mode", "normal")] += 1
+        if latency > chunk_duration:
+            result["overruns"] += 1
+        accompanist_time += reply["playback_rate"] * chunk_duration
+
+
+def run_level(make_transport, args, audio, num_clients):
+    """Run `num_clients` clients at once and summarize their requests."""
+    results = [
+        {"latencies": [], "modes": Counter(), "overruns": 0, "error": None}
+        for _ in range(num_clients)
+    ]
+    ready = threading.Barrier(num_clients + 1)  # Every client has synthesized
+    start = threading.Event()
+    threads = [
+        threading.Thread(
+            target=run_client,
+            args=(make_transport(), args, audio, ready, start, result),
+            daemon=True,
+        )
+        for result in results
+    ]
+    for thread in threads:
+        thread.start()
+
+    monitor = make_transport()
+    ready.wait()
+    cpu_before, _ = read_process_metrics(monitor, args.admin_token)
+    began = perf_counter()
+    start.set()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - began
+    cpu_after, rss = read_process_metrics(monitor, args.admin_token)
+
+    latencies = np.array([t for r in results for t in r["latencies"]]) * 1000
+    modes = sum((r["modes"] for r in results), Counter())
+    chunks = len(latencies)
+    summary = {
+        "clients": num_clients,
+        "chunks": chunks,
+        "errors": [r["error"] for r in results if r["error"]],
+        "p50_ms": float(np.percentile(latencies, 50)) if chunks else None,
+        "p95_ms": float(np.percentile(latencies, 95)) if chunks else None,
+        "p99_ms": float(np.percentile(latencies, 99)) if chunks else None,
+        "max_ms": float(latencies.max()) if chunks else None,
+        "throughput": chunks / elapsed,
+        "cpu_percent": (
+            100 * (cpu_after - cpu_before) / elapsed
+            if chunks and cpu_before is not None and cpu_after is not None
+            else None
+        ),
+        "rss_mb": rss / 1024**2 if rss is not None else None,
+        "overruns": sum(r["overruns"] for r in results),
+        "degraded": chunks - modes["normal"],
+    }
+    summary["overloaded"] = bool(summary["errors"]) or (
+        summary["overruns"] > args.max_overrun * max(chunks, 1)
+    )
+    return summary
+
+
+def format_optional(value, spec):
+    """Format `value` with `spec`, or a dash of the same width if it is None."""
+    if value is None:
+        return format("-", ">" + spec.split(".")[0])
+    return format(value, spec)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--url", help="Server to load, e.g. http://127.0.0.1:5000 (default: in process)"
+    )
+    parser.add_argument("--score", required=True, help="MusicXML file name on the server")
+    parser.add_argument("--tempo", type=int, default=100)
+    parser.add_argument("--audio", required=True, help="WAV file to stream as the soloist")
+    parser.add_argument(
+        "--clients", default="1,2,4,8", help="Comma-separated numbers of clients to run"
+    )
+    parser.add_argument("--chunk", type=int, default=2048, help="Samples per request")
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument(
+        "--duration", type=float, help="Seconds of audio streamed by each client"
+    )
+    parser.add_argument(
+        "--max-overrun",
+        type=float,
+        default=0.01,
+        help="Fraction of chunks allowed to take longer than their duration",
+    )
+    parser.add_argument("--admin-token", help="Admin token of the server, if it has one")
+    parser.add_argument("--output", help="JSON file to write the results to")
+    args = parser.parse_args()
+
+    audio, _ = librosa.load(args.audio, sr=args.sample_rate, mono=True)
+    if args.duration is not None:
+        audio = audio[: int(args.duration * args.sample_rate)]
+    audio = audio.astype("<f4")
+
+    if args.url:
+        make_transport = lambda: HttpTransport(args.url)  # noqa: E731
+    else:
+        make_transport = InProcessTransport
+        print("Running in process: CPU and memory include the simulated clients\n")
+
+    chunk_ms = 1000 * args.chunk / args.sample_rate
+    audio_duration = audio.shape[-1] / args.sample_rate
+    print(f"Chunks of {chunk_ms:.1f} ms, {audio_duration:.1f} s of audio per client")
+    print(
+        f"{'clients':>7} {'chunks':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+        f"{'max ms':>8} {'chunk/s':>8} {'CPU %':>6} {'RSS MB':>7} {'overrun':>7} "
+        f"{'degraded':>8}"
+    )
+    summaries = []
+    for num_clients in [int(n) for n in args.clients.split(",")]:
+        summary = run_level(make_transport, args, audio, num_clients)
+        summaries.append(summary)
+        print(
+            f"{summary['clients']:>7} {summary['chunks']:>7} "
+            f"{format_optional(summary['p50_ms'], '8.1f')} "
+            f"{format_optional(summary['p95_ms'], '8.1f')} "
+            f"{format_optional(summary['p99_ms'], '8.1f')} "
+            f"{format_optional(summary['max_ms'], '8.1f')} "
+            f"{summary['throughput']:>8.1f} "
+            f"{format_optional(summary['cpu_percent'], '6.0f')} "
+            f"{format_optional(summary['rss_mb'], '7.0f')} "
+            f"{summary['overruns']:>7} {summary['degraded']:>8}"
+            + ("  OVERLOADED" if summary["overloaded"] else "")
+        )
+        for error in sorted(set(summary["errors"])):
+            print(f"        Error: {error}")
+
+    carried = [s["clients"] for s in summaries if not s["overloaded"]]
+    if carried:
+        print(f"\nLargest number of clients carried in real time: {max(carried)}")
+    else:
+        print("\nNo number of clients was carried in real time")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summaries, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
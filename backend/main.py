@@ -8,14 +8,16 @@ from src.audio_buffer import AudioBuffer
 from src.score_follower import ScoreFollower
 from src.midi_performance import MidiPerformance
 from src.audio_generator import AudioGenerator
+from src.deadline_monitor import DeadlineMonitor
 from src.features_cens import CENSFeatures
 from src.features_mel_spec import MelSpecFeatures
 from src.features_f0 import F0Features
+from src import tracing
 import soundfile as sf
 import pyaudio
 import json
 import pandas as pd
-from time import time, sleep
+from time import time, sleep, perf_counter
 
 
 def normalize_audio(audio: np.ndarray) -> np.ndarray:
@@ -35,9 +37,12 @@ HOP_LENGTH = config.get("hop_length", WIN_LENGTH)
 
 # OTW Specific
 C = config.get("c", 50)
+MIN_C = config.get("min_c")
 MAX_RUN_COUNT = config.get("max_run_count", 3)
 DIAG_WEIGHT = config.get("diag_weight", 0.75)
 MAX_DURATION = config.get("max_duration", 600)
+SILENCE_THRESHOLD = config.get("silence_threshold")
+SILENCE_HANGOVER = config.get("silence_hangover", 2)
 
 # Feature Selection
 feature_name = config.get("feature_type", "CENS")
@@ -82,6 +87,9 @@ ALIGN_COL_LIVE = config.get("align_col_live", "altered_time")
 
 GENERATE_FIGURES = config.get("generate_figures", False)
 
+# Tracing
+PATH_TRACE = config.get("path_trace")
+
 # Soundfont
 SOUNDFONT_FILENAME = config.get("soundfont_filename")
 PATH_SOUNDFONT = config.get("path_soundfont")
@@ -144,7 +152,7 @@ if not os.path.isfile(PATH_LIVE_WAV):
         output_file=PATH_LIVE_WAV, tempo=LIVE_TEMPO, instrument_index=0
     )
 
-STEP_SIZE = WIN_LENGTH / SAMPLE_RATE  # * (REF_TEMPO / 60) for beats
+STEP_SIZE = HOP_LENGTH / SAMPLE_RATE  # * (REF_TEMPO / 60) for beats
 
 live_audio, _ = librosa.load(PATH_LIVE_WAV, sr=SAMPLE_RATE)  # load soloist audio
 live_audio = live_audio.reshape((CHANNELS, -1))  # reshape soloist audio to 2D array
@@ -163,21 +171,31 @@ score_follower = ScoreFollower(
     diag_weight=DIAG_WEIGHT,
     sample_rate=SAMPLE_RATE,
     win_length=WIN_LENGTH,
+    hop_length=HOP_LENGTH,
     features_cls=FEATURE_TYPE,
+    silence_threshold=SILENCE_THRESHOLD,
+    silence_hangover=SILENCE_HANGOVER,
+    min_c=MIN_C,
 )
 
+# Track whether each step keeps up with the audio it processes
+deadlines = DeadlineMonitor("Score follower")
+
 soloist_times = []
 estimated_times = []
 accompanist_times = []
 
 
 def step(data) -> float:
+    start = perf_counter()
+    live_index_before = score_follower.live_index
     estimated_time = score_follower.step(
         data
     )  # get estimated time in soloist audio in seconds
 
-    ref_index, live_index = score_follower.path[-1]
-    print(f"Alignment path (indices, ref vs. live): ({ref_index}, {live_index})")
+    if score_follower.path:
+        ref_index, live_index = score_follower.path[-1]
+        print(f"Alignment path (indices, ref vs. live): ({ref_index}, {live_index})")
 
     # ref_beat = ref_index * STEP_SIZE * REF_TEMPO / 60
     # live_beat = live_index * STEP_SIZE * REF_TEMPO / 60
@@ -191,6 +209,15 @@ def step(data) -> float:
     position = (
         estimated_time / 60 * REF_TEMPO
     )  # convert estimated time (seconds) to position in piece (beats)
+
+    deadlines.record(
+        perf_counter() - start,
+        data.shape[-1] / SAMPLE_RATE,
+        steps=score_follower.live_index - live_index_before,
+        live_index=score_follower.live_index,
+        ref_index=score_follower.otw.ref_index,
+        window_size=score_follower.otw.window_size,
+    )
     return position
 
 
@@ -222,6 +249,9 @@ def callback(in_data, frame_count, time_info, status):
     )  # Output the solo to the speakers. The accompaniment is already being played by the MidiPerformance instance.
 
 
+if PATH_TRACE:
+    tracing.enable()
+
 if SKIP_PLAYBACK:
     source_index = 0
     while source_index < live_audio.shape[-1]:
@@ -283,11 +313,32 @@ else:
     live_audio = live_audio.reshape(-1)
     sf.write("live.wav", live_audio, SAMPLE_RATE)
 
+if PATH_TRACE:
+    tracing.disable()
+    tracing.export_chrome_trace(PATH_TRACE)
+
+print(
+    f"Real-time deadlines missed: {deadlines.missed} of {deadlines.frames} frames "
+    f"(processing/real-time ratio mean {deadlines.mean_ratio:.2f}, "
+    f"max {deadlines.max_ratio:.2f})"
+)
+for record in deadlines.worst():
+    if record["ratio"] > 1:
+        print(
+            f"  {record['elapsed'] * 1000:.1f} ms for {record['budget'] * 1000:.1f} ms "
+            f"at ref_index={record['ref_index']}, live_index={record['live_index']}, "
+            f"window_size={record['window_size']}"
+        )
+
 if PATH_LOG_FOLDER:
     os.makedirs(PATH_LOG_FOLDER, exist_ok=True)
     ref_ft_out_path = os.path.join(PATH_LOG_FOLDER, f"py_{feature_name}_ref_ft.json")
     live_ft_out_path = os.path.join(PATH_LOG_FOLDER, f"py_{feature_name}_live_ft.json")
     align_out_path = os.path.join(PATH_LOG_FOLDER, f"py_{feature_name}_warping_path.json")
+    deadlines_out_path = os.path.join(PATH_LOG_FOLDER, f"py_{feature_name}_deadlines.json")
+
+    with open(deadlines_out_path, "w", encoding="utf-8") as f:
+        json.dump(deadlines.summary(), f, indent=4)
 
     if SAVE_REF_FT:
         with open(ref_ft_out_path, 'w', encoding='utf-8') as f:
@@ -299,7 +350,7 @@ if PATH_LOG_FOLDER:
             json.dump(serialized_featuregram, f, ensure_ascii=False, indent=4)
     if SAVE_WARP:
         with open(align_out_path, 'w', encoding='utf-8') as f:
-            serialized_path = [[int(y) for y in x] for x in score_follower.path]
+            serialized_path = score_follower.path.as_array().tolist()
             json.dump(serialized_path, f, ensure_ascii=False, indent=4)
 
 if PATH_ALIGNMENT_CSV:
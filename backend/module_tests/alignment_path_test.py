@@ -0,0 +1,80 @@
+import unittest
+import tempfile
+import os
+
+import numpy as np
+
+from src.alignment_path import AlignmentPath
+
+
+class TestAlignmentPath(unittest.TestCase):
+    def test_append_and_grow(self):
+        path = AlignmentPath(capacity=2)
+        for i in range(10):
+            path.append(i, 2 * i)
+
+        self.assertEqual(len(path), 10)
+        self.assertEqual(path[-1], (9, 18))
+        self.assertEqual(list(path)[:2], [(0, 0), (1, 2)])
+
+        array = path.as_array()
+        self.assertEqual(array.shape, (10, 2))
+        self.assertEqual(array.dtype, np.int32)
+        np.testing.assert_array_equal(array[:, 0], np.arange(10))
+
+    def test_as_array_is_read_only_view(self):
+        path = AlignmentPath(capacity=4)
+        path.append(1, 1)
+        array = path.as_array()
+        self.assertTrue(np.shares_memory(array, path._data))
+        with self.assertRaises(ValueError):
+            array[0, 0] = 5
+
+    def test_asarray_does_not_copy(self):
+        path = AlignmentPath()
+        path.append(3, 4)
+        self.assertTrue(np.shares_memory(np.asarray(path), path.as_array()))
+
+    def test_log_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            log_path = os.path.join(tmp_dir, "path.npy")
+            path = AlignmentPath(capacity=1, log_path=log_path)
+            for i in range(5):
+                path.append(i, i + 1)
+            path.flush()
+            np.testing.assert_array_equal(AlignmentPath.load(log_path), path.as_array())
+
+            path.append(5, 6)
+            path.close()
+            np.testing.assert_array_equal(AlignmentPath.load(log_path), path.as_array())
+
+    def test_log_header_has_fixed_size(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            log_path = os.path.join(tmp_dir, "path.npy")
+            path = AlignmentPath(log_path=log_path)
+            # Flush on both sides of every power of ten, whose shape is one digit longer
+            for i in range(1, 10002):
+                path.append(i, i)
+                if len(str(i)) != len(str(i + 1)) or len(str(i)) != len(str(i - 1)):
+                    path.flush()
+                    self.assertEqual(
+                        os.path.getsize(log_path),
+                        AlignmentPath.LOG_HEADER_LEN + i * 2 * 4,
+                    )
+                    np.testing.assert_array_equal(
+                        AlignmentPath.load(log_path), path.as_array()
+                    )
+            path.close()
+            self.assertEqual(len(AlignmentPath.load(log_path)), 10001)
+
+    def test_save(self):
+        path = AlignmentPath()
+        path.append(7, 8)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            save_path = os.path.join(tmp_dir, "path.npy")
+            path.save(save_path)
+            np.testing.assert_array_equal(np.load(save_path), [[7, 8]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+from unittest.mock import patch
+import os
+import tempfile
+from pathlib import Path
+
+import pretty_midi
+from music21 import converter, note, stream
+
+from src import audio_generator
+from src.audio_generator import AudioGenerator, parse_score_beats
+
+
+class TestAudioGenerator(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.soundfont = os.path.join(self.tmp.name, "test.sf2")
+        open(self.soundfont, "wb").close()
+        patcher = patch("src.audio_generator.import_fluidsynth")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Scores are cached by content, shared with the other tests
+        patcher = patch.dict(audio_generator._score_cache, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Two instruments at 100 BPM, so one beat lasts 0.6 seconds
+        score = pretty_midi.PrettyMIDI(initial_tempo=100)
+        for program in (40, 42):
+            instrument = pretty_midi.Instrument(program=program)
+            instrument.notes.append(pretty_midi.Note(90, 60, 0.6, 1.2))
+            pedal = pretty_midi.ControlChange(64, 127, 1.2)
+            instrument.control_changes.append(pedal)
+            instrument.pitch_bends.append(pretty_midi.PitchBend(512, 0.3))
+            score.instruments.append(instrument)
+        self.score_path = os.path.join(self.tmp.name, "duet.mid")
+        score.write(self.score_path)
+
+    def make_generator(self):
+        return AudioGenerator(self.score_path, soundfont_path=self.soundfont)
+
+    def test_instruments_at_tempo(self):
+        instruments = self.make_generator().instruments(tempo=60)
+
+        self.assertEqual([i.program for i in instruments], [40, 42])
+        note = instruments[0].notes[0]
+        self.assertEqual((note.pitch, note.velocity), (60, 90))
+        self.assertAlmostEqual(note.start, 1.0)
+        self.assertAlmostEqual(note.end, 2.0)
+        self.assertAlmostEqual(instruments[0].control_changes[0].time, 2.0)
+        self.assertAlmostEqual(instruments[0].pitch_bends[0].time, 0.5)
+
+        (instrument,) = self.make_generator().instruments(tempo=120, indices=[1])
+        self.assertEqual(instrument.program, 42)
+        self.assertAlmostEqual(instrument.notes[0].end, 1.0)
+
+        # Without a tempo the score is timed as written
+        (instrument,) = self.make_generator().instruments(tempo=None, indices=[1])
+        self.assertAlmostEqual(instrument.notes[0].start, 0.6)
+
+    def test_scores_are_parsed_once(self):
+        with patch(
+            "src.audio_generator.pretty_midi.PrettyMIDI", wraps=pretty_midi.PrettyMIDI
+        ) as parse:
+            for tempo in (60, 90, 60):
+                self.make_generator().instruments(tempo)
+        self.assertEqual(parse.call_count, 1)
+
+        # Scaling leaves the cached instruments, timed in beats, untouched
+        (violin, _) = parse_score_beats(self.score_path)
+        self.assertAlmostEqual(violin.notes[0].start, 1.0)
+
+    def test_generate_solo_renders_in_memory(self):
+        output_file = os.path.join(self.tmp.name, "out", "solo.wav")
+        with patch("src.audio_generator.get_synth_pool") as get_synth_pool:
+            generator = self.make_generator()
+            generator.generate_solo(output_file, tempo=60, instrument_index=1)
+
+        render_to_file = get_synth_pool.return_value.render_to_file
+        instrument, path = render_to_file.call_args.args
+        self.assertEqual((instrument.program, path), (42, output_file))
+        self.assertAlmostEqual(instrument.notes[0].start, 1.0)
+        # No temporary MIDI file was written next to the score
+        self.assertEqual(
+            sorted(os.listdir(self.tmp.name)), ["duet.mid", "out", "test.sf2"]
+        )
+
+    def test_musicxml_is_converted_once(self):
+        melody = stream.Stream([note.Note("C4"), note.Note("E4"), note.Note("G4")])
+        score_path = os.path.join(self.tmp.name, "melody.musicxml")
+        melody.write("musicxml", fp=score_path)
+        cache_dir = os.path.join(self.tmp.name, "midi")
+
+        with patch(
+            "src.audio_generator.converter.parse", wraps=converter.parse
+        ) as parse:
+            for _ in range(2):
+                generator = AudioGenerator(
+                    score_path, soundfont_path=self.soundfont, midi_cache_dir=cache_dir
+                )
+                self.assertEqual(parse.call_count, 1)
+            self.assertEqual(len(generator.instruments(tempo=120)[0].notes), 3)
+
+            # Editing the score invalidates its conversion
+            melody.append(note.Note("C5"))
+            melody.write("musicxml", fp=score_path)
+            generator = AudioGenerator(
+                score_path, soundfont_path=self.soundfont, midi_cache_dir=cache_dir
+            )
+            self.assertEqual(parse.call_count, 2)
+            self.assertEqual(len(generator.instruments(tempo=120)[0].notes), 4)
+
+        # Conversions are only written to the cache, never next to the score
+        self.assertEqual(generator.score_path.parent, Path(cache_dir))
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, "melody.mid")))
+        # The default cache does not depend on the working directory
+        self.assertTrue(audio_generator.MIDI_CACHE_DIR.is_absolute())
+
+
+if __name__ == "__main__":
+    unittest.main()
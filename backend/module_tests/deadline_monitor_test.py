@@ -0,0 +1,67 @@
+import unittest
+
+from src.deadline_monitor import DeadlineMonitor
+
+
+class TestDeadlineMonitor(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.misses = []
+        self.monitor = DeadlineMonitor(
+            "Test",
+            worst_n=2,
+            warning_interval=5.0,
+            on_miss=self.misses.append,
+            clock=lambda: self.now,
+        )
+
+    def test_counts_missed_deadlines(self):
+        self.assertFalse(self.monitor.record(0.05, 0.1, live_index=1))
+        with self.assertLogs("src.deadline_monitor", "WARNING") as logs:
+            self.assertTrue(self.monitor.record(0.15, 0.1, live_index=2))
+
+        self.assertEqual((self.monitor.frames, self.monitor.missed), (2, 1))
+        self.assertAlmostEqual(self.monitor.last_ratio, 1.5)
+        self.assertAlmostEqual(self.monitor.max_ratio, 1.5)
+        self.assertAlmostEqual(self.monitor.mean_ratio, 1.0)
+        self.assertEqual([m["live_index"] for m in self.misses], [2])
+        self.assertIn(
+            "150.0 ms for 100.0 ms of audio (1.50x) at live_index=2", logs.output[0]
+        )
+
+    def test_keeps_worst_records(self):
+        for live_index, elapsed in enumerate([0.01, 0.09, 0.03, 0.05]):
+            self.monitor.record(elapsed, 0.1, live_index=live_index, ref_index=0)
+
+        worst = self.monitor.worst()
+        self.assertEqual([w["live_index"] for w in worst], [1, 3])
+        self.assertAlmostEqual(worst[0]["ratio"], 0.9)
+        self.assertEqual(worst[0]["frame"], 2)
+        self.assertEqual(self.monitor.summary()["worst"], worst)
+
+    def test_carries_chunks_without_steps(self):
+        self.assertFalse(self.monitor.record(0.001, 0.01, steps=0))
+        self.assertEqual(self.monitor.frames, 0)
+
+        # 31 ms for 30 ms of audio, split over three chunks
+        with self.assertLogs("src.deadline_monitor", "WARNING"):
+            self.monitor.record(0.001, 0.01, steps=0)
+            self.assertTrue(self.monitor.record(0.029, 0.01))
+        self.assertEqual(self.monitor.frames, 1)
+        self.assertAlmostEqual(self.monitor.worst()[0]["budget"], 0.03)
+
+    def test_warnings_are_rate_limited(self):
+        with self.assertLogs("src.deadline_monitor", "WARNING") as logs:
+            self.monitor.record(0.2, 0.1)
+            self.now = 1.0
+            self.monitor.record(0.2, 0.1)
+            self.now = 6.0
+            self.monitor.record(0.2, 0.1)
+
+        self.assertEqual(len(logs.output), 2)
+        self.assertIn("missed 2 real-time deadline(s)", logs.output[1])
+        self.assertEqual((self.monitor.missed, len(self.misses)), (3, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import unittest
+import tempfile
+import gc
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+from src.feature_registry import FeatureRegistry
+from src.score_follower import ScoreFollower
+
+
+def attach_in_other_process(audio_path, sr):
+    """Look up features published by the parent process without computing them."""
+
+    def fail():
+        raise AssertionError("Features should be attached, not computed")
+
+    registry = FeatureRegistry(shared_memory=True)
+    features = registry.get(audio_path, sr, 2048, 1024, compute=fail)
+    return features.frozen, np.array(features.get_featuregram()), registry.misses
+
+
+class TestFeatureRegistry(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        sr = 22050
+        t = np.arange(sr // 4) / sr
+        audio = np.concatenate(
+            [0.5 * np.sin(2.0 * np.pi * f * t) for f in (262, 330, 392, 523)]
+        )
+        cls.test_wav = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
+        sf.write(cls.test_wav.name, audio, sr)
+        cls.sample_rate = sr
+        cls.audio = audio.astype(np.float32).reshape((1, -1))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.test_wav.close()
+        os.remove(cls.test_wav.name)
+
+    def get(self, registry, hop_len=1024, **kwargs):
+        return registry.get(self.test_wav.name, self.sample_rate, 2048, hop_len, **kwargs)
+
+    def test_features_are_shared_and_frozen(self):
+        registry = FeatureRegistry()
+        features = self.get(registry)
+        self.assertIs(self.get(registry), features)
+        self.assertEqual((registry.hits, registry.misses), (1, 1))
+
+        self.assertTrue(features.frozen)
+        self.assertFalse(features.get_featuregram().flags.writeable)
+        with self.assertRaises(RuntimeError):
+            features.insert(np.zeros(2048))
+
+        self.assertIsNot(self.get(registry, hop_len=512), features)
+
+    def test_entries_released_when_unused(self):
+        registry = FeatureRegistry()
+        features = self.get(registry)
+        self.assertEqual(len(registry), 1)
+        self.assertEqual(registry.nbytes(), features.nbytes)
+        del features
+        gc.collect()
+        self.assertEqual(len(registry), 0)
+        self.assertIsNone(
+            registry.peek(self.test_wav.name, self.sample_rate, 2048, 1024)
+        )
+
+    def test_score_followers_share_reference(self):
+        registry = FeatureRegistry()
+        followers = [
+            ScoreFollower(
+                ref_filename=self.test_wav.name,
+                sample_rate=self.sample_rate,
+                win_length=2048,
+                hop_length=1024,
+                ref_features=self.get(registry),
+            )
+            for _ in range(2)
+        ]
+        from_file = ScoreFollower(
+            ref_filename=self.test_wav.name,
+            sample_rate=self.sample_rate,
+            win_length=2048,
+            hop_length=1024,
+        )
+
+        for score_follower in followers + [from_file]:
+            score_follower.step(self.audio)
+        for score_follower in followers:
+            self.assertIs(score_follower.ref_features, followers[0].ref_features)
+            np.testing.assert_array_equal(
+                score_follower.path.as_array(), from_file.path.as_array()
+            )
+        self.assertEqual(
+            from_file.nbytes - followers[0].nbytes, from_file.ref_features.nbytes
+        )
+
+    def test_disk_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            features = self.get(FeatureRegistry(cache_dir=cache_dir))
+            registry = FeatureRegistry(cache_dir=cache_dir)
+            self.assertTrue(
+                registry.is_cached(self.test_wav.name, self.sample_rate, 2048, 1024)
+            )
+
+            def fail():
+                raise AssertionError("Features should be loaded, not computed")
+
+            loaded = self.get(registry, compute=fail)
+            self.assertTrue(loaded.frozen)
+            self.assertEqual(loaded.hop_len, 1024)
+            np.testing.assert_array_equal(
+                loaded.get_featuregram(), features.get_featuregram()
+            )
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            del loaded  # Release the memory map before the directory is removed
+
+    def test_shared_memory(self):
+        publisher = FeatureRegistry(shared_memory=True)
+        try:
+            features = self.get(publisher)
+            with ProcessPoolExecutor(
+                1, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                frozen, featuregram, misses = executor.submit(
+                    attach_in_other_process, self.test_wav.name, self.sample_rate
+                ).result()
+            self.assertTrue(frozen)
+            self.assertEqual(misses, 0)
+            np.testing.assert_array_equal(featuregram, features.get_featuregram())
+        finally:
+            publisher.close()
+
+        self.assertIsNone(
+            FeatureRegistry(shared_memory=True).peek(
+                self.test_wav.name, self.sample_rate, 2048, 1024
+            )
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
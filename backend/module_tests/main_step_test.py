@@ -0,0 +1,91 @@
+import unittest
+import ast
+import os
+from time import perf_counter
+
+import numpy as np
+
+from src.deadline_monitor import DeadlineMonitor
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "main.py")
+
+
+def load_step(namespace):
+    """
+    Compile the `step` function of main.py into `namespace`.
+
+    main.py opens audio devices and reads config.yaml when imported, so only the
+    function is taken from its source; its globals come from `namespace`.
+    """
+    with open(MAIN_PATH) as f:
+        tree = ast.parse(f.read(), filename=MAIN_PATH)
+    (function,) = [
+        node
+        for node in tree.body
+        if isinstance(node, ast.FunctionDef) and node.name == "step"
+    ]
+    module = ast.Module(body=[function], type_ignores=[])
+    exec(compile(module, MAIN_PATH, "exec"), namespace)
+    return namespace["step"]
+
+
+class FakeOTW:
+    ref_index = 0
+    window_size = 50
+
+
+class FakeScoreFollower:
+    """Completes one analysis window per `hop` samples, like ScoreFollower."""
+
+    def __init__(self, hop):
+        self.hop = hop
+        self.buffered = 0
+        self.live_index = 0
+        self.path = []
+        self.otw = FakeOTW()
+
+    def step(self, data):
+        self.buffered += data.shape[-1]
+        while self.buffered >= self.hop:
+            self.buffered -= self.hop
+            self.live_index += 1
+            self.path.append((self.live_index, self.live_index))
+        return self.live_index * self.hop / 1000
+
+
+class TestMainStep(unittest.TestCase):
+    def test_step_records_deadline_frames(self):
+        score_follower = FakeScoreFollower(hop=100)
+        deadlines = DeadlineMonitor("Score follower")
+        step = load_step(
+            {
+                "np": np,
+                "perf_counter": perf_counter,
+                "print": lambda *args: None,
+                "score_follower": score_follower,
+                "deadlines": deadlines,
+                "soloist_times": [],
+                "estimated_times": [],
+                "source_index": 0,
+                "SAMPLE_RATE": 1000,
+                "REF_TEMPO": 60,
+            }
+        )
+
+        # Chunks of half a hop: every other step completes a window
+        for _ in range(8):
+            step(np.zeros((1, 50), dtype=np.float32))
+
+        self.assertEqual(score_follower.live_index, 4)
+        self.assertEqual(deadlines.frames, 4)
+        summary = deadlines.summary()
+        self.assertEqual(len(summary["worst"]), 4)
+        self.assertEqual(
+            sorted(record["live_index"] for record in summary["worst"]), [1, 2, 3, 4]
+        )
+        # Both chunks of each window count towards its budget
+        self.assertTrue(all(r["budget"] == 0.1 for r in summary["worst"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+from src.metrics import (
+    MetricsRegistry,
+    process_cpu_seconds,
+    process_resident_memory_bytes,
+)
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_and_gauge(self):
+        requests = self.registry.counter("requests_total", "Requests", ["mode"])
+        requests.inc(mode="normal")
+        requests.inc(2, mode="drop")
+        self.registry.gauge("sessions", "Active sessions", function=lambda: 3)
+
+        self.assertEqual(
+            self.registry.render(),
+            "# HELP requests_total Requests\n"
+            "# TYPE requests_total counter\n"
+            'requests_total{mode="drop"} 2.0\n'
+            'requests_total{mode="normal"} 1.0\n'
+            "# HELP sessions Active sessions\n"
+            "# TYPE sessions gauge\n"
+            "sessions 3.0\n",
+        )
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram(
+            "step_seconds", "Step time", ["stage"], buckets=[0.001, 0.01]
+        )
+        for value in (0.0005, 0.001, 0.005, 0.5):
+            histogram.observe(value, stage="otw")
+
+        lines = self.registry.render().splitlines()[2:]
+        self.assertEqual(
+            lines,
+            [
+                'step_seconds_bucket{stage="otw",le="0.001"} 2.0',
+                'step_seconds_bucket{stage="otw",le="0.01"} 3.0',
+                'step_seconds_bucket{stage="otw",le="+Inf"} 4.0',
+                'step_seconds_sum{stage="otw"} 0.5065',
+                'step_seconds_count{stage="otw"} 4.0',
+            ],
+        )
+
+    def test_histogram_time(self):
+        histogram = self.registry.histogram("decode_seconds", "Decode time")
+        with histogram.time():
+            pass
+        self.assertIn("decode_seconds_count 1.0", self.registry.render())
+
+    def test_labels(self):
+        gauge = self.registry.gauge(
+            "session_bytes", "Bytes", ["session"], function=lambda: {('a"b',): 1}
+        )
+        self.assertIn('session_bytes{session="a\\"b"} 1.0', self.registry.render())
+        with self.assertRaises(ValueError):
+            gauge.set(1, other="x")
+        with self.assertRaises(ValueError):
+            self.registry.gauge("session_bytes", "Duplicate")
+
+    def test_missing_values_are_left_out(self):
+        self.registry.gauge("rss_bytes", "Resident memory", function=lambda: None)
+        self.assertEqual(
+            self.registry.render(),
+            "# HELP rss_bytes Resident memory\n# TYPE rss_bytes gauge\n",
+        )
+
+    def test_process_metrics(self):
+        self.assertGreater(process_cpu_seconds(), 0)
+        rss = process_resident_memory_bytes()
+        self.assertTrue(rss is None or rss > 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+from unittest.mock import patch
+import importlib
+import sys
+import threading
+import time
+import types
+
+# Imported before sys.modules is patched, so that only src.midi_performance is
+# removed from it again after each test
+import music21  # noqa: F401
+from src import tracing  # noqa: F401
+
+
+class FakeSynth:
+    """Stands in for fluidsynth.Synth, recording the notes it is sent."""
+
+    def __init__(self, samplerate=44100):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        pass
+
+    def sfload(self, path):
+        return 1
+
+    def program_select(self, channel, sfid, bank, preset):
+        pass
+
+    def noteon(self, channel, key, velocity):
+        with self.lock:
+            self.events.append(("noteon", key, threading.current_thread().name))
+
+    def noteoff(self, channel, key):
+        with self.lock:
+            self.events.append(("noteoff", key, threading.current_thread().name))
+
+    def delete(self):
+        pass
+
+
+class TestMidiPerformance(unittest.TestCase):
+    def setUp(self):
+        fluidsynth = types.ModuleType("fluidsynth")
+        fluidsynth.Synth = FakeSynth
+        # Importing src.midi_performance requires pyFluidSynth
+        patcher = patch.dict(sys.modules, {"fluidsynth": fluidsynth})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.midi_performance = importlib.import_module("src.midi_performance")
+
+    def test_note_offs_are_released_in_time_order(self):
+        synth = FakeSynth()
+        scheduler = self.midi_performance.NoteScheduler(synth, sample_rate=1000)
+        scheduler.start()
+        scheduler.play(60, 0.15)
+        scheduler.play(64, 0.05)
+        scheduler.play(67, 0.10)
+        scheduler.close()
+
+        note_offs = [event for event in synth.events if event[0] == "noteoff"]
+        self.assertEqual([key for _, key, _ in note_offs], [64, 67, 60])
+        self.assertEqual({thread for _, _, thread in note_offs}, {"note-scheduler"})
+
+        stats = scheduler.timing_stats()
+        self.assertEqual((stats["released"], stats["max_pending"]), (3, 3))
+        self.assertGreaterEqual(stats["mean_lateness"], 0.0)
+        self.assertLessEqual(stats["mean_lateness"], stats["max_lateness"])
+        self.assertEqual(
+            stats["max_lateness_samples"], round(stats["max_lateness"] * 1000)
+        )
+
+    def test_dense_texture_uses_one_thread(self):
+        synth = FakeSynth()
+        scheduler = self.midi_performance.NoteScheduler(synth)
+        threads = threading.active_count()
+        scheduler.start()
+        for i in range(200):
+            scheduler.play(40 + i % 48, 0.05 + i * 1e-4)
+            self.assertEqual(threading.active_count(), threads + 1)
+
+        # Closing waits for every scheduled note-off
+        start = time.monotonic()
+        scheduler.close()
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual(threading.active_count(), threads)
+        self.assertEqual(scheduler.released, 200)
+        self.assertEqual(len(synth.events), 400)
+
+    def test_performance_plays_reached_notes(self):
+        # Twinkle twinkle starts with half notes, i.e. 0.2 seconds at 600 BPM
+        performance = self.midi_performance.MidiPerformance(
+            midi_file_path="data/midi/twinkle_twinkle.mid", tempo=600
+        )
+        events = performance.fs.events
+        performance.start()
+        for position, count in ((0.5, 2), (2.5, 4)):
+            performance.update_score_position(position)
+            deadline = time.monotonic() + 2
+            while len(events) < count and time.monotonic() < deadline:
+                time.sleep(0.01)
+        # Notes more than a beat behind the soloist are skipped
+        performance.update_score_position(len(performance.notes) * 10)
+        performance.stop()
+
+        self.assertEqual(
+            [(event, key) for event, key, _ in events],
+            [("noteon", 50), ("noteoff", 50), ("noteon", 50), ("noteoff", 50)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
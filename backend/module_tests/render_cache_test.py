@@ -0,0 +1,157 @@
+import unittest
+import tempfile
+import threading
+import os
+import time
+from pathlib import Path
+
+from src import render_cache
+from src.render_cache import RenderCache, file_digest
+
+
+class TestRenderCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = RenderCache(os.path.join(self.tmp.name, "cache"), max_bytes=1000)
+        self.renders = 0
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_file(self, name, data):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def render(self, size=100):
+        def render(output_file):
+            self.renders += 1
+            Path(output_file).write_bytes(b"x" * size)
+
+        return render
+
+    def test_make_key_depends_on_content_and_settings(self):
+        score = self.write_file("score.musicxml", b"<score/>")
+        copy = self.write_file("copy.musicxml", b"<score/>")
+        soundfont = self.write_file("font.sf2", b"font")
+
+        key = RenderCache.make_key(score, 100, soundfont, 44100, 0)
+        self.assertEqual(key, RenderCache.make_key(copy, 100.0, soundfont, 44100, 0))
+        self.assertNotEqual(key, RenderCache.make_key(score, 90, soundfont, 44100, 0))
+        self.assertNotEqual(key, RenderCache.make_key(score, 100, soundfont, 22050, 0))
+        self.assertNotEqual(key, RenderCache.make_key(score, 100, soundfont, 44100, 1))
+
+        self.write_file("score.musicxml", b"<score>changed</score>")
+        self.assertNotEqual(key, RenderCache.make_key(score, 100, soundfont, 44100, 0))
+
+    def test_file_digest_tracks_changes(self):
+        path = self.write_file("a.bin", b"one")
+        first = file_digest(path)
+        self.assertEqual(first, file_digest(path))
+        self.write_file("a.bin", b"two!")
+        self.assertNotEqual(first, file_digest(path))
+
+    def test_hit_after_miss(self):
+        key = "a" * 64
+        path = self.cache.get_or_render(key, self.render())
+        self.assertEqual(path, self.cache.path_for(key))
+        self.assertEqual(path.read_bytes(), b"x" * 100)
+
+        self.assertEqual(self.cache.get_or_render(key, self.render()), path)
+        self.assertEqual(self.renders, 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertEqual(os.listdir(self.cache.tmp_dir), [])
+
+    def test_failed_render_leaves_no_entry(self):
+        key = "b" * 64
+
+        def fail(output_file):
+            raise OSError("fluidsynth failed")
+
+        with self.assertRaises(OSError):
+            self.cache.get_or_render(key, fail)
+        with self.assertRaises(RuntimeError):
+            self.cache.get_or_render(key, lambda output_file: None)
+
+        self.assertIsNone(self.cache.get(key))
+        self.assertEqual(os.listdir(self.cache.tmp_dir), [])
+
+    def test_evicts_least_recently_used(self):
+        keys = [str(i) * 64 for i in range(4)]
+        for key in keys[:3]:
+            self.cache.get_or_render(key, self.render(size=400))
+            time.sleep(0.01)
+
+        # Touch the oldest entry so the second one becomes least recently used
+        self.cache.get_or_render(keys[0], self.render(size=400))
+        time.sleep(0.01)
+        self.cache.get_or_render(keys[3], self.render(size=400))
+
+        self.assertLessEqual(self.cache.size(), 1000)
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertIsNone(self.cache.get(keys[2]))
+        self.assertIsNotNone(self.cache.get(keys[3]))
+
+    def test_keeps_new_entry_larger_than_budget(self):
+        key = "c" * 64
+        path = self.cache.get_or_render(key, self.render(size=2000))
+        self.assertTrue(path.exists())
+
+    def test_concurrent_requests_render_once(self):
+        key = "d" * 64
+        started = threading.Event()
+
+        def slow_render(output_file):
+            started.set()
+            time.sleep(0.1)
+            self.render()(output_file)
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(self.cache.get_or_render(key, slow_render))
+            )
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(started.is_set())
+        self.assertEqual(self.renders, 1)
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (3, 1))
+
+    @unittest.skipIf(render_cache.fcntl is None, "File locks require fcntl")
+    def test_caches_sharing_a_directory_render_once(self):
+        # Separate caches on one directory stand in for worker processes
+        caches = [RenderCache(self.cache.cache_dir, max_bytes=1000) for _ in range(4)]
+        key = "e" * 64
+
+        def slow_render(output_file):
+            time.sleep(0.1)
+            self.render()(output_file)
+
+        threads = [
+            threading.Thread(target=cache.get_or_render, args=(key, slow_render))
+            for cache in caches
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.renders, 1)
+        self.assertEqual(sum(cache.misses for cache in caches), 1)
+
+    def test_record_lookups(self):
+        self.cache.get_or_render("f" * 64, self.render())
+        self.cache.record_lookups(hits=2, misses=3)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 4))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+import unittest
+import tempfile
+import gzip
+import os
+import threading
+
+from src.score_catalogue import ScoreCatalogue, read_score_metadata
+
+SCORE = os.path.join(
+    os.path.dirname(__file__), "..", "data", "musicxml", "ode_to_joy_baseline.musicxml"
+)
+
+
+class TestScoreCatalogue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.tmp.name, "index.json")
+        self.parsed = []
+        self.write("a.musicxml", "<a/>")
+        self.write("b.musicxml", "<b/>")
+        self.write("notes.txt", "ignored")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text, mtime=None):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w") as f:
+            f.write(text)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def read_metadata(self, path):
+        self.parsed.append(os.path.basename(path))
+        with open(path) as f:
+            text = f.read()
+        if text == "<broken":
+            raise ValueError("not a score")
+        return {"text": text}
+
+    def make_catalogue(self):
+        return ScoreCatalogue(
+            self.tmp.name,
+            index_path=self.index_path,
+            refresh_interval=0,
+            read_metadata=self.read_metadata,
+        )
+
+    def test_lists_scores_with_metadata(self):
+        catalogue = self.make_catalogue()
+        scores = catalogue.scores()
+        self.assertEqual([s["filename"] for s in scores], ["a.musicxml", "b.musicxml"])
+        self.assertEqual(scores[0]["metadata"], {"text": "<a/>"})
+        self.assertEqual(scores[0]["size"], 4)
+        self.assertEqual(len(scores[0]["sha256"]), 64)
+        self.assertIsNone(catalogue.get("notes.txt"))
+
+    def test_incremental_refresh(self):
+        catalogue = self.make_catalogue()
+        catalogue.scores()
+        etag = catalogue.etag
+        self.assertFalse(catalogue.refresh())
+
+        # Touched but unchanged content is re-hashed, not re-parsed
+        self.write("a.musicxml", "<a/>", mtime=1)
+        catalogue.refresh()
+        self.assertEqual(self.parsed.count("a.musicxml"), 1)
+        self.assertEqual(catalogue.etag, etag)
+
+        self.write("a.musicxml", "<a>changed</a>")
+        self.assertTrue(catalogue.refresh())
+        self.assertEqual(catalogue.get("a.musicxml")["metadata"], {"text": "<a>changed</a>"})
+        self.assertNotEqual(catalogue.etag, etag)
+
+        os.remove(os.path.join(self.tmp.name, "b.musicxml"))
+        self.assertTrue(catalogue.refresh())
+        self.assertIsNone(catalogue.get("b.musicxml"))
+
+    def test_refresh_interval(self):
+        catalogue = self.make_catalogue()
+        catalogue.refresh_interval = 3600
+        catalogue.refresh()
+        self.write("c.musicxml", "<c/>")
+        self.assertIsNone(catalogue.get("c.musicxml"))
+        catalogue.refresh(force=True)
+        self.assertIsNotNone(catalogue.get("c.musicxml"))
+
+    def test_lookups_do_not_wait_for_parsing(self):
+        catalogue = self.make_catalogue()
+        catalogue.scores()
+
+        parsing, release = threading.Event(), threading.Event()
+        read_metadata = catalogue.read_metadata
+
+        def slow_read_metadata(path):
+            parsing.set()
+            release.wait(5)
+            return read_metadata(path)
+
+        catalogue.read_metadata = slow_read_metadata
+        self.write("c.musicxml", "<c/>")
+        refresh = threading.Thread(target=catalogue.refresh, args=(True,))
+        refresh.start()
+        self.assertTrue(parsing.wait(5))
+
+        # Served from the current index while c.musicxml is parsed
+        self.assertIsNotNone(catalogue.get("a.musicxml"))
+        self.assertIsNone(catalogue.get("c.musicxml"))
+        self.assertEqual(len(catalogue.scores()), 2)
+        self.assertFalse(release.is_set())
+
+        release.set()
+        refresh.join()
+        self.assertEqual(catalogue.get("c.musicxml")["metadata"], {"text": "<c/>"})
+
+    def test_cold_start_waits_for_first_scan(self):
+        catalogue = self.make_catalogue()
+        self.assertIsNone(catalogue.etag)
+
+        parsing, release = threading.Event(), threading.Event()
+        read_metadata = catalogue.read_metadata
+
+        def slow_read_metadata(path):
+            parsing.set()
+            release.wait(5)
+            return read_metadata(path)
+
+        catalogue.read_metadata = slow_read_metadata
+        refresh = threading.Thread(target=catalogue.refresh)
+        refresh.start()
+        self.assertTrue(parsing.wait(5))
+
+        # No index was ever built, so lookups wait for the scan in progress
+        threading.Timer(0.1, release.set).start()
+        self.assertEqual(catalogue.get("a.musicxml")["metadata"], {"text": "<a/>"})
+        self.assertTrue(release.is_set())
+        self.assertIsNotNone(catalogue.etag)
+        refresh.join()
+        self.assertEqual(sorted(self.parsed), ["a.musicxml", "b.musicxml"])
+
+    def test_empty_directory_has_etag(self):
+        for name in ("a.musicxml", "b.musicxml"):
+            os.remove(os.path.join(self.tmp.name, name))
+        catalogue = self.make_catalogue()
+        self.assertEqual(catalogue.scores(), [])
+        self.assertIsNotNone(catalogue.etag)
+
+    def test_index_is_persisted(self):
+        first = self.make_catalogue()
+        first.scores()
+        second = self.make_catalogue()
+        self.assertEqual(second.scores(), first.scores())
+        self.assertEqual(second.etag, first.etag)
+        self.assertEqual(sorted(self.parsed), ["a.musicxml", "b.musicxml"])
+
+    def test_metadata_errors(self):
+        self.write("c.musicxml", "<broken")
+        entry = self.make_catalogue().get("c.musicxml")
+        self.assertIsNone(entry["metadata"])
+        self.assertEqual(entry["error"], "not a score")
+
+    def test_gzipped(self):
+        catalogue = self.make_catalogue()
+        self.assertEqual(gzip.decompress(catalogue.gzipped("a.musicxml")), b"<a/>")
+        self.assertIsNone(catalogue.gzipped("missing.musicxml"))
+
+    def test_read_score_metadata(self):
+        metadata = read_score_metadata(SCORE)
+        self.assertEqual(len(metadata["parts"]), 1)
+        self.assertEqual(metadata["beats"], 128.0)
+        self.assertEqual(metadata["tempos"][0]["beat"], 0.0)
+        self.assertEqual(metadata["time_signatures"], [{"beat": 0.0, "signature": "4/4"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,291 @@
+import unittest
+import tempfile
+import os
+
+import numpy as np
+import soundfile as sf
+
+from src.score_follower import ScoreFollower
+
+
+class TestScoreFollower(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Create a short test WAV file with a rising sequence of tones so that
+        consecutive windows produce different chroma features.
+        """
+        sr = 22050
+        tone_duration = 0.25
+        freqs = [262, 294, 330, 349, 392, 440, 494, 523]
+        t = np.linspace(0, tone_duration, int(sr * tone_duration), endpoint=False)
+        audio = np.concatenate([0.5 * np.sin(2.0 * np.pi * f * t) for f in freqs])
+
+        cls.test_wav = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
+        sf.write(cls.test_wav.name, audio, sr)
+        cls.sample_rate = sr
+        cls.audio = audio.astype(np.float32).reshape((1, -1))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.test_wav.close()
+        os.remove(cls.test_wav.name)
+
+    def make_score_follower(self, hop_length=None, **kwargs):
+        return ScoreFollower(
+            ref_filename=self.test_wav.name,
+            c=10,
+            max_run_count=3,
+            diag_weight=0.5,
+            sample_rate=self.sample_rate,
+            win_length=2048,
+            hop_length=hop_length,
+            **kwargs,
+        )
+
+    def feed(self, score_follower, chunk_size):
+        for i in range(0, self.audio.shape[-1], chunk_size):
+            score_follower.step(self.audio[:, i : i + chunk_size])
+
+    def test_short_chunk_does_not_step(self):
+        score_follower = self.make_score_follower()
+        position = score_follower.step(self.audio[:, :1000])
+        self.assertEqual(position, 0.0)
+        self.assertEqual(len(score_follower.path), 0)
+        self.assertEqual(score_follower.otw.live_index, -1)
+
+    def test_chunk_size_does_not_change_path(self):
+        whole = self.make_score_follower(hop_length=512)
+        whole.step(self.audio)
+
+        small = self.make_score_follower(hop_length=512)
+        self.feed(small, 300)
+
+        large = self.make_score_follower(hop_length=512)
+        self.feed(large, 5000)
+
+        np.testing.assert_array_equal(small.path.as_array(), whole.path.as_array())
+        np.testing.assert_array_equal(large.path.as_array(), whole.path.as_array())
+
+    def test_stage_timings(self):
+        score_follower = self.make_score_follower()
+        score_follower.step(self.audio[:, :1000])
+        self.assertEqual(score_follower.timings, {"features": 0.0, "otw": 0.0})
+        score_follower.step(self.audio[:, 1000 : 2048 * 4])
+        self.assertGreater(score_follower.timings["features"], 0)
+        self.assertGreater(score_follower.timings["otw"], 0)
+
+    def test_one_step_per_hop(self):
+        score_follower = self.make_score_follower(hop_length=512)
+        self.feed(score_follower, 700)
+        expected_steps = (self.audio.shape[-1] - 2048) // 512 + 1
+        self.assertEqual(len(score_follower.path), expected_steps)
+        self.assertEqual(score_follower.ref_features.num_features, expected_steps)
+
+    def test_silence_gate_holds_position(self):
+        score_follower = self.make_score_follower(
+            silence_threshold=-60, silence_hangover=1
+        )
+        score_follower.step(self.audio[:, : 2048 * 4])
+        ref_index = score_follower.path[-1][0]
+        otw_live_index = score_follower.otw.live_index
+
+        # Four silent windows: one is still aligned, the rest are gated
+        score_follower.step(np.zeros((1, 2048 * 4), dtype=np.float32))
+        self.assertEqual(score_follower.gated_frames, 3)
+        self.assertEqual(score_follower.otw.live_index, otw_live_index + 1)
+        self.assertEqual(len(score_follower.path), 8)
+        self.assertEqual(score_follower.path[-1][1], 7)
+        self.assertGreaterEqual(score_follower.path[-1][0], ref_index)
+
+        # Sound resets the gate
+        score_follower.step(self.audio[:, 2048 * 4 : 2048 * 5])
+        self.assertEqual(score_follower.otw.live_index, otw_live_index + 2)
+
+    def test_silence_gate_disabled_by_default(self):
+        score_follower = self.make_score_follower()
+        score_follower.step(np.zeros((1, 2048 * 4), dtype=np.float32))
+        self.assertEqual(score_follower.gated_frames, 0)
+        self.assertEqual(score_follower.otw.live_index, 3)
+
+    def test_backwards_path_follows_valid_steps(self):
+        score_follower = self.make_score_follower(hop_length=512)
+        score_follower.step(self.audio)
+        otw = score_follower.otw
+
+        back_path = score_follower.get_backwards_path(5)
+        self.assertTrue(back_path)
+
+        previous = (otw.ref_index, otw.live_index)
+        for point in back_path:
+            self.assertIn(
+                (previous[0] - point[0], previous[1] - point[1]),
+                [(1, 1), (1, 0), (0, 1)],
+            )
+            self.assertTrue(np.isfinite(otw.accumulated_cost[point]))
+            previous = point
+        self.assertEqual(back_path[-1][0], max(otw.ref_index - 5, 0))
+
+    def test_backwards_path_stops_at_origin(self):
+        score_follower = self.make_score_follower()
+        score_follower.step(self.audio)
+        back_path = score_follower.get_backwards_path(10**6)
+        self.assertEqual(back_path[-1], (0, 0))
+
+    def test_backwards_path_skips_gated_windows(self):
+        score_follower = self.make_score_follower(
+            silence_threshold=-60, silence_hangover=1
+        )
+        score_follower.step(self.audio[:, : 2048 * 4])
+        score_follower.step(np.zeros((1, 2048 * 4), dtype=np.float32))
+        score_follower.step(self.audio[:, 2048 * 4 :])
+        self.assertEqual(score_follower.gated_frames, 3)
+
+        back_path = score_follower.get_backwards_path(10**6)
+        self.assertEqual(back_path[-1], (0, 0))
+        # Every window but the gated ones is on the path, in the index space of path
+        live_indices = {t for _, t in back_path} | {score_follower.live_index}
+        self.assertEqual(
+            sorted(set(range(score_follower.live_index + 1)) - live_indices), [5, 6, 7]
+        )
+        # The latest alignment points precede the current position
+        for point in score_follower.path.as_array()[-4:-1]:
+            self.assertIn(tuple(point), back_path)
+
+    def test_path_difference(self):
+        score_follower = self.make_score_follower()
+        for point in [(0, 0), (1, 1), (2, 2), (2, 3)]:
+            score_follower.path.append(*point)
+        # Points before the back path are not compared
+        self.assertEqual(score_follower.get_path_difference([(2, 3), (1, 1)]), [(2, 2)])
+        self.assertEqual(score_follower.get_path_difference([]), [])
+
+    def test_adaptive_window_stays_in_bounds(self):
+        fixed = self.make_score_follower(hop_length=512)
+        adaptive = self.make_score_follower(hop_length=512, min_c=3)
+
+        widths = []
+        for i in range(0, self.audio.shape[-1], 512):
+            fixed.step(self.audio[:, i : i + 512])
+            adaptive.step(self.audio[:, i : i + 512])
+            widths.append(adaptive.effective_c)
+
+        self.assertEqual(fixed.effective_c, 10)
+        self.assertTrue(all(3 <= width <= 10 for width in widths))
+        self.assertLess(min(widths), 10)
+        self.assertEqual(adaptive.path[-1], fixed.path[-1])
+
+    def test_adaptive_window_widens_on_cost_spike(self):
+        score_follower = self.make_score_follower(hop_length=512, min_c=3)
+        score_follower.step(self.audio)
+        narrowed = score_follower.effective_c
+
+        noise = np.random.default_rng(0).normal(scale=0.3, size=(1, 2048 * 4))
+        score_follower.step(noise.astype(np.float32))
+        self.assertGreater(score_follower.effective_c, narrowed)
+
+    def test_window_cap_narrows_search(self):
+        full = self.make_score_follower(hop_length=512)
+        capped = self.make_score_follower(hop_length=512)
+        full.step(self.audio)
+        capped.step(self.audio, window_cap=3)
+
+        self.assertEqual(len(capped.path), len(full.path))
+        self.assertLess(
+            np.isfinite(capped.otw.accumulated_cost).sum(),
+            np.isfinite(full.otw.accumulated_cost).sum(),
+        )
+        self.assertEqual(capped.effective_c, 10)
+
+    def test_coasting_follows_recent_tempo(self):
+        full = self.make_score_follower(hop_length=512)
+        full.step(self.audio)
+
+        score_follower = self.make_score_follower(hop_length=512)
+        half = self.audio.shape[-1] // 2
+        score_follower.step(self.audio[:, :half])
+        ref_index = score_follower.path[-1][0]
+
+        score_follower.step(self.audio[:, half : half + 512 * 8], coast=True)
+        self.assertEqual(score_follower.coasted_frames, 8)
+        self.assertEqual(score_follower.otw.live_index, score_follower.live_index)
+        self.assertGreater(score_follower.path[-1][0], ref_index)
+
+        # Alignment resumes from the predicted position
+        score_follower.step(self.audio[:, half + 512 * 8 :])
+        self.assertEqual(len(score_follower.path), len(full.path))
+        self.assertLessEqual(abs(score_follower.path[-1][0] - full.path[-1][0]), 2)
+
+    def test_precomputed_reference_features(self):
+        from_file = self.make_score_follower(hop_length=512)
+        precomputed = self.make_score_follower(
+            hop_length=512, ref_features=from_file.ref_features
+        )
+        self.assertIs(precomputed.ref_features, from_file.ref_features)
+
+        from_file.step(self.audio)
+        precomputed.step(self.audio)
+        np.testing.assert_array_equal(
+            precomputed.path.as_array(), from_file.path.as_array()
+        )
+
+        with self.assertRaises(ValueError):
+            ScoreFollower(
+                ref_filename=None,
+                sample_rate=self.sample_rate,
+                win_length=4096,
+                ref_features=from_file.ref_features,
+            )
+        with self.assertRaises(ValueError):
+            self.make_score_follower(
+                hop_length=1024, ref_features=from_file.ref_features
+            )
+
+    def test_nbytes_counts_alignment_state(self):
+        score_follower = self.make_score_follower()
+        otw = score_follower.otw
+        self.assertGreaterEqual(
+            score_follower.nbytes,
+            otw.accumulated_cost.nbytes
+            + otw.predecessor.nbytes
+            + score_follower.ref_features.nbytes,
+        )
+
+    def test_max_history_bounds_memory(self):
+        full = self.make_score_follower(hop_length=512)
+        bounded = self.make_score_follower(hop_length=512, max_history=16)
+        self.assertEqual(bounded.otw.accumulated_cost.shape[1], 16)
+        self.assertLess(bounded.nbytes, full.nbytes)
+
+        for start in range(0, self.audio.shape[-1], 2048):
+            full.step(self.audio[:, start : start + 2048])
+            bounded.step(self.audio[:, start : start + 2048])
+        self.assertGreater(bounded.otw.live_index, 16)
+        np.testing.assert_array_equal(bounded.path.as_array(), full.path.as_array())
+
+        # Backtracking stops at the oldest live frame held
+        back_path = bounded.otw.get_backwards_path(bounded.otw.ref_index)
+        full_back_path = full.otw.get_backwards_path(full.otw.ref_index)
+        self.assertLess(len(back_path), len(full_back_path))
+        self.assertEqual(back_path, full_back_path[: len(back_path)])
+        self.assertGreaterEqual(back_path[-1][1], bounded.otw.live_index - 15)
+
+    def test_close_writes_path_log(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, "path.npy")
+            score_follower = self.make_score_follower(path_log=log_path)
+            score_follower.step(self.audio)
+            score_follower.close()
+            score_follower.close()
+
+            np.testing.assert_array_equal(
+                np.load(log_path), score_follower.path.as_array()
+            )
+
+    def test_invalid_hop_length(self):
+        with self.assertRaises(ValueError):
+            self.make_score_follower(hop_length=4096)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+
+import numpy as np
+
+from src.session_store import SessionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Closable:
+    def __init__(self):
+        self.closed = 0
+
+    def close(self):
+        self.closed += 1
+
+
+class TestSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.store = SessionStore(ttl=100, max_bytes=1000, clock=self.clock)
+
+    def test_create_get_remove(self):
+        self.store.create("a" * 64)
+        self.assertIn("a" * 64, self.store)
+        self.assertEqual(self.store.get("a" * 64), {})
+        with self.assertRaises(KeyError):
+            self.store.create("a" * 64)
+
+        self.assertTrue(self.store.remove("a" * 64))
+        self.assertFalse(self.store.remove("a" * 64))
+        self.assertIsNone(self.store.get("a" * 64))
+        with self.assertRaises(KeyError):
+            self.store.set("a" * 64, "filename", "score.musicxml")
+
+    def test_memory_accounting(self):
+        self.store.create("a")
+        self.store.set("a", "filename", "score.musicxml")
+        self.store.set("a", "buffer", np.zeros(100, dtype=np.float32))
+        self.assertEqual(self.store.nbytes(), 400)
+
+        self.store.set("a", "buffer", np.zeros(50, dtype=np.float32))
+        self.assertEqual(self.store.nbytes(), 200)
+        self.assertEqual(self.store.snapshot()[0]["values"], {"filename": 0, "buffer": 200})
+
+        self.store.remove("a")
+        self.assertEqual(self.store.nbytes(), 0)
+
+    def test_evicts_least_recently_used(self):
+        for token in "abc":
+            self.store.create(token)
+            self.store.set(token, "buffer", np.zeros(300, dtype=np.uint8))
+            self.clock.now += 1
+        self.store.get("a")  # "b" is now the least recently used
+
+        self.store.set("c", "extra", np.zeros(200, dtype=np.uint8))
+        self.assertNotIn("b", self.store)
+        self.assertIn("a", self.store)
+        self.assertIn("c", self.store)
+        self.assertEqual(self.store.evictions, 1)
+        self.assertLessEqual(self.store.nbytes(), 1000)
+
+    def test_keeps_session_larger_than_budget(self):
+        self.store.create("a")
+        self.store.set("a", "buffer", np.zeros(2000, dtype=np.uint8))
+        self.assertIn("a", self.store)
+
+    def test_reap_idle_sessions(self):
+        self.store.create("a")
+        self.store.create("b")
+        self.clock.now = 60
+        self.store.get("b")
+        self.clock.now = 120
+
+        self.assertEqual(self.store.reap(), 1)
+        self.assertNotIn("a", self.store)
+        self.assertIn("b", self.store)
+        self.assertEqual(self.store.expirations, 1)
+
+    def test_reaper_thread(self):
+        store = SessionStore(ttl=0)
+        store.create("a")
+        store.start_reaper(interval=0.01)
+        try:
+            for _ in range(100):
+                if "a" not in store:
+                    break
+                store._stop_reaper.wait(0.01)
+        finally:
+            store.stop_reaper()
+        self.assertNotIn("a", store)
+
+    def test_values_closed_when_released(self):
+        values = {token: Closable() for token in "abc"}
+        for token, value in values.items():
+            self.store.create(token)
+            self.store.set(token, "synchronizer", value)
+            self.store.set(token, "synchronizer", value)  # Storing it again keeps it
+        self.assertEqual([v.closed for v in values.values()], [0, 0, 0])
+
+        replacement = Closable()
+        self.store.set("a", "synchronizer", replacement)
+        self.assertEqual(values["a"].closed, 1)
+
+        self.store.remove("b")
+        self.assertEqual(values["b"].closed, 1)
+
+        self.store.set("c", "buffer", np.zeros(1001, dtype=np.uint8))  # Evicts "a"
+        self.assertNotIn("a", self.store)
+        self.assertEqual((replacement.closed, values["c"].closed), (1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+from time import sleep
 from unittest.mock import patch, MagicMock
 import numpy as np
 from src.synchronizer import Synchronizer
@@ -17,6 +18,7 @@ class TestSynchronizer(unittest.TestCase):
         self.mock_score_follower = MockScoreFollower.return_value
         self.mock_audio_buffer = MockAudioBuffer.return_value
         self.mock_pid = MockPID.return_value
+        self.mock_score_follower.effective_c = 10
 
         # Instantiate Synchronizer
         self.synchronizer = Synchronizer(reference="path/to/score")
@@ -43,6 +45,108 @@ class TestSynchronizer(unittest.TestCase):
 
         self.assertEqual(playback_rate, 1.0)
         self.assertEqual(estimated_time, soloist_time)
+        self.assertEqual(set(self.synchronizer.timings), {"pid", "total"})
+
+    def test_synchronizer_step_batch(self):
+        chunks = [np.random.random((1, 2048)) for _ in range(3)]
+        accompanist_times = [0.0, 0.05, 0.1]
+        self.synchronizer.score_follower.step = MagicMock(side_effect=[0.1, 0.2, 0.3])
+        self.synchronizer.live_buffer.write = MagicMock()
+        self.synchronizer.PID = MagicMock(side_effect=[1.0, 1.1, 1.2])
+
+        results = self.synchronizer.step_batch(chunks, accompanist_times)
+
+        self.assertEqual(results, [(1.0, 0.1), (1.1, 0.2), (1.2, 0.3)])
+        self.assertEqual(self.synchronizer.live_buffer.write.call_count, 3)
+        # The PID controller advances by the audio duration of each chunk
+        for call, accompanist_time, position in zip(
+            self.synchronizer.PID.call_args_list, accompanist_times, [0.1, 0.2, 0.3]
+        ):
+            self.assertAlmostEqual(call.args[0], accompanist_time - position)
+            self.assertAlmostEqual(call.kwargs["dt"], 2048 / 44100)
+
+    def test_synchronizer_degrades_when_behind(self):
+        now = [100.0]
+        self.synchronizer.clock = lambda: now[0]
+        self.synchronizer.BASELINE_DRIFT = 0
+        self.synchronizer.score_follower.step = MagicMock(return_value=0.0)
+        self.synchronizer.live_buffer.write = MagicMock()
+        chunk = np.zeros((1, 4410))  # 0.1 seconds
+
+        self.synchronizer.score_follower.effective_c = 8
+        def step(arrival):
+            now[0] = arrival
+            self.synchronizer.step(chunk, 0.0)
+            return self.synchronizer.score_follower.step.call_args.kwargs
+
+        # Chunks arriving in real time are processed normally
+        self.assertEqual(step(100.0), {"window_cap": None, "coast": False})
+        self.assertEqual(step(100.1), {"window_cap": None, "coast": False})
+        self.assertEqual(self.synchronizer.mode, Synchronizer.NORMAL)
+        self.assertEqual(self.synchronizer.effective_c, 8)
+
+        # A chunk arriving late narrows the search window
+        self.assertEqual(step(100.5), {"window_cap": 5, "coast": False})
+        self.assertAlmostEqual(self.synchronizer.latency, 0.3)
+        self.assertEqual(self.synchronizer.mode, Synchronizer.CATCH_UP)
+        self.assertEqual(self.synchronizer.effective_c, 5)
+
+        # Stale audio is not analysed
+        self.assertEqual(step(101.6), {"window_cap": 5, "coast": True})
+        self.assertEqual(self.synchronizer.mode, Synchronizer.DROP)
+
+        # Once the backlog is cleared, processing returns to normal
+        self.assertEqual(step(101.6), {"window_cap": 5, "coast": True})
+        for _ in range(10):
+            step(101.6)
+        self.assertEqual(self.synchronizer.mode, Synchronizer.NORMAL)
+        self.assertAlmostEqual(self.synchronizer.latency, 0.2)
+        self.assertEqual(self.synchronizer.catch_up_steps, 8)
+        self.assertEqual(self.synchronizer.dropped_steps, 4)
+
+    def test_synchronizer_accepts_persistent_latency(self):
+        now = [100.0]
+        self.synchronizer.clock = lambda: now[0]
+        self.synchronizer.score_follower.step = MagicMock(return_value=0.0)
+        self.synchronizer.live_buffer.write = MagicMock()
+        chunk = np.zeros((1, 4410))  # 0.1 seconds
+
+        self.synchronizer.step(chunk, 0.0)
+        # The client paused for two seconds, then streams in real time again
+        now[0] += 2.0
+        self.synchronizer.step(chunk, 0.0)
+        self.assertEqual(self.synchronizer.mode, Synchronizer.DROP)
+        for _ in range(60):
+            now[0] += 0.1
+            self.synchronizer.step(chunk, 0.0)
+        self.assertEqual(self.synchronizer.mode, Synchronizer.NORMAL)
+        self.assertAlmostEqual(self.synchronizer.latency, 0.0)
+
+    def test_synchronizer_monitors_deadlines(self):
+        score_follower = self.synchronizer.score_follower
+        score_follower.live_index = 0
+        score_follower.otw.ref_index = 7
+        score_follower.otw.window_size = 10
+        self.synchronizer.live_buffer.write = MagicMock()
+
+        def step(frames, **kwargs):
+            score_follower.live_index += 1
+            sleep(0.02)
+            return 0.0
+
+        score_follower.step = MagicMock(side_effect=step)
+        chunk = np.zeros((1, 441))  # 10 ms, processed in over 20 ms
+        with self.assertLogs("src.deadline_monitor", "WARNING"):
+            self.synchronizer.step(chunk, 0.0)
+
+        deadlines = self.synchronizer.deadlines
+        self.assertEqual((deadlines.frames, deadlines.missed), (1, 1))
+        (worst,) = deadlines.worst()
+        self.assertGreater(worst["ratio"], 1)
+        self.assertEqual(worst["live_index"], 1)
+        self.assertEqual(worst["ref_index"], 7)
+        self.assertEqual(worst["window_size"], 10)
+        self.assertEqual(worst["mode"], Synchronizer.NORMAL)
 
     def test_save_performance(self):
         # Spy on the live_buffer.save method
@@ -55,6 +159,10 @@ class TestSynchronizer(unittest.TestCase):
         # Assert that live_buffer.save was called with the correct arguments
         self.synchronizer.live_buffer.save.assert_called_once_with(path)
 
+    def test_close(self):
+        self.synchronizer.close()
+        self.mock_score_follower.close.assert_called_once_with()
+
 
 if __name__ == "__main__":
     unittest.main()
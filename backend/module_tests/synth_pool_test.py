@@ -0,0 +1,147 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+import threading
+import types
+
+import numpy as np
+import pretty_midi
+import soundfile as sf
+
+from src.audio_generator import AudioGenerator
+from src.synth_pool import SynthPool, SynthRenderer, get_synth_pool
+
+
+class FakeSynth:
+    """Stands in for fluidsynth.Synth, recording the events at each sample position."""
+
+    instances = []
+
+    def __init__(self, gain=0.2, samplerate=44100):
+        self.samplerate = samplerate
+        self.position = 0
+        self.events = []
+        FakeSynth.instances.append(self)
+
+    def sfload(self, path):
+        return 1
+
+    def system_reset(self):
+        self.events.append(("reset", self.position))
+
+    def program_select(self, channel, sfid, bank, preset):
+        self.events.append(("program", self.position, channel, bank, preset))
+
+    def noteon(self, channel, key, velocity):
+        self.events.append(("noteon", self.position, key))
+
+    def noteoff(self, channel, key):
+        self.events.append(("noteoff", self.position, key))
+
+    def cc(self, channel, control, value):
+        self.events.append(("cc", self.position, control))
+
+    def pitch_bend(self, channel, value):
+        self.events.append(("bend", self.position, value))
+
+    def get_samples(self, num_samples):
+        self.position += num_samples
+        return np.ones(2 * num_samples, dtype=np.int16)
+
+    def delete(self):
+        pass
+
+
+def make_instrument(program=0, offset=0.0):
+    instrument = pretty_midi.Instrument(program=program)
+    instrument.notes.append(pretty_midi.Note(100, 60, offset + 0.0, offset + 0.5))
+    instrument.notes.append(pretty_midi.Note(100, 60, offset + 0.5, offset + 1.0))
+    instrument.control_changes.append(pretty_midi.ControlChange(64, 127, offset + 0.5))
+    instrument.pitch_bends.append(pretty_midi.PitchBend(-100, offset + 0.25))
+    return instrument
+
+
+class TestSynthPool(unittest.TestCase):
+    def setUp(self):
+        FakeSynth.instances = []
+        self.fluidsynth = types.ModuleType("fluidsynth")
+        self.fluidsynth.Synth = FakeSynth
+        patcher = patch.dict(sys.modules, {"fluidsynth": self.fluidsynth})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.soundfont = os.path.join(self.tmp.name, "test.sf2")
+        open(self.soundfont, "wb").close()
+
+    def test_render_places_events_at_their_samples(self):
+        renderer = SynthRenderer(self.soundfont, sample_rate=1000)
+        audio = renderer.render(make_instrument(program=42))
+
+        self.assertEqual(audio.shape, (1000, 2))
+        self.assertEqual(audio.dtype, np.int16)
+        self.assertEqual(
+            renderer.synth.events,
+            [
+                ("reset", 0),
+                ("program", 0, 0, 0, 42),
+                ("noteon", 0, 60),
+                ("bend", 250, -100),
+                # The repeated note is released before the controller and restruck
+                ("noteoff", 500, 60),
+                ("cc", 500, 64),
+                ("noteon", 500, 60),
+                ("noteoff", 1000, 60),
+            ],
+        )
+
+    def test_pool_reuses_synths(self):
+        pool = SynthPool(self.soundfont, sample_rate=1000, max_synths=1)
+        output_files = [os.path.join(self.tmp.name, f"{i}.wav") for i in range(4)]
+
+        threads = [
+            threading.Thread(
+                target=pool.render_to_file, args=(make_instrument(), output_file)
+            )
+            for output_file in output_files
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(pool.loads, 1)
+        self.assertEqual(len(FakeSynth.instances), 1)
+        for output_file in output_files:
+            audio, sample_rate = sf.read(output_file, dtype="int16")
+            self.assertEqual((audio.shape, sample_rate), ((1000, 2), 1000))
+
+    def test_quartet_loads_the_soundfont_once(self):
+        score = pretty_midi.PrettyMIDI()
+        for i in range(4):
+            score.instruments.append(make_instrument(program=40 + i, offset=i))
+        score_path = os.path.join(self.tmp.name, "quartet.mid")
+        score.write(score_path)
+
+        output_dir = os.path.join(self.tmp.name, "quartet")
+        generator = AudioGenerator(score_path, soundfont_path=self.soundfont)
+        generator.generate_audio(output_dir, tempo=120, sample_rate=1000)
+
+        self.assertEqual(get_synth_pool(self.soundfont, 1000).loads, 1)
+        self.assertEqual(
+            sorted(os.listdir(output_dir)), [f"instrument_{i}.wav" for i in range(4)]
+        )
+
+    def test_missing_pyfluidsynth(self):
+        with patch.dict(sys.modules, {"fluidsynth": None}):
+            with self.assertRaises(RuntimeError):
+                SynthRenderer(self.soundfont)
+        with self.assertRaises(FileNotFoundError):
+            SynthRenderer(os.path.join(self.tmp.name, "missing.sf2"))
+
+
+if __name__ == "__main__":
+    unittest.main()
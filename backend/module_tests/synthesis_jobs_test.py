@@ -0,0 +1,101 @@
+import unittest
+import tempfile
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import soundfile as sf
+
+from src.feature_registry import FeatureRegistry
+from src.render_cache import RenderCache
+from src.synthesis_jobs import SynthesisJob, SynthesisJobQueue
+
+
+class TestSynthesisJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.sample_rate = 22050
+        self.queue = SynthesisJobQueue(
+            cache_dir=os.path.join(self.tmp.name, "cache"),
+            cache_max_bytes=10**8,
+            soundfont_path=os.path.join(self.tmp.name, "font.sf2"),
+            sample_rate=self.sample_rate,
+            win_length=2048,
+            hop_length=1024,
+            executor=ThreadPoolExecutor(max_workers=2),
+            render_cache=RenderCache(os.path.join(self.tmp.name, "cache"), 10**8),
+        )
+
+    def tearDown(self):
+        self.queue.shutdown()
+        self.tmp.cleanup()
+
+    def fake_render(self, score_path, tempo, *args):
+        t = np.arange(self.sample_rate) / self.sample_rate
+        paths = []
+        for i, freq in enumerate((440, 330)):
+            path = Path(self.tmp.name) / f"instrument_{i}.wav"
+            sf.write(path, 0.5 * np.sin(2 * np.pi * freq * t), self.sample_rate)
+            paths.append(path)
+        return paths, (1, 1)
+
+    def test_job_prepares_reference_features(self):
+        with patch("src.synthesis_jobs._render_job", self.fake_render):
+            job = self.queue.submit("token", "score.musicxml", "score.musicxml", 100)
+            while not job.wait(timeout=5):
+                pass
+
+        self.assertEqual(job.status, SynthesisJob.DONE, job.error)
+        self.assertIs(self.queue.get(job.job_id), job)
+        self.assertEqual(job.accompaniment_path.name, "instrument_1.wav")
+        self.assertEqual(
+            job.ref_features.num_features, (self.sample_rate - 2048) // 1024 + 1
+        )
+        self.assertEqual(job.to_dict()["status"], "done")
+        self.assertEqual(self.queue.status_counts()[SynthesisJob.DONE], 1)
+        self.assertEqual(self.queue.status_counts()[SynthesisJob.QUEUED], 0)
+        render_cache = self.queue.render_cache
+        self.assertEqual((render_cache.hits, render_cache.misses), (1, 1))
+
+    def test_failed_render(self):
+        def fail(*args):
+            raise RuntimeError("fluidsynth failed")
+
+        with patch("src.synthesis_jobs._render_job", fail):
+            job = self.queue.submit("token", "score.musicxml", "score.musicxml", 100)
+            job.wait(timeout=5)
+
+        self.assertEqual(job.status, SynthesisJob.FAILED)
+        self.assertEqual(job.error, "fluidsynth failed")
+        self.assertIsNone(job.ref_features)
+
+    def test_jobs_share_registered_features(self):
+        self.queue.feature_registry = FeatureRegistry()
+        jobs = []
+        with patch("src.synthesis_jobs._render_job", self.fake_render):
+            for _ in range(2):
+                job = self.queue.submit("token", "score.musicxml", "score.musicxml", 100)
+                while not job.wait(timeout=5):
+                    pass
+                jobs.append(job)
+
+        self.assertIs(jobs[1].ref_features, jobs[0].ref_features)
+        self.assertTrue(jobs[0].ref_features.frozen)
+        self.assertEqual(self.queue.feature_registry.misses, 1)
+
+    def test_finished_jobs_expire(self):
+        self.queue.retention = 0
+        with patch("src.synthesis_jobs._render_job", self.fake_render):
+            first = self.queue.submit("token", "score.musicxml", "score.musicxml", 100)
+            while not first.wait(timeout=5):
+                pass
+            second = self.queue.submit("token", "score.musicxml", "score.musicxml", 90)
+
+        self.assertIsNone(self.queue.get(first.job_id))
+        self.assertIs(self.queue.get(second.job_id), second)
+
+
+if __name__ == "__main__":
+    unittest.main()
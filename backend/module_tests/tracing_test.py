@@ -0,0 +1,126 @@
+import unittest
+import gc
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from src import tracing
+from src.features_cens import CENSFeatures
+from src.otw import OnlineTimeWarping
+from src.tracing import Tracer
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.tracer = Tracer(capacity=8)
+
+    def tearDown(self):
+        self.tracer.disable()
+
+    def test_disabled_records_nothing(self):
+        with self.tracer.span("otw.row"):
+            pass
+        self.assertEqual(len(self.tracer), 0)
+        self.assertEqual(self.tracer.chrome_trace()["traceEvents"], [])
+
+    def test_nested_spans(self):
+        self.tracer.enable()
+        with self.tracer.span("otw.best_step"):
+            with self.tracer.span("otw.column"):
+                pass
+
+        # Spans are written when they end
+        inner, outer = self.tracer.spans()
+        self.assertEqual((inner["name"], outer["name"]), ("otw.column", "otw.best_step"))
+        self.assertLessEqual(outer["start"], inner["start"])
+        self.assertLessEqual(inner["end"], outer["end"])
+        self.assertEqual(inner["thread"], threading.get_native_id())
+        self.assertGreaterEqual(inner["cpu"], 0)
+
+    def test_ring_keeps_most_recent_spans(self):
+        self.tracer.enable()
+        for i in range(20):
+            with self.tracer.span(f"step{i}"):
+                pass
+        self.assertEqual(len(self.tracer), 8)
+        self.assertEqual(
+            [span["name"] for span in self.tracer.spans()],
+            [f"step{i}" for i in range(12, 20)],
+        )
+
+        self.tracer.clear()
+        self.assertEqual(self.tracer.spans(), [])
+
+    def test_traced_decorator(self):
+        @self.tracer.traced("features.insert")
+        def insert(x):
+            return x + 1
+
+        self.assertEqual(insert(1), 2)
+        self.tracer.enable()
+        self.assertEqual(insert(2), 3)
+        self.assertEqual(
+            [span["name"] for span in self.tracer.spans()], ["features.insert"]
+        )
+
+    def test_records_gc_and_threads(self):
+        def loop():
+            with self.tracer.span("midi_performance.loop"):
+                pass
+
+        self.tracer.enable()
+        gc.collect()
+        thread = threading.Thread(target=loop, name="performance")
+        thread.start()
+        thread.join()
+        self.tracer.disable()
+
+        names = [span["name"] for span in self.tracer.spans()]
+        self.assertIn("gc.gen2", names)
+        threads = {span["name"]: span["thread"] for span in self.tracer.spans()}
+        self.assertNotEqual(threads["midi_performance.loop"], threads["gc.gen2"])
+
+        events = self.tracer.chrome_trace()["traceEvents"]
+        metadata = [e for e in events if e["ph"] == "M"]
+        self.assertIn("performance", [e["args"]["name"] for e in metadata])
+
+    def test_export_chrome_trace(self):
+        self.tracer.enable()
+        with self.tracer.span("score_follower.step"):
+            pass
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.json")
+            self.tracer.export_chrome_trace(path)
+            with open(path) as f:
+                trace = json.load(f)
+
+        (event,) = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+        self.assertEqual(event["name"], "score_follower.step")
+        self.assertEqual(event["cat"], "score_follower")
+        self.assertEqual(event["pid"], os.getpid())
+        self.assertGreaterEqual(event["dur"], 0)
+        self.assertIn("cpu_us", event["args"])
+
+    def test_otw_stages(self):
+        rng = np.random.default_rng(0)
+        audio = rng.standard_normal(2048 * 12).astype(np.float32)
+        reference = CENSFeatures.from_audio(audio, 22050, 2048, 2048)
+        otw = OnlineTimeWarping(reference, 22050, 2048, 4, 3, 0.5)
+
+        tracing.enable()
+        try:
+            for m in range(4):
+                otw.insert(audio[m * 2048 : (m + 1) * 2048])
+        finally:
+            tracing.disable()
+        names = {span["name"] for span in tracing.TRACER.spans()}
+        tracing.TRACER.clear()
+        self.assertTrue({"otw.row", "otw.best_step", "otw.column"} <= names)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+import tempfile
+import os
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import numpy as np
+import soundfile as sf
+
+from src.feature_registry import FeatureRegistry
+from src.render_cache import RenderCache
+from src.warmup import Warmup
+
+
+class TestWarmup(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.musicxml_dir = os.path.join(self.tmp.name, "musicxml")
+        os.mkdir(self.musicxml_dir)
+        for name in ("a.musicxml", "b.musicxml", "notes.txt"):
+            with open(os.path.join(self.musicxml_dir, name), "w") as f:
+                f.write(name)
+        self.soundfont = os.path.join(self.tmp.name, "font.sf2")
+        with open(self.soundfont, "wb") as f:
+            f.write(b"font")
+
+        self.sample_rate = 22050
+        self.render_cache = RenderCache(os.path.join(self.tmp.name, "renders"), 10**8)
+        self.renders = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_warmup(self):
+        return Warmup(
+            self.musicxml_dir,
+            [90, 120],
+            self.render_cache,
+            FeatureRegistry(cache_dir=os.path.join(self.tmp.name, "features")),
+            self.soundfont,
+            self.sample_rate,
+            win_length=2048,
+            hop_length=1024,
+            executor=ThreadPoolExecutor(max_workers=2),
+        )
+
+    def fake_render_instruments(
+        self, cache, score_path, tempo, soundfont_path, sample_rate, instrument_indices
+    ):
+        if os.path.basename(score_path) == "b.musicxml" and tempo == 120:
+            raise RuntimeError("fluidsynth failed")
+        t = np.arange(sample_rate // 2) / sample_rate
+        offset = ord(os.path.basename(score_path)[0])  # Different audio per score
+
+        def render(output_file, freq):
+            self.renders.append((score_path, tempo))
+            sf.write(output_file, 0.5 * np.sin(2 * np.pi * freq * t), sample_rate)
+
+        return [
+            cache.get_or_render(
+                RenderCache.make_key(score_path, tempo, soundfont_path, sample_rate, i),
+                lambda output_file, i=i: render(output_file, offset + tempo + 100 * i),
+            )
+            for i in instrument_indices
+        ]
+
+    def run_warmup(self, warmup):
+        with patch("src.warmup.render_instruments", self.fake_render_instruments):
+            self.assertTrue(warmup.start())
+            self.assertTrue(warmup.wait(timeout=30))
+        return warmup.progress()
+
+    def test_warms_every_score_and_tempo(self):
+        warmup = self.make_warmup()
+        self.assertEqual(len(warmup.plan()), 4)
+
+        progress = self.run_warmup(warmup)
+        self.assertEqual(progress["status"], Warmup.DONE)
+        self.assertEqual(progress["total"], 4)
+        self.assertEqual(progress["completed"], 3)
+        self.assertEqual(progress["failed"], 1)
+        self.assertEqual(
+            progress["errors"],
+            [{"score": "b.musicxml", "tempo": 120, "error": "fluidsynth failed"}],
+        )
+
+        # Lookups made by the workers' caches are counted by the server's cache
+        self.assertEqual((self.render_cache.hits, self.render_cache.misses), (0, 6))
+
+        score_path = os.path.join(self.musicxml_dir, "a.musicxml")
+        self.assertTrue(warmup.is_up_to_date(score_path, 90))
+        self.assertEqual(len(os.listdir(os.path.join(self.tmp.name, "features"))), 3)
+
+    def test_resumes_and_skips_up_to_date_assets(self):
+        self.run_warmup(self.make_warmup())
+        renders = len(self.renders)
+
+        progress = self.run_warmup(self.make_warmup())
+        self.assertEqual(progress["skipped"], 3)
+        self.assertEqual(progress["completed"], 0)
+        self.assertEqual(len(self.renders), renders)
+
+        # A changed score is rendered again
+        with open(os.path.join(self.musicxml_dir, "a.musicxml"), "w") as f:
+            f.write("changed")
+        progress = self.run_warmup(self.make_warmup())
+        self.assertEqual(progress["skipped"], 1)
+        self.assertEqual(progress["completed"], 2)
+
+    def test_requires_feature_cache(self):
+        with self.assertRaises(ValueError):
+            Warmup(
+                self.musicxml_dir,
+                [100],
+                self.render_cache,
+                FeatureRegistry(),
+                self.soundfont,
+                self.sample_rate,
+                2048,
+                1024,
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
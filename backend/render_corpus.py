@@ -0,0 +1,259 @@
+"""
+Renders the evaluation corpus described by a manifest across a process pool.
+
+The manifest (YAML or JSON, see corpus_manifest.yaml) lists pieces, each with a
+score rendered at several tempos for some of its instruments, and the MIDI files
+of its altered performances, rendered as written so that their tempo curves are
+kept. Every output is keyed by the SHA-256 of its MIDI file and soundfont together
+with its tempo, instrument, sample rate and renderer. An index file in the output
+directory maps each output to its inputs and key; outputs whose key is unchanged
+since a previous run are skipped, so an interrupted run resumes where it stopped
+and editing one alteration only renders that alteration again. Paths in the
+manifest and the index are relative to the manifest's directory. Run from the
+backend directory.
+
+Example:
+    python render_corpus.py corpus_manifest.yaml --dry-run
+    python render_corpus.py corpus_manifest.yaml --workers 8
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import as_completed
+from time import perf_counter
+
+import yaml
+
+from src.audio_generator import AudioGenerator
+from src.render_cache import RENDERER, file_digest
+from src.synth_pool import render_executor
+
+INDEX_FILENAME = "index.json"
+
+
+def load_manifest(manifest_path):
+    """
+    Return the settings of a manifest and the outputs it describes.
+
+    Returns
+    -------
+    settings : dict
+        Absolute `output_dir` and `soundfont` paths, the `sample_rate` and the
+        manifest directory `base_dir`.
+    jobs : list of dict
+        One entry per output: `output` and `midi` paths, `tempo` (None to render
+        as written), `instrument_index` and `piece`.
+
+    Raises
+    ------
+    ValueError
+        If an alteration pattern matches no file or two jobs share an output.
+    """
+    with open(manifest_path) as f:
+        manifest = yaml.safe_load(f)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+
+    def resolve(path):
+        return os.path.normpath(os.path.join(base_dir, path))
+
+    settings = {
+        "base_dir": base_dir,
+        "output_dir": resolve(manifest.get("output_dir", "corpus")),
+        "soundfont": resolve(
+            manifest.get("soundfont", os.path.join("soundfonts", "FluidR3_GM.sf2"))
+        ),
+        "sample_rate": int(manifest.get("sample_rate", 44100)),
+    }
+
+    jobs = {}
+
+    def add(piece, midi_path, tempo, instrument_index):
+        stem = os.path.splitext(os.path.basename(midi_path))[0]
+        timing = f"_{tempo:g}bpm" if tempo is not None else ""
+        output = os.path.join(
+            settings["output_dir"],
+            piece,
+            f"{stem}{timing}_instrument_{instrument_index}.wav",
+        )
+        if output in jobs:
+            raise ValueError(f"Several renders of {piece} would be written to {output}")
+        jobs[output] = {
+            "output": output,
+            "midi": midi_path,
+            "tempo": tempo,
+            "instrument_index": instrument_index,
+            "piece": piece,
+        }
+
+    for piece, spec in manifest["pieces"].items():
+        for tempo in spec.get("tempos", []):
+            for instrument_index in spec.get("instruments", [0]):
+                add(piece, resolve(spec["score"]), float(tempo), instrument_index)
+        for pattern in spec.get("alterations", []):
+            paths = sorted(glob.glob(resolve(pattern)))
+            if not paths:
+                raise ValueError(f"No alteration of {piece} matches {pattern}")
+            for path in paths:
+                for instrument_index in spec.get("alteration_instruments", [0]):
+                    add(piece, path, None, instrument_index)
+    return settings, list(jobs.values())
+
+
+def job_key(job, soundfont_path, sample_rate: int) -> str:
+    """Return the hash of everything the audio of `job` depends on."""
+    params = {
+        "midi": file_digest(job["midi"]),
+        "tempo": job["tempo"],
+        "soundfont": file_digest(soundfont_path),
+        "sample_rate": sample_rate,
+        "instrument_index": job["instrument_index"],
+        "renderer": RENDERER,
+    }
+    return hashlib.sha256(
+        json.dumps(params, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def read_index(index_path):
+    try:
+        with open(index_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_index(index_path, index):
+    """Atomically replace the index file, so that an interrupted run can resume."""
+    fd, tmp_name = tempfile.mkstemp(suffix=".json", dir=os.path.dirname(index_path))
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(dict(sorted(index.items())), f, indent=2)
+        os.replace(tmp_name, index_path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+def render_job(midi_path, tempo, instrument_index, soundfont_path, sample_rate, output):
+    """Worker: render one instrument to a temporary file moved to `output`."""
+    generator = AudioGenerator(midi_path, soundfont_path=soundfont_path)
+    fd, tmp_name = tempfile.mkstemp(
+        prefix=".render-", suffix=".wav", dir=os.path.dirname(output)
+    )
+    os.close(fd)
+    try:
+        generator.generate_solo(
+            tmp_name,
+            tempo=tempo,
+            sample_rate=sample_rate,
+            instrument_index=instrument_index,
+        )
+        os.replace(tmp_name, output)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("manifest", help="YAML or JSON manifest of the corpus")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Rendering processes, each holding a copy of the soundfont "
+        "(default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Render outputs that are up to date"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="List the outputs to render and exit"
+    )
+    args = parser.parse_args()
+
+    settings, jobs = load_manifest(args.manifest)
+    output_dir, base_dir = settings["output_dir"], settings["base_dir"]
+    soundfont, sample_rate = settings["soundfont"], settings["sample_rate"]
+    if not os.path.isfile(soundfont):
+        parser.error(f"Soundfont not found: {soundfont}")
+    index_path = os.path.join(output_dir, INDEX_FILENAME)
+    previous = read_index(index_path)
+
+    index, pending = {}, []
+    for job in jobs:
+        name = os.path.relpath(job["output"], output_dir)
+        entry = {
+            "piece": job["piece"],
+            "midi": os.path.relpath(job["midi"], base_dir),
+            "tempo": job["tempo"],
+            "instrument_index": job["instrument_index"],
+            "soundfont": os.path.relpath(soundfont, base_dir),
+            "sample_rate": sample_rate,
+            "renderer": RENDERER,
+            "key": job_key(job, soundfont, sample_rate),
+        }
+        up_to_date = (
+            previous.get(name, {}).get("key") == entry["key"]
+            and os.path.isfile(job["output"])
+        )
+        if up_to_date and not args.force:
+            index[name] = entry
+        else:
+            pending.append((name, entry, job))
+    print(f"{len(jobs)} output(s): {len(index)} up to date, {len(pending)} to render")
+
+    if args.dry_run:
+        for name, _, _ in pending:
+            print(f"  {name}")
+        return
+
+    for job in jobs:
+        os.makedirs(os.path.dirname(job["output"]), exist_ok=True)
+    # Entries of outputs no longer in the manifest are dropped
+    write_index(index_path, index)
+    if not pending:
+        return
+
+    start = perf_counter()
+    failures = 0
+    with render_executor(soundfont, sample_rate, args.workers) as executor:
+        futures = {
+            executor.submit(
+                render_job,
+                job["midi"],
+                job["tempo"],
+                job["instrument_index"],
+                soundfont,
+                sample_rate,
+                job["output"],
+            ): (name, entry)
+            for name, entry, job in pending
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            name, entry = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failures += 1
+                print(f"[{done}/{len(pending)}] {name} failed: {e!r}")
+                continue
+            index[name] = entry
+            write_index(index_path, index)
+            print(f"[{done}/{len(pending)}] {name}")
+
+    print(
+        f"Rendered {len(pending) - failures} output(s) in "
+        f"{perf_counter() - start:.1f} s, index written to {index_path}"
+    )
+    if failures:
+        print(f"{failures} render(s) failed")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
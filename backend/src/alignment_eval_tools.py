@@ -13,11 +13,12 @@ with open("config.yaml", "r") as f:
 
 SAMPLE_RATE = config.get("sample_rate")
 WIN_LENGTH = config.get("win_length")
+HOP_LENGTH = config.get("hop_length", WIN_LENGTH)
 REF_TEMPO = config.get("ref_tempo")
 
 FEATURE_NAME = config.get("feature_type", "CENS")
 
-STEP_SIZE = WIN_LENGTH / SAMPLE_RATE  # * (REF_TEMPO / 60) for beats
+STEP_SIZE = HOP_LENGTH / SAMPLE_RATE  # * (REF_TEMPO / 60) for beats
 
 def calculate_warped_times(warping_path, ref_times):
     # map each baseline note time to live time
@@ -69,7 +70,7 @@ def evaluate_alignment(
 ):
     source_df = pd.read_csv(path_alignment_csv)
 
-    warping_path = np.array(warping_path)
+    warping_path = np.asarray(warping_path)
 
     # map each baseline note time to live time
     predicted_times = calculate_warped_times(warping_path, source_df[align_col_ref])
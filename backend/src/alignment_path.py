@@ -0,0 +1,135 @@
+import struct
+
+import numpy as np
+
+
+class AlignmentPath:
+    """
+    Append-only store of (ref_index, live_index) alignment points.
+
+    Points are kept in a preallocated int32 array of shape (capacity, 2) that doubles
+    in size when full, so appending does not allocate per point and the whole path
+    can be handed to numpy code without copying.
+
+    Parameters
+    ----------
+    capacity : int, optional
+        Number of points to preallocate (default: 1024).
+    log_path : str, optional
+        If given, every appended point is also written to this `.npy` file as it
+        arrives. Call `flush()` or `close()` to update the array header on disk.
+
+    Attributes
+    ----------
+    log_path : str or None
+        Path of the `.npy` log file, if logging is enabled.
+    """
+
+    DTYPE = np.dtype("<i4")
+    # Size of the `.npy` header of the log, fixed so that it can be rewritten in
+    # place with any number of points (a multiple of 64 bytes, as numpy writes)
+    LOG_HEADER_LEN = 128
+
+    def __init__(self, capacity: int = 1024, log_path: str = None):
+        self._data = np.empty((max(1, capacity), 2), dtype=self.DTYPE)
+        self._length = 0
+
+        self.log_path = log_path
+        self._log_file = None
+        if log_path is not None:
+            self._log_file = open(log_path, "wb")
+            self._write_log_header()
+
+    def append(self, ref_index: int, live_index: int):
+        """Append one alignment point."""
+        if self._length == self._data.shape[0]:
+            grown = np.empty((2 * self._data.shape[0], 2), dtype=self.DTYPE)
+            grown[: self._length] = self._data[: self._length]
+            self._data = grown
+
+        row = self._data[self._length]
+        row[0] = ref_index
+        row[1] = live_index
+        self._length += 1
+
+        if self._log_file is not None:
+            self._log_file.write(row.tobytes())
+
+    def as_array(self) -> np.ndarray:
+        """
+        Return a read-only (N, 2) view of the stored points without copying.
+
+        The view shares memory with the store; it stays valid until the store
+        grows its buffer, after which it no longer sees new points.
+        """
+        view = self._data[: self._length]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def nbytes(self) -> int:
+        """Number of bytes allocated for the points, including unused capacity."""
+        return self._data.nbytes
+
+    def save(self, path: str):
+        """Save the stored points to a `.npy` file."""
+        np.save(path, self.as_array())
+
+    @staticmethod
+    def load(path: str) -> np.ndarray:
+        """Load points saved by `save()` or logged with `log_path` as an (N, 2) array."""
+        return np.load(path)
+
+    def flush(self):
+        """Update the log file header with the current number of points."""
+        if self._log_file is None:
+            return
+        end = self._log_file.tell()
+        self._log_file.seek(0)
+        self._write_log_header()
+        self._log_file.seek(end)
+        self._log_file.flush()
+
+    def close(self):
+        """Flush and close the log file, if any."""
+        if self._log_file is None:
+            return
+        self.flush()
+        self._log_file.close()
+        self._log_file = None
+
+    def _write_log_header(self):
+        """Write a version 1.0 `.npy` header padded to LOG_HEADER_LEN bytes."""
+        # Written by hand: how far numpy pads its headers depends on its version
+        magic = np.lib.format.magic(1, 0)
+        text_len = self.LOG_HEADER_LEN - len(magic) - 2
+        header = repr(
+            {
+                "descr": np.lib.format.dtype_to_descr(self.DTYPE),
+                "fortran_order": False,
+                "shape": (self._length, 2),
+            }
+        )
+        text = header.ljust(text_len - 1) + "\n"
+        self._log_file.write(magic + struct.pack("<H", text_len) + text.encode("latin1"))
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.as_array()[index]
+        ref_index, live_index = self.as_array()[index]
+        return int(ref_index), int(live_index)
+
+    def __iter__(self):
+        for ref_index, live_index in self.as_array().tolist():
+            yield ref_index, live_index
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.as_array()
+        if dtype is not None and np.dtype(dtype) != array.dtype:
+            return array.astype(dtype)
+        if copy:
+            return array.copy()
+        return array
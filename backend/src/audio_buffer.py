@@ -109,6 +109,11 @@ class AudioBuffer:
 
         return frames
 
+    @property
+    def nbytes(self) -> int:
+        """Number of bytes allocated for the buffer."""
+        return self.buffer.nbytes
+
     def get_time(self) -> int:
         """Get the length of the audio written to the buffer in seconds."""
         return self.write_index / self.sample_rate
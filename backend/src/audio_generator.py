@@ -1,23 +1,147 @@
 import os
-import subprocess
+import hashlib
 import logging
 import tempfile
-import shutil
+import threading
+from collections import OrderedDict
 from pathlib import Path
+from typing import Dict, List
 
 import pretty_midi
-import mido
+import music21
 from music21 import converter, midi
 
+from .render_cache import file_digest
+from .synth_pool import (
+    get_synth_pool,
+    import_fluidsynth,
+    render_instruments_parallel,
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Number of parsed scores kept by `parse_score_beats`
+SCORE_CACHE_SIZE = 32
+
+# Directory of MIDI files converted from MusicXML, in the backend data folder
+MIDI_CACHE_DIR = Path(__file__).resolve().parent.parent / "data" / "cache" / "midi"
+
+# Cache key -> lock held while that MusicXML score is converted
+_conversion_locks: Dict[str, threading.Lock] = {}
+_conversion_locks_lock = threading.Lock()
+
+# File content digest -> instruments with event times in beats
+_score_cache: "OrderedDict[str, List[pretty_midi.Instrument]]" = OrderedDict()
+_score_cache_lock = threading.Lock()
+
+
+def parse_score_beats(midi_path) -> List[pretty_midi.Instrument]:
+    """
+    Return the instruments of a MIDI file with the times of their events in beats.
+
+    Scores are parsed once and cached by content in this process, so renders at
+    other tempos only have to scale the times. The returned instruments are shared
+    and must not be modified; see `instruments_at_tempo`.
+    """
+    key = file_digest(midi_path)
+    with _score_cache_lock:
+        instruments = _score_cache.get(key)
+        if instruments is not None:
+            _score_cache.move_to_end(key)
+            return instruments
+
+    midi_data = pretty_midi.PrettyMIDI(str(midi_path))
+
+    def beats(time: float) -> float:
+        return midi_data.time_to_tick(time) / midi_data.resolution
+
+    for instrument in midi_data.instruments:
+        for note in instrument.notes:
+            note.start, note.end = beats(note.start), beats(note.end)
+        for event in instrument.control_changes + instrument.pitch_bends:
+            event.time = beats(event.time)
+    logger.info(f"Parsed {midi_path} with {len(midi_data.instruments)} instrument(s)")
+
+    with _score_cache_lock:
+        _score_cache[key] = midi_data.instruments
+        while len(_score_cache) > SCORE_CACHE_SIZE:
+            _score_cache.popitem(last=False)
+    return midi_data.instruments
+
+
+def converted_midi_path(musicxml_path, cache_dir=MIDI_CACHE_DIR) -> Path:
+    """
+    Return the MIDI conversion of a MusicXML file, converting it only if needed.
+
+    Conversions are stored in `cache_dir` under the SHA-256 of the MusicXML content
+    and the music21 version, so an edited score or a music21 upgrade is converted
+    again while an unchanged score is never re-parsed. Files are written atomically
+    and each score is converted by one thread at a time, so concurrent callers
+    neither duplicate the work nor read a partially written file.
+    """
+    key = hashlib.sha256(
+        f"{file_digest(musicxml_path)}:music21-{music21.__version__}".encode("utf-8")
+    ).hexdigest()
+    cache_dir = Path(cache_dir)
+    midi_path = cache_dir / f"{key}.mid"
+
+    with _conversion_locks_lock:
+        lock = _conversion_locks.setdefault(key, threading.Lock())
+    with lock:
+        if midi_path.is_file() and midi_path.stat().st_size > 0:
+            logger.info(f"Using cached MIDI conversion of {musicxml_path}")
+            return midi_path
+        AudioGenerator.musicxml_to_midi(Path(musicxml_path), midi_path)
+        logger.info(f"Converted MusicXML to MIDI: {midi_path}")
+    return midi_path
+
+
+def instruments_at_tempo(
+    instruments: List[pretty_midi.Instrument], tempo: float
+) -> List[pretty_midi.Instrument]:
+    """
+    Return copies of instruments timed in beats, with their times in seconds at `tempo`.
+
+    Like rewriting the MIDI file with a single tempo, every tempo change of the
+    score is replaced by `tempo` (BPM).
+    """
+    seconds_per_beat = 60.0 / tempo
+    scaled = []
+    for instrument in instruments:
+        copy = pretty_midi.Instrument(
+            instrument.program, is_drum=instrument.is_drum, name=instrument.name
+        )
+        copy.notes = [
+            pretty_midi.Note(
+                note.velocity,
+                note.pitch,
+                note.start * seconds_per_beat,
+                note.end * seconds_per_beat,
+            )
+            for note in instrument.notes
+        ]
+        copy.control_changes = [
+            pretty_midi.ControlChange(cc.number, cc.value, cc.time * seconds_per_beat)
+            for cc in instrument.control_changes
+        ]
+        copy.pitch_bends = [
+            pretty_midi.PitchBend(bend.pitch, bend.time * seconds_per_beat)
+            for bend in instrument.pitch_bends
+        ]
+        scaled.append(copy)
+    return scaled
+
 
 class AudioGenerator:
     """
     Class to generate audio from MusicXML and MIDI scores using FluidSynth.
 
+    Instruments are rendered in process with pyFluidSynth, by synths of the process's
+    `SynthPool` that keep the soundfont loaded between renders, or in parallel by a
+    process pool from `synth_pool.render_executor`.
+
     Parameters
     ----------
     score_path : Path or str
@@ -25,18 +149,21 @@ class AudioGenerator:
     soundfont_path : Path or str, optional
         Path to the soundfont file. Defaults to a bundled 'FluidR3_GM.sf2' in a 'soundfonts'
         subdirectory relative to this file.
+    midi_cache_dir : Path or str, optional
+        Directory in which MusicXML scores are converted to MIDI (default:
+        MIDI_CACHE_DIR). See `converted_midi_path`.
 
     Raises
     ------
     FileNotFoundError
         If the input score or the soundfont file cannot be found.
     RuntimeError
-        If FluidSynth is not installed.
+        If FluidSynth or pyFluidSynth is not installed.
     ValueError
         If the score file does not have a supported extension.
     """
 
-    def __init__(self, score_path, soundfont_path=None):
+    def __init__(self, score_path, soundfont_path=None, midi_cache_dir=MIDI_CACHE_DIR):
         self.score_path = Path(score_path)
         if not os.path.exists(self.score_path):
             raise FileNotFoundError(f"Score file not found: {self.score_path}")
@@ -56,27 +183,23 @@ class AudioGenerator:
         # Ensure FluidSynth is installed
         self.check_fluidsynth_installed()
 
-        # Convert MusicXML to MIDI if necessary
+        # Convert MusicXML to MIDI unless an up-to-date conversion is cached
         if self.score_path.suffix.lower() == ".musicxml":
-            midi_path = self.score_path.with_suffix(".mid")
-            self.score_path = self.musicxml_to_midi(self.score_path, midi_path)
-            logger.info(f"Converted MusicXML to MIDI: {self.score_path}")
+            self.score_path = converted_midi_path(self.score_path, midi_cache_dir)
 
     @staticmethod
     def check_fluidsynth_installed():
-        """Raise an error if FluidSynth is not installed."""
-        try:
-            subprocess.check_output(["fluidsynth", "--version"])
-        except (FileNotFoundError, subprocess.CalledProcessError):
-            raise RuntimeError(
-                "FluidSynth is not installed. Please install it before using this package."
-            )
+        """Raise an error if FluidSynth or pyFluidSynth is not installed."""
+        import_fluidsynth()
 
     @staticmethod
     def musicxml_to_midi(input_path: Path, output_path: Path) -> Path:
         """
         Convert a MusicXML file to MIDI using music21.
 
+        The MIDI file is written to a temporary file and moved to `output_path`, so
+        readers never see a partially written file.
+
         Parameters
         ----------
         input_path : Path
@@ -94,36 +217,45 @@ class AudioGenerator:
         midi_file = midi.translate.streamToMidiFile(score)
         output_path.parent.mkdir(parents=True, exist_ok=True)
         # Write the MIDI file to disk
-        with output_path.open("wb") as f:
-            midi_file.writeFile(f)
+        fd, tmp_name = tempfile.mkstemp(suffix=".mid", dir=output_path.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(midi_file.writestr())
+            os.replace(tmp_name, output_path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
         return output_path
 
-    @staticmethod
-    def change_midi_tempo(midi_file_path: Path, new_tempo_bpm: float) -> None:
+    def instruments(self, tempo: float, indices: List[int] = None):
         """
-        Change the tempo of a MIDI file in-place.
+        Return the instruments of the score timed at `tempo` (BPM).
+
+        The score is parsed once per process (see `parse_score_beats`) and scaled to
+        the tempo in memory, without writing or re-reading MIDI files.
 
         Parameters
         ----------
-        midi_file_path : Path
-            Path to the MIDI file to modify.
-        new_tempo_bpm : float
-            New tempo in beats per minute (BPM).
+        tempo : float or None
+            Tempo to render the score at, replacing the tempo changes of the score.
+            If None, the score is timed as written, keeping its tempo changes (e.g.
+            the tempo curve of an altered performance).
+        indices : List[int], optional
+            Indices of the instruments to return (default: all of them).
         """
-        logger.info(f"Changing tempo to {new_tempo_bpm} BPM in {midi_file_path}...")
-        microseconds_per_beat = mido.bpm2tempo(new_tempo_bpm)
-        mid = mido.MidiFile(str(midi_file_path))
-        # Process each track: remove existing tempo messages and insert the new one at the start
-        for track in mid.tracks:
-            track[:] = [msg for msg in track if msg.type != "set_tempo"]
-            track.insert(
-                0, mido.MetaMessage("set_tempo", tempo=microseconds_per_beat, time=0)
-            )
-        mid.save(str(midi_file_path))
-        logger.info(f"Tempo updated and saved to {midi_file_path}")
+        if tempo is None:
+            instruments = pretty_midi.PrettyMIDI(str(self.score_path)).instruments
+            if indices is not None:
+                instruments = [instruments[i] for i in indices]
+            return instruments
+
+        instruments = parse_score_beats(self.score_path)
+        if indices is not None:
+            instruments = [instruments[i] for i in indices]
+        return instruments_at_tempo(instruments, tempo)
 
     def generate_audio(
-        self, output_dir, tempo: float = 120, sample_rate: int = 44100
+        self, output_dir, tempo: float = 120, sample_rate: int = 44100, executor=None
     ) -> None:
         """
         Generate audio files for each instrument in the MIDI score.
@@ -136,57 +268,35 @@ class AudioGenerator:
             The tempo (BPM) to set for the MIDI file, by default 120 BPM.
         sample_rate : int, optional
             The sample rate for the generated audio, by default 44100.
+        executor : concurrent.futures.Executor, optional
+            Pool to render the instruments on in parallel, e.g. from
+            `synth_pool.render_executor`. By default they are rendered one after
+            the other by a single synth of this process.
         """
         output_dir = Path(output_dir)
         output_dir.mkdir(parents=True, exist_ok=True)
 
-        # Create a temporary copy of the MIDI file so that the original file is not modified.
-        with tempfile.NamedTemporaryFile(suffix=".mid", delete=False) as tempo_temp:
-            temp_full_midi = Path(tempo_temp.name)
-        shutil.copy(self.score_path, temp_full_midi)
-        self.change_midi_tempo(temp_full_midi, tempo)
-
-        # Load the tempo-modified MIDI file using pretty_midi
-        midi_data = pretty_midi.PrettyMIDI(str(temp_full_midi))
-        logger.info(f"Loaded MIDI file with {len(midi_data.instruments)} instrument(s)")
-
-        # Process each instrument separately
-        for i, instrument in enumerate(midi_data.instruments):
-            logger.info(f"Processing instrument {i}...")
-            # Create a new MIDI object for this instrument
-            instrument_midi = pretty_midi.PrettyMIDI()
-            instrument_midi.instruments.append(instrument)
-
-            # Use a temporary file for the instrument MIDI
-            with tempfile.NamedTemporaryFile(suffix=".mid", delete=False) as tmp_file:
-                temp_midi_path = Path(tmp_file.name)
-            instrument_midi.write(str(temp_midi_path))
-
-            # Define the output audio file
-            output_audio_file = output_dir / f"instrument_{i}.wav"
-            fluidsynth_command = [
-                "fluidsynth",
-                "-ni",
-                str(self.soundfont_path),
-                str(temp_midi_path),
-                "-F",
-                str(output_audio_file),
-                "-r",
-                str(sample_rate),
-            ]
-            try:
-                subprocess.run(fluidsynth_command, check=True)
-                logger.info(f"Generated audio file: {output_audio_file}")
-            except subprocess.CalledProcessError as e:
-                logger.error(f"Error generating audio for instrument {i}: {e}")
-            finally:
-                # Clean up the temporary instrument MIDI file
-                if os.path.exists(temp_midi_path):
-                    temp_midi_path.unlink()
-
-        # Clean up the temporary full MIDI file with updated tempo
-        if os.path.exists(temp_full_midi):
-            temp_full_midi.unlink()
+        instruments = self.instruments(tempo)
+
+        # Render each instrument separately
+        output_files = [
+            output_dir / f"instrument_{i}.wav" for i in range(len(instruments))
+        ]
+        if executor is not None:
+            render_instruments_parallel(
+                instruments,
+                output_files,
+                self.soundfont_path,
+                sample_rate,
+                executor,
+            )
+        else:
+            pool = get_synth_pool(self.soundfont_path, sample_rate)
+            with pool.synth() as renderer:
+                for i, instrument in enumerate(instruments):
+                    logger.info(f"Processing instrument {i}...")
+                    renderer.render_to_file(instrument, output_files[i])
+        logger.info(f"Generated {len(output_files)} audio file(s) in {output_dir}")
 
     def generate_solo(
         self,
@@ -202,62 +312,22 @@ class AudioGenerator:
         ----------
         output_dir : Path or str
             File path where the generated audio file will be saved.
-        tempo : float, optional
-            The tempo (BPM) to set for the MIDI file, by default 120 BPM.
+        tempo : float or None, optional
+            The tempo (BPM) to set for the MIDI file, by default 120 BPM. If None,
+            the tempo changes of the MIDI file are kept.
         sample_rate : int, optional
             The sample rate for the generated audio, by default 44100.
         """
         output_dir = Path(os.path.dirname(output_file))
         output_dir.mkdir(parents=True, exist_ok=True)
 
-        # Create a temporary copy of the MIDI file so that the original file is not modified.
-        with tempfile.NamedTemporaryFile(suffix=".mid", delete=False) as tempo_temp:
-            temp_full_midi = Path(tempo_temp.name)
-        shutil.copy(self.score_path, temp_full_midi)
-        self.change_midi_tempo(temp_full_midi, tempo)
-
-        # Load the tempo-modified MIDI file using pretty_midi
-        midi_data = pretty_midi.PrettyMIDI(str(temp_full_midi))
-        logger.info(f"Loaded MIDI file with {len(midi_data.instruments)} instrument(s)")
-
-        # Process the instrument separately
-        instrument = midi_data.instruments[instrument_index]
-
-        # Create a new MIDI object for this instrument
-        instrument_midi = pretty_midi.PrettyMIDI()
-        instrument_midi.instruments.append(instrument)
-
-        # Use a temporary file for the instrument MIDI
-        with tempfile.NamedTemporaryFile(suffix=".mid", delete=False) as tmp_file:
-            temp_midi_path = Path(tmp_file.name)
-        instrument_midi.write(str(temp_midi_path))
-
-        # Define the output audio file
-        fluidsynth_command = [
-            "fluidsynth",
-            "-ni",
-            str(self.soundfont_path),
-            str(temp_midi_path),
-            "-F",
-            str(output_file),
-            "-r",
-            str(sample_rate),
-        ]
-        try:
-            subprocess.run(fluidsynth_command, check=True)
-            logger.info(f"Generated audio file: {output_file}")
-        except subprocess.CalledProcessError as e:
-            logger.error(
-                f"Error generating audio for instrument {instrument_index}: {e}"
-            )
-        finally:
-            # Clean up the temporary instrument MIDI file
-            if os.path.exists(temp_midi_path):
-                temp_midi_path.unlink()
-
-        # Clean up the temporary full MIDI file with updated tempo
-        if os.path.exists(temp_full_midi):
-            temp_full_midi.unlink()
+        (instrument,) = self.instruments(tempo, [instrument_index])
+
+        # Render the instrument with a synth that already has the soundfont loaded
+        get_synth_pool(self.soundfont_path, sample_rate).render_to_file(
+            instrument, output_file
+        )
+        logger.info(f"Generated audio file: {output_file}")
 
 
 if __name__ == "__main__":
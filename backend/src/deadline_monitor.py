@@ -0,0 +1,159 @@
+import heapq
+import itertools
+import logging
+import time
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineMonitor:
+    """
+    Tracks whether audio is processed faster than it is played.
+
+    Each call to `record` reports how long the processing of some audio took and
+    how long that audio lasts. Their ratio is the processing/real-time ratio: above
+    1 the deadline is missed and the caller falls behind the live audio. The monitor
+    counts the missed deadlines, keeps the `worst_n` slowest records together with
+    the context passed with them (e.g. the OTW indices at that moment) and logs a
+    warning, at most once every `warning_interval` seconds, when a deadline is
+    missed.
+
+    Audio that completes no analysis window, e.g. a chunk shorter than a hop, is
+    recorded with `steps=0`; its time is carried into the next record that does
+    step, so that a frame split across several small chunks is judged as a whole.
+
+    Parameters
+    ----------
+    name : str, optional
+        Name of the monitored path, used in warnings.
+    worst_n : int, optional
+        Number of slowest records kept (default: 10).
+    warning_interval : float, optional
+        Minimum seconds between two warnings (default: 5).
+    on_miss : Callable[[Dict], None], optional
+        Called with the record of every missed deadline, e.g. to count it in metrics.
+    clock : Callable[[], float], optional
+        Time source for the warning interval, in seconds (default: time.monotonic).
+
+    Attributes
+    ----------
+    frames : int
+        Number of records that completed at least one analysis window.
+    missed : int
+        Number of records whose processing took longer than their audio.
+    last_ratio : float
+        Processing/real-time ratio of the latest record, or None before any.
+    max_ratio : float
+        Highest processing/real-time ratio recorded.
+    """
+
+    def __init__(
+        self,
+        name: str = "real-time path",
+        worst_n: int = 10,
+        warning_interval: float = 5.0,
+        on_miss: Callable[[Dict], None] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.worst_n = worst_n
+        self.warning_interval = warning_interval
+        self.on_miss = on_miss
+        self.clock = clock
+
+        self.frames = 0
+        self.missed = 0
+        self.last_ratio = None
+        self.max_ratio = 0.0
+        self._total_ratio = 0.0
+        self._carried_elapsed = 0.0
+        self._carried_budget = 0.0
+        # Min-heap of (ratio, sequence number, record) holding the slowest records
+        self._worst: List = []
+        self._sequence = itertools.count()
+        self._last_warning = None
+        self._missed_since_warning = 0
+
+    def record(self, elapsed: float, budget: float, steps: int = 1, **context) -> bool:
+        """
+        Record the processing of one frame of audio.
+
+        Parameters
+        ----------
+        elapsed : float
+            Seconds spent processing the audio.
+        budget : float
+            Duration of the audio in seconds, i.e. the real-time deadline.
+        steps : int, optional
+            Number of analysis windows completed. If 0, the time is carried over.
+        **context
+            Values stored with the record if it is among the slowest, e.g. the
+            OTW `ref_index` and `live_index`.
+
+        Returns
+        -------
+        bool
+            Whether the deadline was missed.
+        """
+        elapsed += self._carried_elapsed
+        budget += self._carried_budget
+        if steps == 0 or budget <= 0:
+            self._carried_elapsed, self._carried_budget = elapsed, budget
+            return False
+        self._carried_elapsed = self._carried_budget = 0.0
+
+        ratio = elapsed / budget
+        self.frames += 1
+        self.last_ratio = ratio
+        self.max_ratio = max(self.max_ratio, ratio)
+        self._total_ratio += ratio
+
+        entry = dict(
+            context, frame=self.frames, ratio=ratio, elapsed=elapsed, budget=budget
+        )
+        item = (ratio, next(self._sequence), entry)
+        if len(self._worst) < self.worst_n:
+            heapq.heappush(self._worst, item)
+        elif self._worst and ratio > self._worst[0][0]:
+            heapq.heapreplace(self._worst, item)
+
+        if ratio <= 1.0:
+            return False
+
+        self.missed += 1
+        self._missed_since_warning += 1
+        now = self.clock()
+        last = self._last_warning
+        if last is None or now - last >= self.warning_interval:
+            where = ", ".join(f"{key}={value}" for key, value in context.items())
+            logger.warning(
+                f"{self.name} missed {self._missed_since_warning} real-time "
+                f"deadline(s), latest took {elapsed * 1000:.1f} ms for "
+                f"{budget * 1000:.1f} ms of audio ({ratio:.2f}x)"
+                + (f" at {where}" if where else "")
+            )
+            self._last_warning = now
+            self._missed_since_warning = 0
+        if self.on_miss is not None:
+            self.on_miss(entry)
+        return True
+
+    @property
+    def mean_ratio(self) -> float:
+        """Mean processing/real-time ratio of all records."""
+        return self._total_ratio / self.frames if self.frames else 0.0
+
+    def worst(self) -> List[Dict]:
+        """Return the slowest records, slowest first."""
+        return [entry for _, _, entry in sorted(self._worst, reverse=True)]
+
+    def summary(self) -> Dict:
+        """Return the counters and the slowest records as a JSON-serializable dict."""
+        return {
+            "frames": self.frames,
+            "missed": self.missed,
+            "mean_ratio": self.mean_ratio,
+            "max_ratio": self.max_ratio,
+            "worst": self.worst(),
+        }
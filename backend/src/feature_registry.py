@@ -0,0 +1,335 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from .features import Features
+from .features_cens import CENSFeatures
+from .render_cache import file_digest
+
+logger = logging.getLogger(__name__)
+
+
+class FeatureRegistry:
+    """
+    Process-wide registry of frozen reference features.
+
+    Features are keyed by the content hash of the reference audio together with the
+    feature class, sample rate, window length and hop length, and are computed at
+    most once per key. The registry hands out the same frozen `Features` object to
+    every caller, so sessions aligning against the same reference share one
+    featuregram and only own their OTW state and live buffers. Entries are held
+    weakly and disappear once no session uses them.
+
+    With `shared_memory=True` featuregrams are also published in named shared
+    memory segments, so that worker processes of a multi-process deployment map a
+    single copy instead of each computing their own.
+
+    With a `cache_dir` featuregrams are also saved as `.npy` files named by their
+    key, and later lookups memory-map them instead of recomputing, across restarts
+    and processes.
+
+    Parameters
+    ----------
+    shared_memory : bool, optional
+        Back featuregrams with `multiprocessing.shared_memory` (default: False).
+    cache_dir : Path or str, optional
+        Directory of the on-disk featuregram cache. Disabled if None (default).
+    attach_timeout : float, optional
+        Seconds to wait for another process to finish publishing a segment before
+        computing the features locally (default: 5).
+
+    Attributes
+    ----------
+    hits : int
+        Number of lookups served without computing features.
+    misses : int
+        Number of lookups that computed features.
+    """
+
+    # Segment header: ready flag, feature length, number of features (int64 each)
+    HEADER = np.dtype([("ready", "<i8"), ("feature_len", "<i8"), ("num_features", "<i8")])
+    SEGMENT_PREFIX = "companion_"
+
+    def __init__(
+        self, shared_memory: bool = False, cache_dir=None, attach_timeout: float = 5
+    ):
+        self.shared_memory = shared_memory
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.attach_timeout = attach_timeout
+
+        self.hits = 0
+        self.misses = 0
+
+        self._features = weakref.WeakValueDictionary()
+        self._segments: Dict[str, shared_memory.SharedMemory] = {}
+        self._created = set()  # Names of the segments created by this process
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, list] = {}
+
+    @staticmethod
+    def make_key(
+        audio_path, sr: int, win_len: int, hop_len: int, features_cls=CENSFeatures
+    ) -> str:
+        """Return the registry key of the features of `audio_path` with the given parameters."""
+        params = {
+            "audio": file_digest(audio_path),
+            "features": features_cls.__name__,
+            "sr": int(sr),
+            "win_len": int(win_len),
+            "hop_len": int(hop_len),
+        }
+        return hashlib.sha256(
+            json.dumps(params, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    def get(
+        self,
+        audio_path,
+        sr: int,
+        win_len: int,
+        hop_len: int,
+        features_cls=CENSFeatures,
+        compute: Callable[[], Features] = None,
+    ) -> Features:
+        """
+        Return the shared features of `audio_path`, computing them on the first request.
+
+        Parameters
+        ----------
+        audio_path : Path or str
+            Reference audio file.
+        sr : int
+            Sample rate of the features.
+        win_len : int
+            Window length of the features.
+        hop_len : int
+            Hop length of the features.
+        features_cls : Type[Features], optional
+            Feature class (default: CENSFeatures).
+        compute : Callable[[], Features], optional
+            Function returning the features on a miss, e.g. ones computed by a
+            worker process. Defaults to `features_cls.from_file`.
+
+        Returns
+        -------
+        Features
+            Frozen features, shared with every other caller using the same key.
+        """
+        key = self.make_key(audio_path, sr, win_len, hop_len, features_cls)
+        with self._single_flight(key):
+            features = self._lookup(key, features_cls, sr, win_len, hop_len)
+            if features is not None:
+                self.hits += 1
+                return features
+
+            self.misses += 1
+            if compute is None:
+                features = features_cls.from_file(
+                    filepath=str(audio_path), sr=sr, win_len=win_len, hop_len=hop_len
+                )
+            else:
+                features = compute()
+            features.freeze()
+
+            if self.cache_dir is not None:
+                self._save(key, features)
+            if self.shared_memory:
+                features = self._publish(key, features)
+            with self._lock:
+                self._features[key] = features
+            return features
+
+    def peek(
+        self, audio_path, sr: int, win_len: int, hop_len: int, features_cls=CENSFeatures
+    ) -> Optional[Features]:
+        """Return the shared features of `audio_path` if they are available, else None."""
+        key = self.make_key(audio_path, sr, win_len, hop_len, features_cls)
+        features = self._lookup(key, features_cls, sr, win_len, hop_len)
+        if features is not None:
+            self.hits += 1
+        return features
+
+    def is_cached(
+        self, audio_path, sr: int, win_len: int, hop_len: int, features_cls=CENSFeatures
+    ) -> bool:
+        """Return whether the features of `audio_path` are in the on-disk cache."""
+        if self.cache_dir is None:
+            return False
+        key = self.make_key(audio_path, sr, win_len, hop_len, features_cls)
+        return self._cache_path(key).exists()
+
+    def nbytes(self) -> int:
+        """Return the bytes held by the featuregrams currently in the registry."""
+        with self._lock:
+            return sum(features.nbytes for features in self._features.values())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._features)
+
+    def close(self):
+        """Release the shared memory segments, removing the ones this process created."""
+        with self._lock:
+            segments, self._segments = self._segments, {}
+            self._features.clear()
+        for segment in segments.values():
+            try:
+                segment.close()
+            except BufferError:
+                pass  # Still mapped by features in use; unmapped when they are freed
+            if segment.name in self._created:
+                # An attaching process that shares our resource tracker has
+                # unregistered the name; registering again is a no-op otherwise
+                resource_tracker.register(segment._name, "shared_memory")
+                try:
+                    segment.unlink()
+                except FileNotFoundError:
+                    pass
+        self._created.clear()
+
+    def _lookup(self, key, features_cls, sr, win_len, hop_len) -> Optional[Features]:
+        with self._lock:
+            features = self._features.get(key)
+        if features is not None:
+            return features
+
+        featuregram = None
+        if self.shared_memory:
+            segment = self._attach(key)
+            if segment is not None:
+                featuregram = self._featuregram(segment)
+        if featuregram is None and self.cache_dir is not None:
+            try:
+                featuregram = np.load(self._cache_path(key), mmap_mode="r")
+            except FileNotFoundError:
+                pass
+        if featuregram is None:
+            return None
+
+        features = features_cls.from_featuregram(featuregram, sr, win_len, hop_len)
+        with self._lock:
+            self._features[key] = features
+        return features
+
+    def _cache_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.npy"
+
+    def _save(self, key: str, features: Features):
+        """Atomically write the featuregram of `features` to the on-disk cache."""
+        fd, tmp_name = tempfile.mkstemp(suffix=".npy", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, features.get_featuregram())
+            os.replace(tmp_name, self._cache_path(key))
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+
+    def _segment_name(self, key: str) -> str:
+        return self.SEGMENT_PREFIX + key[:20]  # macOS limits names to 31 characters
+
+    def _featuregram(self, segment) -> np.ndarray:
+        header = np.ndarray((), dtype=self.HEADER, buffer=segment.buf)
+        return np.ndarray(
+            (int(header["feature_len"]), int(header["num_features"])),
+            dtype=np.float64,
+            buffer=segment.buf,
+            offset=self.HEADER.itemsize,
+        )
+
+    def _attach(self, key: str):
+        """Return the published segment for `key`, or None if there is none yet."""
+        with self._lock:
+            segment = self._segments.get(key)
+        if segment is not None:
+            return segment
+
+        try:
+            segment = shared_memory.SharedMemory(name=self._segment_name(key))
+        except FileNotFoundError:
+            return None
+        # Only the creating process may remove the segment; before Python 3.13 the
+        # resource tracker would otherwise unlink it when this process exits
+        resource_tracker.unregister(segment._name, "shared_memory")
+
+        header = np.ndarray((), dtype=self.HEADER, buffer=segment.buf)
+        deadline = time.monotonic() + self.attach_timeout
+        while not header["ready"]:
+            if time.monotonic() > deadline:
+                del header
+                segment.close()
+                return None
+            time.sleep(0.01)
+        del header
+
+        with self._lock:
+            self._segments[key] = segment
+        return segment
+
+    def _publish(self, key: str, features: Features) -> Features:
+        """Copy `features` into a new shared memory segment and return features backed by it."""
+        featuregram = features.get_featuregram()
+        size = self.HEADER.itemsize + featuregram.shape[0] * featuregram.shape[1] * 8
+        try:
+            segment = shared_memory.SharedMemory(
+                name=self._segment_name(key), create=True, size=max(size, 1)
+            )
+        except FileExistsError:
+            # Another process published it meanwhile
+            segment = self._attach(key)
+            if segment is None:
+                return features
+            return type(features).from_featuregram(
+                self._featuregram(segment),
+                features.sr,
+                features.win_len,
+                features.hop_len,
+            )
+
+        header = np.ndarray((), dtype=self.HEADER, buffer=segment.buf)
+        header["feature_len"], header["num_features"] = featuregram.shape
+        shared = np.ndarray(
+            featuregram.shape,
+            dtype=np.float64,
+            buffer=segment.buf,
+            offset=self.HEADER.itemsize,
+        )
+        shared[:] = featuregram
+        header["ready"] = 1  # Written last so attaching processes see complete data
+        del header
+
+        with self._lock:
+            self._segments[key] = segment
+            self._created.add(segment.name)
+        logger.info(f"Published reference features in shared memory {segment.name}")
+        return type(features).from_featuregram(
+            shared, features.sr, features.win_len, features.hop_len
+        )
+
+    @contextmanager
+    def _single_flight(self, key: str):
+        """Hold the lock for `key` so that only one thread computes it at a time."""
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
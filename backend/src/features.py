@@ -1,5 +1,6 @@
 import numpy as np
 import librosa
+from . import tracing
 
 
 class Features(object):
@@ -10,6 +11,7 @@ class Features(object):
         Then call .insert(y) to add a frame of win_len samples."""
         self.sr = sr
         self.win_len = win_len
+        self.hop_len = None  # Set by the factory methods, unknown for live features
 
         self.num_features = num_features
         self.preallocated = num_features > 0
@@ -20,6 +22,7 @@ class Features(object):
             self.buffer = []
 
         self.current_index = 0
+        self.frozen = False  # Read-only, e.g. shared between score followers
 
     def compare_features(self, other: "Features", i: int, j: int):
         raise NotImplementedError("Subclasses must implement compare_features()")
@@ -29,11 +32,19 @@ class Features(object):
 
     def insert(self, audio: np.ndarray) -> np.ndarray:
         "Insert new audio y. Return a (feature_size, 1) vector representing a feature."
+        if self.frozen:
+            raise RuntimeError("Cannot insert into frozen features")
 
         # Ensure the audio chunk is shaped (sr,) for librosa input, not (1, sr)
         y = np.squeeze(audio)
 
-        vec = self.make_feature(y)
+        with tracing.span("features.insert"):
+            return self.append(self.make_feature(y))
+
+    def append(self, vec: np.ndarray) -> np.ndarray:
+        "Append an already computed feature vector, e.g. to reuse one without new audio."
+        if self.frozen:
+            raise RuntimeError("Cannot insert into frozen features")
 
         if self.preallocated:
             if self.current_index >= self.buffer.shape[1]:
@@ -53,6 +64,13 @@ class Features(object):
         else:
             return self.buffer[index]
 
+    @property
+    def nbytes(self) -> int:
+        "Number of bytes held by the feature buffer"
+        if self.preallocated:
+            return self.buffer.nbytes
+        return sum(vec.nbytes for vec in self.buffer)
+
     def get_featuregram(self) -> np.ndarray:
         "Return buffer as ndarray with shape: (FEATURE_SIZE, num_features)"
         if self.preallocated:
@@ -60,6 +78,33 @@ class Features(object):
         else:
             return np.stack(self.buffer, axis=1)
 
+    def freeze(self) -> "Features":
+        "Store the features in one read-only array so they can be shared. Returns self."
+        if self.frozen:
+            return self
+        featuregram = np.array(self.get_featuregram()[:, : self.current_index])
+        featuregram.flags.writeable = False
+        self.buffer = featuregram
+        self.num_features = self.current_index
+        self.preallocated = True
+        self.frozen = True
+        return self
+
+    @classmethod
+    def from_featuregram(
+        cls, featuregram: np.ndarray, sr: int, win_len: int, hop_len: int = None
+    ):
+        "Factory method. Wrap an existing (FEATURE_LEN, num_features) array as frozen features"
+        out = cls(sr, win_len)
+        out.hop_len = hop_len
+        featuregram = featuregram.view()
+        featuregram.flags.writeable = False
+        out.buffer = featuregram
+        out.num_features = out.current_index = featuregram.shape[1]
+        out.preallocated = True
+        out.frozen = True
+        return out
+
     @classmethod
     def from_audio(cls, y: np.ndarray, sr: int, win_len: int, hop_len: int):
         "Factory method. Load audio and instantiate based on params"
@@ -67,6 +112,7 @@ class Features(object):
         num_features = max(0, num_features)
 
         out = cls(sr, win_len)
+        out.hop_len = hop_len
 
         for m in range(num_features):
             window = y[m * hop_len : m * hop_len + win_len]
@@ -1,10 +1,117 @@
+import heapq
+import itertools
 import math
 import threading
-from time import sleep, time
-from typing import List, Tuple
+from time import monotonic, sleep, time
+from typing import Dict, List, Tuple
 import fluidsynth
 import os
 from music21 import converter, chord, note
+from . import tracing
+
+
+class NoteScheduler:
+    """
+    Plays notes on a synthesizer and releases each one after its duration.
+
+    Note-offs are kept in a heap ordered by release time and sent by a single
+    scheduler thread, which sleeps on a condition variable until the next release
+    or until an earlier one is scheduled. The number of threads therefore stays the
+    same however many notes sound at once. The lateness of every note-off, i.e. how
+    long after its scheduled time it was sent, is measured so that timing jitter
+    can be reported in seconds and in samples of the synthesizer.
+
+    Parameters
+    ----------
+    synth : fluidsynth.Synth
+        Synthesizer receiving the note-on and note-off messages.
+    channel : int, optional
+        MIDI channel of the notes (default: 0).
+    sample_rate : int, optional
+        Sample rate of the synthesizer, to express lateness in samples
+        (default: 44100).
+
+    Attributes
+    ----------
+    released : int
+        Number of note-offs sent.
+    max_pending : int
+        Highest number of notes sounding at once.
+    """
+
+    def __init__(self, synth, channel: int = 0, sample_rate: int = 44100):
+        self.synth = synth
+        self.channel = channel
+        self.sample_rate = sample_rate
+
+        self.released = 0
+        self.max_pending = 0
+        self._total_lateness = 0.0
+        self._max_lateness = 0.0
+
+        # Min-heap of (release time, sequence number, MIDI note)
+        self._note_offs: List[Tuple[float, int, int]] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def start(self):
+        """Start the scheduler thread."""
+        with self._condition:
+            self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="note-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def play(self, midi_note: int, duration: float, velocity: int = 100):
+        """Start `midi_note` now and schedule its release in `duration` seconds."""
+        self.synth.noteon(self.channel, midi_note, velocity)
+        release = (monotonic() + duration, next(self._sequence), midi_note)
+        with self._condition:
+            heapq.heappush(self._note_offs, release)
+            self.max_pending = max(self.max_pending, len(self._note_offs))
+            # Wake the scheduler only if this release comes before the one it waits for
+            if self._note_offs[0] is release:
+                self._condition.notify()
+
+    def close(self):
+        """Wait for the scheduled note-offs to be sent, then stop the thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def timing_stats(self) -> Dict:
+        """Return the number of note-offs sent and their mean and maximum lateness."""
+        mean = self._total_lateness / self.released if self.released else 0.0
+        return {
+            "released": self.released,
+            "max_pending": self.max_pending,
+            "mean_lateness": mean,
+            "max_lateness": self._max_lateness,
+            "max_lateness_samples": int(round(self._max_lateness * self.sample_rate)),
+        }
+
+    def _run(self):
+        with self._condition:
+            while self._note_offs or not self._closed:
+                if not self._note_offs:
+                    self._condition.wait()
+                    continue
+                release_time, _, midi_note = self._note_offs[0]
+                lateness = monotonic() - release_time
+                if lateness < 0:
+                    self._condition.wait(-lateness)
+                    continue
+                heapq.heappop(self._note_offs)
+                self.synth.noteoff(self.channel, midi_note)
+                self.released += 1
+                self._total_lateness += lateness
+                self._max_lateness = max(self._max_lateness, lateness)
 
 
 class MidiPerformance:
@@ -68,7 +175,8 @@ class MidiPerformance:
         self.last_beat = 0
 
         # Initialize FluidSynth.
-        self.fs = fluidsynth.Synth(samplerate=44100)
+        sample_rate = 44100
+        self.fs = fluidsynth.Synth(samplerate=sample_rate)
         self.fs.start()
         if soundfont_path is None:
             soundfont_path = os.path.join("soundfonts", "FluidR3_GM.sf2")
@@ -85,9 +193,8 @@ class MidiPerformance:
         self._stop_event = threading.Event()
         self._performance_thread = None
 
-        # List to track active note threads (for polyphony).
-        self._active_note_threads = []
-        self._active_note_lock = threading.Lock()
+        # Releases the playing notes (for polyphony) from a single thread.
+        self._scheduler = NoteScheduler(self.fs, channel=0, sample_rate=sample_rate)
 
     def _midi_to_notes_quarter(
         self, midi_file_path: str, instrument_index: int
@@ -120,7 +227,7 @@ class MidiPerformance:
             )
 
         selected_part = parts[instrument_index]
-        flat_part = selected_part.flat.stripTies()
+        flat_part = selected_part.flatten().stripTies()
 
         notes_list = []
         for element in flat_part.notes:
@@ -176,26 +283,6 @@ class MidiPerformance:
         self.score_position = position
         # self._next_note_index = 0
 
-    def _note_worker(self, midi_note: int, duration_sec: float):
-        """
-        Worker function to play a note.
-
-        Parameters
-        ----------
-        midi_note : int
-            MIDI note number to play.
-        duration_sec : float
-            Duration in seconds to play the note.
-        """
-        self.fs.noteon(0, midi_note, 100)
-        sleep(duration_sec)
-        self.fs.noteoff(0, midi_note)
-        # Remove this thread from active note threads.
-        current = threading.current_thread()
-        with self._active_note_lock:
-            if current in self._active_note_threads:
-                self._active_note_threads.remove(current)
-
     def _play_note(self, frequency: float, quarter_duration: float):
         """
         Play a note based on the current tempo, allowing for overlapping (polyphonic) playback.
@@ -209,13 +296,8 @@ class MidiPerformance:
         """
         duration_sec = quarter_duration * (60.0 / self.current_tempo)
         midi_note = self._frequency_to_midi(frequency)
-        # Create a new thread for this note.
-        note_thread = threading.Thread(
-            target=self._note_worker, args=(midi_note, duration_sec), daemon=True
-        )
-        with self._active_note_lock:
-            self._active_note_threads.append(note_thread)
-        note_thread.start()
+        # The scheduler thread releases the note once its duration has elapsed.
+        self._scheduler.play(midi_note, duration_sec)
 
     def _performance_loop(self):
         """
@@ -225,25 +307,26 @@ class MidiPerformance:
         If multiple notes are reached, they are all launched (allowing for polyphony).
         """
         while not self._stop_event.is_set() and self._next_note_index < len(self.notes):
-            # Launch all notes whose scheduled beat is reached.
-            while (
-                self._next_note_index < len(self.notes)
-                and self.score_position >= self.notes[self._next_note_index][2]
-            ):
-                frequency, quarter_duration, quarter_offset = self.notes[
-                    self._next_note_index
-                ]
-                if (
-                    self.score_position - quarter_offset < 1
-                    and self.last_beat is not quarter_offset
+            with tracing.span("midi_performance.loop"):
+                # Launch all notes whose scheduled beat is reached.
+                while (
+                    self._next_note_index < len(self.notes)
+                    and self.score_position >= self.notes[self._next_note_index][2]
                 ):
-                    print(
-                        f"Playing note at beat {quarter_offset}: {frequency:.2f} Hz, "
-                        f"duration {quarter_duration} beats"
-                    )
-                    self._play_note(frequency, quarter_duration)
-                    self.last_beat = quarter_offset
-                self._next_note_index += 1
+                    frequency, quarter_duration, quarter_offset = self.notes[
+                        self._next_note_index
+                    ]
+                    if (
+                        self.score_position - quarter_offset < 1
+                        and self.last_beat is not quarter_offset
+                    ):
+                        print(
+                            f"Playing note at beat {quarter_offset}: {frequency:.2f} Hz, "
+                            f"duration {quarter_duration} beats"
+                        )
+                        self._play_note(frequency, quarter_duration)
+                        self.last_beat = quarter_offset
+                    self._next_note_index += 1
             sleep(0.005)
         print("Performance loop ended.")
 
@@ -255,6 +338,7 @@ class MidiPerformance:
         follower's position and plays notes as they are reached.
         """
         self._stop_event.clear()
+        self._scheduler.start()
         self._performance_thread = threading.Thread(
             target=self._performance_loop, daemon=True
         )
@@ -266,19 +350,21 @@ class MidiPerformance:
         Stop the performance.
 
         Signals the performance loop to stop, waits for the loop to finish, and cleans up
-        the FluidSynth synthesizer after waiting for all active note threads to finish.
+        the FluidSynth synthesizer after the playing notes have been released.
         """
         self._stop_event.set()
         if self._performance_thread is not None:
             self._performance_thread.join()
-        # Wait for all active note threads to finish.
-        while True:
-            with self._active_note_lock:
-                if not self._active_note_threads:
-                    break
-            sleep(0.01)
+        # Wait for the scheduler to release the playing notes.
+        self._scheduler.close()
         self.fs.delete()
-        print("Performance stopped.")
+        stats = self._scheduler.timing_stats()
+        print(
+            f"Performance stopped. {stats['released']} note-off(s) sent "
+            f"{stats['mean_lateness'] * 1000:.2f} ms late on average, at most "
+            f"{stats['max_lateness'] * 1000:.2f} ms "
+            f"({stats['max_lateness_samples']} samples)."
+        )
 
 
 # =============================================================================
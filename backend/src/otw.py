@@ -10,9 +10,17 @@ THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLI
 
 # Variable names have been modified for clarity
 
+from .alignment_path import AlignmentPath
 from .features import Features
+from . import tracing
 import numpy as np
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
+
+# Predecessor of a cell in the accumulated cost matrix
+STEP_NONE = 0  # Not computed, or the origin (0, 0)
+STEP_BOTH = 1  # From (ref_index - 1, live_index - 1)
+STEP_REF = 2  # From (ref_index - 1, live_index)
+STEP_LIVE = 3  # From (ref_index, live_index - 1)
 
 
 def find_key(d: Dict, k: str):
@@ -21,6 +29,13 @@ def find_key(d: Dict, k: str):
 
 
 class OnlineTimeWarping:
+    # Smoothing factor for the running mean/variance of the local path cost
+    COST_SMOOTHING = 0.1
+    # Local costs this many deviations above the running mean count as a spike
+    SPIKE_DEVIATIONS = 2.0
+    # Floor on the deviation so that a perfectly steady cost does not flag tiny changes
+    MIN_COST_DEVIATION = 0.02
+
     def __init__(
         self,
         ref: Features,
@@ -29,6 +44,8 @@ class OnlineTimeWarping:
         big_c: int,
         max_run_count: int,
         diag_weight: float,
+        min_c: int = None,
+        max_history: int = None,
     ):
         """
         Initialize the Online Time Warping [1] algorithm for streaming alignment
@@ -44,11 +61,24 @@ class OnlineTimeWarping:
         n_fft : int
             Number of audio samples per feature window (FFT size).
         big_c : int
-            Width of the search window for constrained DTW.
+            Width of the search window for constrained DTW. When `min_c` is given,
+            this is the ceiling of the adaptive window.
         max_run_count : int
             Maximum consecutive steps allowed in one direction (slope constraint).
         diag_weight : float
             Weight applied to diagonal moves in the accumulated cost matrix.
+        min_c : int, optional
+            Floor of the adaptive search window. If None (default), the window is
+            fixed at `big_c`.
+        max_history : int, optional
+            Number of most recent live frames whose costs are kept. The cost and
+            predecessor matrices then hold `max_history` columns reused as a ring
+            instead of one column per live frame of the longest supported
+            performance (4 x `ref_len`), whose size grows with the square of the
+            piece length: 5 bytes per cell, about 300 MB for a 3-minute reference
+            at a 2048-sample hop. Older costs are forgotten, so the row minimum and
+            backtracking only consider recent live frames. At least `big_c` + 1.
+            If None (default), the whole performance is kept.
 
         Attributes
         ----------
@@ -61,7 +91,13 @@ class OnlineTimeWarping:
         ref_len : int
             Number of feature frames in the reference sequence.
         accumulated_cost : np.ndarray
-            Dynamic programming matrix storing cumulative alignment costs.
+            Dynamic programming matrix storing cumulative alignment costs. The cost
+            of live frame `t` is in column `t % history`.
+        history : int
+            Number of live frames held by `accumulated_cost` and `predecessor`.
+        predecessor : np.ndarray
+            Step (STEP_BOTH, STEP_REF or STEP_LIVE) that produced each computed cell
+            of `accumulated_cost`, used for incremental backtracking.
         live_index : int
             Index of current live feature frame.
         ref_index : int
@@ -71,15 +107,20 @@ class OnlineTimeWarping:
         run_count : int
             Count of consecutive steps taken in the same direction.
         window_size : int
-            DTW search window size.
+            Current (effective) DTW search window size.
+        max_window_size : int
+            Ceiling of the search window, `big_c`.
+        min_window_size : int or None
+            Floor of the adaptive search window, or None if the window is fixed.
         max_run_count : int
             Maximum allowed consecutive steps in one direction.
         diag_weight : float
             Weight factor for diagonal steps.
         last_ref_index : int
             Last matched reference frame index, prevents backward jumps.
-        path_z : list[int]
-            History of matched reference indices for debugging or tracking.
+        path_z : AlignmentPath
+            History of (ref_index, live_index) points chosen by each step, before
+            backward steps are suppressed, for debugging or tracking.
 
         Notes
         -----
@@ -98,9 +139,15 @@ class OnlineTimeWarping:
             sr, n_fft, live_size
         )  # Live input, same Features subclass as ref
 
+        if max_history is None:
+            self.history = live_size
+        else:
+            # Column updates read the previous live frame of the whole window
+            self.history = min(max(max_history, big_c + 1), live_size)
         self.accumulated_cost = np.full(
-            (self.ref_len, live_size), np.inf, dtype=np.float32
+            (self.ref_len, self.history), np.inf, dtype=np.float32
         )
+        self.predecessor = np.zeros((self.ref_len, self.history), dtype=np.int8)
 
         self.live_index = -1  # Index in live sequence
         self.ref_index = 0  # Index in ref sequence
@@ -109,15 +156,32 @@ class OnlineTimeWarping:
 
         # Parameters
         self.window_size = big_c
+        self.max_window_size = big_c
+        self.min_window_size = min(min_c, big_c) if min_c is not None else None
         self.max_run_count = max_run_count
         self.diag_weight = diag_weight
 
+        # Running statistics of the local cost along the path, for adapting the window
+        self._cost_mean = None
+        self._cost_var = 0.0
+        self._slope_limited = False  # Whether the last step was forced by max_run_count
+
         self.last_ref_index = (
             0  # Track the last reference index to prevent backward steps
         )
-        self.path_z = []  # Chosen path for debugging or tracking
+        self.path_z = AlignmentPath(capacity=live_size)  # Chosen path for debugging
+
+    @property
+    def nbytes(self) -> int:
+        """Number of bytes held by the alignment state, excluding the reference features."""
+        return (
+            self.accumulated_cost.nbytes
+            + self.predecessor.nbytes
+            + self.live.nbytes
+            + self.path_z.nbytes
+        )
 
-    def insert(self, live_frames: np.ndarray) -> int:
+    def insert(self, live_frames: np.ndarray, window_cap: int = None) -> int:
         """
         Insert a new frame of live audio features and update alignment position.
 
@@ -126,6 +190,9 @@ class OnlineTimeWarping:
         live_frames : np.ndarray
             1D array representing a single live feature vector computed from a
             mono audio window of length `n_fft` samples (shape: [feature_len]).
+        window_cap : int, optional
+            Upper bound on the search window for this step only, to make it cheaper
+            when the caller is behind real time. The adaptive window is unaffected.
 
         Returns
         -------
@@ -138,37 +205,64 @@ class OnlineTimeWarping:
         This method updates the accumulated cost matrix with the new live frame,
         performs online DTW steps, and returns the current estimated alignment position.
         """
-        self.live_index += 1
         self.live.insert(live_frames)
+        return self._advance(window_cap)
 
-        for k in range(
-            max(0, self.ref_index - self.window_size + 1), self.ref_index + 1
-        ):
-            self._update_accumulated_cost(k, self.live_index)
+    def insert_feature(self, feature: np.ndarray, window_cap: int = None) -> int:
+        """
+        Insert a precomputed live feature vector and update alignment position.
 
-        path = []
-        while True:
-            step, path_point = self._get_best_step()
-            path.append(path_point)
+        Same as `insert`, without computing the feature from audio.
+        """
+        self.live.append(feature)
+        return self._advance(window_cap)
+
+    def _advance(self, window_cap: int = None) -> int:
+        """Update the cost matrix for the newest live feature and take the OTW steps."""
+        self.live_index += 1
+        self._slope_limited = False
 
-            if step == "live":
-                break  # Stop if the best step is to move in the live sequence
+        if self.live_index >= self.history:
+            # Reuse the column of the oldest live frame held
+            column = self.live_index % self.history
+            self.accumulated_cost[:, column] = np.inf
+            self.predecessor[:, column] = STEP_NONE
 
-            # Increment referene index, but keep it in bounds
-            self.ref_index = min(self.ref_index + 1, self.ref_len - 1)
+        window_size = self.window_size
+        if window_cap is not None:
+            window_size = max(1, min(window_size, window_cap))
 
-            # Calculate a new reference column
+        with tracing.span("otw.row"):
             for k in range(
-                max(self.live_index - self.window_size + 1, 0), self.live_index + 1
+                max(0, self.ref_index - window_size + 1), self.ref_index + 1
             ):
-                self._update_accumulated_cost(self.ref_index, k)
+                self._update_accumulated_cost(k, self.live_index)
 
-            if step == "both":
-                break
+        path = []
+        with tracing.span("otw.best_step"):
+            while True:
+                step, path_point = self._get_best_step()
+                path.append(path_point)
+
+                if step == "live":
+                    break  # Stop if the best step is to move in the live sequence
+
+                # Increment referene index, but keep it in bounds
+                self.ref_index = min(self.ref_index + 1, self.ref_len - 1)
+
+                # Calculate a new reference column
+                with tracing.span("otw.column"):
+                    for k in range(
+                        max(self.live_index - window_size + 1, 0), self.live_index + 1
+                    ):
+                        self._update_accumulated_cost(self.ref_index, k)
+
+                if step == "both":
+                    break
 
         # Update the path with the new reference index
         current_ref_position = path[-1][0]
-        self.path_z.append(current_ref_position)
+        self.path_z.append(current_ref_position, self.live_index)
 
         # Prevent backward steps
         if current_ref_position < self.last_ref_index:
@@ -176,9 +270,42 @@ class OnlineTimeWarping:
 
         self.last_ref_index = current_ref_position
 
+        if self.min_window_size is not None:
+            self._adapt_window_size()
+
         # Return the current reference index
         return current_ref_position
 
+    def _adapt_window_size(self):
+        """
+        Shrink the search window while the local cost along the path is low and
+        steady, and widen it (up to `max_window_size`) when the cost spikes or the
+        path runs into the slope constraint.
+        """
+        local_cost = 1 - self.ref.compare_features(
+            self.live, self.ref_index, self.live_index
+        )
+
+        if self._cost_mean is None:
+            self._cost_mean = local_cost
+            return
+
+        deviation = max(np.sqrt(self._cost_var), self.MIN_COST_DEVIATION)
+        spike = local_cost > self._cost_mean + self.SPIKE_DEVIATIONS * deviation
+
+        # Hold the full window until the start-up phase is over
+        if self.live_index >= self.max_window_size:
+            if spike or self._slope_limited:
+                self.window_size = min(2 * self.window_size, self.max_window_size)
+            elif local_cost <= self._cost_mean:
+                self.window_size = max(self.window_size - 1, self.min_window_size)
+
+        delta = local_cost - self._cost_mean
+        self._cost_mean += self.COST_SMOOTHING * delta
+        self._cost_var = (1 - self.COST_SMOOTHING) * (
+            self._cost_var + self.COST_SMOOTHING * delta**2
+        )
+
     def _get_best_step(self) -> Tuple[str, Tuple[int, int]]:
         """
         Determines the optimal next step in the DTW alignment path
@@ -196,22 +323,22 @@ class OnlineTimeWarping:
         Considers slope constraints, run counts, and weighting factors in decision.
         """
 
-        row_costs = self.accumulated_cost[self.ref_index, : self.live_index + 1]
-        col_costs = self.accumulated_cost[: self.ref_index + 1, self.live_index]
+        row_costs = self._recent_row(self.ref_index)
+        col_costs = self.accumulated_cost[
+            : self.ref_index + 1, self.live_index % self.history
+        ]
 
-        best_t = np.argmin(row_costs)
+        # Row costs run from the oldest live frame held to the current one
+        best_t = self.live_index - (len(row_costs) - 1 - np.argmin(row_costs))
         best_j = np.argmin(col_costs)
+        best_row_cost = row_costs.min()
 
         # Check if the best step is to move in the live sequence
-        if (
-            self.accumulated_cost[best_j, self.live_index]
-            < self.accumulated_cost[self.ref_index, best_t]
-        ):
+        if col_costs[best_j] < best_row_cost:
             best_t = self.live_index
             step = "live"
         elif (
-            self.accumulated_cost[best_j, self.live_index]
-            > self.accumulated_cost[self.ref_index, best_t]
+            col_costs[best_j] > best_row_cost
         ):  # Otherwise, move in the reference sequence
             best_j = self.ref_index
             step = "ref"
@@ -225,12 +352,13 @@ class OnlineTimeWarping:
             step = "both"
 
         # At the start, move in both sequences
-        if self.live_index < self.window_size:
+        if self.live_index < self.max_window_size:
             step = "both"
 
         # If the run count exceeds the maximum run count, switch steps
         if self.run_count >= self.max_run_count:
             step = "live" if self.previous_step == "ref" else "ref"
+            self._slope_limited = True
 
         # Reset the run count if the step changes
         if step == "both" or self.previous_step != step:
@@ -247,6 +375,15 @@ class OnlineTimeWarping:
         # Return the best step and indices
         return step, (best_j, best_t)
 
+    def _recent_row(self, ref_index: int) -> np.ndarray:
+        """Return the row of `ref_index` for the live frames held, oldest first."""
+        if self.live_index < self.history:
+            return self.accumulated_cost[ref_index, : self.live_index + 1]
+        # Column of the oldest live frame held
+        split = (self.live_index + 1) % self.history
+        row = self.accumulated_cost[ref_index]
+        return np.concatenate((row[split:], row[:split]))
+
     def _update_accumulated_cost(self, ref_index: int, live_index: int):
         """
         Updates the dynamic programming cost matrix at a specific (ref_index, live_index)
@@ -267,21 +404,76 @@ class OnlineTimeWarping:
         vertical, and horizontal transitions.
         """
         cost = 1 - self.ref.compare_features(self.live, ref_index, live_index)
+        column = live_index % self.history
 
         if ref_index == 0 and live_index == 0:
-            self.accumulated_cost[ref_index, live_index] = cost
+            self.accumulated_cost[ref_index, column] = cost
+            self.predecessor[ref_index, column] = STEP_NONE
             return
 
-        steps = []
+        best_cost = np.inf
+        best_step = STEP_NONE
+        previous_column = (live_index - 1) % self.history
 
         # Calculate the cost of moving diagonally, vertically, and horizontally
         if ref_index > 0 and live_index > 0:
-            steps.append(
-                self.accumulated_cost[ref_index - 1, live_index - 1]
+            best_cost = (
+                self.accumulated_cost[ref_index - 1, previous_column]
                 + self.diag_weight * cost
             )
+            best_step = STEP_BOTH
         if ref_index > 0:
-            steps.append(self.accumulated_cost[ref_index - 1, live_index] + cost)
+            step_cost = self.accumulated_cost[ref_index - 1, column] + cost
+            if best_step == STEP_NONE or step_cost < best_cost:
+                best_cost, best_step = step_cost, STEP_REF
         if live_index > 0:
-            steps.append(self.accumulated_cost[ref_index, live_index - 1] + cost)
-        self.accumulated_cost[ref_index, live_index] = min(steps)
+            step_cost = self.accumulated_cost[ref_index, previous_column] + cost
+            if best_step == STEP_NONE or step_cost < best_cost:
+                best_cost, best_step = step_cost, STEP_LIVE
+
+        self.accumulated_cost[ref_index, column] = best_cost
+        self.predecessor[ref_index, column] = best_step
+
+    def get_backwards_path(self, b: int) -> List[Tuple[int, int]]:
+        """
+        Follow the predecessor pointers back from the current alignment position.
+
+        Parameters
+        ----------
+        b : int
+            Number of reference frames to trace back from the current reference index.
+
+        Returns
+        -------
+        list of tuple
+            (ref_index, live_index) cells visited, most recent first, excluding the
+            current position.
+
+        Notes
+        -----
+        Each cell is visited once, so the cost is proportional to the length of the
+        returned path rather than to the length of the performance. The path stops
+        at the oldest live frame held (see `max_history`).
+        """
+        j = self.ref_index
+        t = self.live_index
+        stop = self.ref_index - b
+        oldest = max(0, self.live_index - self.history + 1)
+        backwards_path = []
+
+        while j > stop and t >= oldest:
+            step = self.predecessor[j, t % self.history]
+            if step == STEP_BOTH:
+                j -= 1
+                t -= 1
+            elif step == STEP_REF:
+                j -= 1
+            elif step == STEP_LIVE:
+                t -= 1
+            else:
+                break  # Reached the origin
+            if t < oldest:
+                break  # The costs of earlier live frames were forgotten
+            backwards_path.append((j, t))
+
+        return backwards_path
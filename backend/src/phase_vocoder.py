@@ -2,6 +2,7 @@ import numpy as np
 import librosa
 from librosa import core
 from librosa.core import convert
+from . import tracing
 
 
 def normalize_audio(audio: np.ndarray) -> np.ndarray:
@@ -110,6 +111,7 @@ class PhaseVocoder:
         """Return the timestamp (in seconds) of how much audio we've output so far."""
         return self._audio_index / self.sample_rate
 
+    @tracing.traced("phase_vocoder.fill_output_buffer")
     def _fill_output_buffer(self, num_cols: int = None):
         """
         Synthesize more time-domain audio by processing a chunk of STFT frames
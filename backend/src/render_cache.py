@@ -0,0 +1,242 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: renders are only single-flight within a process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Renderer of the cached audio, part of every key so that audio rendered by a
+# previous renderer (the fluidsynth command) is not reused
+RENDERER = "pyfluidsynth"
+
+# (path, size, mtime_ns) -> sha256 hex digest of the file contents
+_digest_cache: Dict[Tuple[str, int, int], str] = {}
+_digest_lock = threading.Lock()
+
+
+def file_digest(path) -> str:
+    """
+    Return the SHA-256 hex digest of a file's contents.
+
+    Digests are memoized on (path, size, modification time), so a file is only
+    re-read after it changes.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    memo_key = (path, stat.st_size, stat.st_mtime_ns)
+    with _digest_lock:
+        digest = _digest_cache.get(memo_key)
+    if digest is not None:
+        return digest
+
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    digest = sha.hexdigest()
+
+    with _digest_lock:
+        _digest_cache[memo_key] = digest
+    return digest
+
+
+class RenderCache:
+    """
+    Content-addressed disk cache for rendered audio.
+
+    Entries are keyed by the content hash of the score and soundfont together with
+    the tempo, sample rate and instrument index, so identical requests share one
+    render no matter which session asked first. Renders are written to a temporary
+    file and atomically moved into place, only one thread renders a given key at a
+    time, and the least recently used entries are evicted once the cache exceeds its
+    size budget. Where `fcntl` is available, a file lock per key in `lock_dir` also
+    keeps other processes sharing the directory, such as render workers, from
+    rendering the same key concurrently.
+
+    Parameters
+    ----------
+    cache_dir : Path or str
+        Directory in which rendered files are stored.
+    max_bytes : int
+        Size budget for the cache. Least recently used entries are evicted when a
+        new entry pushes the total size over this budget.
+
+    Attributes
+    ----------
+    hits : int
+        Number of lookups served from the cache.
+    misses : int
+        Number of lookups that required a render, including those reported by
+        other processes through `record_lookups`.
+    """
+
+    ENTRY_PATTERN = re.compile(r"^[0-9a-f]{64}\.wav$")
+
+    def __init__(self, cache_dir, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.tmp_dir = self.cache_dir / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.lock_dir = self.cache_dir / "locks"
+        self.lock_dir.mkdir(exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self._counts_lock = threading.Lock()
+
+        # Per-key locks for single-flight rendering: key -> [lock, number of users]
+        self._key_locks: Dict[str, list] = {}
+        self._key_locks_lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        score_path,
+        tempo: float,
+        soundfont_path,
+        sample_rate: int,
+        instrument_index: int,
+    ) -> str:
+        """Return the cache key for one instrument of a score rendered with the given settings."""
+        params = {
+            "score": file_digest(score_path),
+            "tempo": float(tempo),
+            "soundfont": file_digest(soundfont_path),
+            "sample_rate": int(sample_rate),
+            "instrument_index": int(instrument_index),
+            "renderer": RENDERER,
+        }
+        return hashlib.sha256(
+            json.dumps(params, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    def path_for(self, key: str) -> Path:
+        """Return the path at which the entry for `key` is stored."""
+        return self.cache_dir / f"{key}.wav"
+
+    def get(self, key: str) -> Optional[Path]:
+        """Return the cached file for `key` and mark it as recently used, or None."""
+        path = self.path_for(key)
+        try:
+            os.utime(path)  # Refresh the modification time used for LRU ordering
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get_or_render(self, key: str, render: Callable[[Path], None]) -> Path:
+        """
+        Return the cached file for `key`, rendering it first on a miss.
+
+        Parameters
+        ----------
+        key : str
+            Cache key, as returned by `make_key`.
+        render : Callable[[Path], None]
+            Function that writes the audio for `key` to the given `.wav` path.
+
+        Returns
+        -------
+        Path
+            Path of the cached file.
+
+        Raises
+        ------
+        RuntimeError
+            If `render` does not produce a non-empty file.
+        """
+        with self._single_flight(key):
+            path = self.get(key)
+            if path is not None:
+                self.record_lookups(hits=1)
+                return path
+
+            self.record_lookups(misses=1)
+            fd, tmp_name = tempfile.mkstemp(suffix=".wav", dir=self.tmp_dir)
+            os.close(fd)
+            tmp_path = Path(tmp_name)
+            try:
+                render(tmp_path)
+                if tmp_path.stat().st_size == 0:
+                    raise RuntimeError(f"Render for cache key {key} produced no audio")
+                path = self.path_for(key)
+                os.replace(tmp_path, path)
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+
+        self.evict(keep=key)
+        return path
+
+    def record_lookups(self, hits: int = 0, misses: int = 0):
+        """Add lookups to the counts, e.g. those made by a worker process's cache."""
+        with self._counts_lock:
+            self.hits += hits
+            self.misses += misses
+
+    def size(self) -> int:
+        """Return the total size in bytes of the cached entries."""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, keep: Optional[str] = None):
+        """Remove least recently used entries until the cache fits its size budget."""
+        with self._evict_lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            for path, size, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                if keep is not None and path.name == f"{keep}.wav":
+                    continue
+                try:
+                    path.unlink()
+                    logger.info(f"Evicted {path.name} from render cache")
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def _entries(self):
+        """Yield (path, size, mtime) for every entry in the cache."""
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and self.ENTRY_PATTERN.match(entry.name):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield Path(entry.path), stat.st_size, stat.st_mtime_ns
+
+    @contextmanager
+    def _single_flight(self, key: str):
+        """Hold the lock for `key` so that only one thread or process renders it."""
+        with self._key_locks_lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                if fcntl is None:
+                    yield
+                    return
+                # Lock files are left in place: removing one could let two
+                # processes lock different files for the same key
+                with open(self.lock_dir / f"{key}.lock", "a") as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    try:
+                        yield
+                    finally:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            with self._key_locks_lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
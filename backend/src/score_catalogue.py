@@ -0,0 +1,264 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .render_cache import file_digest
+
+logger = logging.getLogger(__name__)
+
+
+def read_score_metadata(path) -> dict:
+    """
+    Parse a MusicXML file and return its parts, length in beats, time and tempo markings.
+
+    Beats are quarter notes, as in music21 offsets.
+    """
+    from music21 import converter, meter, tempo
+
+    score = converter.parse(path)
+
+    def markings(cls):
+        # Parts repeat the same markings; keep one per offset
+        found = {}
+        for element in score.flatten().getElementsByClass(cls):
+            found.setdefault(float(element.offset), element)
+        return sorted(found.items(), key=lambda item: item[0])
+
+    return {
+        "title": score.metadata.title if score.metadata else None,
+        "composer": score.metadata.composer if score.metadata else None,
+        "parts": [part.partName for part in score.parts],
+        "beats": float(score.highestTime),
+        "tempos": [
+            {
+                "beat": offset,
+                "bpm": mark.getQuarterBPM(),
+                "text": mark.text,
+            }
+            for offset, mark in markings(tempo.MetronomeMark)
+        ],
+        "time_signatures": [
+            {"beat": offset, "signature": signature.ratioString}
+            for offset, signature in markings(meter.TimeSignature)
+        ],
+    }
+
+
+class ScoreCatalogue:
+    """
+    Index of the MusicXML scores in a directory with per-score metadata.
+
+    The index is refreshed incrementally: files are only re-hashed when their size
+    or modification time changes, and only re-parsed when their content hash
+    changes. Metadata is persisted to `index_path`, so it is computed once per file
+    version rather than once per process. Gzipped copies of the scores are kept in
+    memory for serving.
+
+    Parameters
+    ----------
+    musicxml_dir : Path or str
+        Directory containing the `.musicxml` files.
+    index_path : Path or str, optional
+        JSON file in which the index is persisted. Not persisted if None (default).
+    refresh_interval : float, optional
+        Minimum number of seconds between two scans of the directory (default: 2).
+    read_metadata : Callable, optional
+        Function returning the metadata dict of a score (default: read_score_metadata).
+
+    Attributes
+    ----------
+    etag : str
+        Hash of the index; changes whenever a score is added, removed or modified.
+        None until the index is loaded or first built; `scores()` and `get()` wait
+        for it.
+    """
+
+    EXTENSION = ".musicxml"
+
+    def __init__(
+        self,
+        musicxml_dir,
+        index_path=None,
+        refresh_interval: float = 2,
+        read_metadata=read_score_metadata,
+    ):
+        self.musicxml_dir = str(musicxml_dir)
+        self.index_path = str(index_path) if index_path is not None else None
+        self.refresh_interval = refresh_interval
+        self.read_metadata = read_metadata
+
+        self._entries: Dict[str, dict] = {}
+        self._gzipped: Dict[str, bytes] = {}  # sha256 -> gzipped file contents
+        self._last_refresh = None
+        self.etag = None
+        # Guards the entries; held briefly, never while files are parsed
+        self._lock = threading.Lock()
+        # Held by the refresh in progress, which may parse scores for a while
+        self._refresh_lock = threading.Lock()
+
+        self._load_index()
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Rescan the directory, updating entries of added, removed or changed files.
+
+        Scans at most once every `refresh_interval` seconds unless `force` is set.
+        New and changed files are hashed and parsed without holding the lock of the
+        entries, so lookups are served from the current index meanwhile. Unless
+        `force` is set, a refresh requested while another one runs is skipped.
+        Returns whether the index changed.
+        """
+        if not self._refresh_lock.acquire(blocking=force):
+            return False
+        try:
+            return self._scan(force)
+        finally:
+            self._refresh_lock.release()
+
+    def _scan(self, force: bool) -> bool:
+        """Body of `refresh`, called with the refresh lock held."""
+        with self._lock:
+            now = time.monotonic()
+            if (
+                not force
+                and self._last_refresh is not None
+                and now - self._last_refresh < self.refresh_interval
+            ):
+                return False
+            self._last_refresh = now
+            # Only refreshes replace the entries, so this snapshot stays current
+            current = self._entries
+
+        entries = {}
+        changed = False
+        with os.scandir(self.musicxml_dir) as it:
+            for dir_entry in it:
+                if not (dir_entry.name.endswith(self.EXTENSION) and dir_entry.is_file()):
+                    continue
+                entry = self._update_entry(dir_entry, current.get(dir_entry.name))
+                changed |= entry is not current.get(dir_entry.name)
+                entries[dir_entry.name] = entry
+
+        changed |= entries.keys() != current.keys()
+        if changed or self.etag is None:
+            self._swap_entries(entries)
+        return changed
+
+    def _wait_for_index(self):
+        """
+        Block until an index exists, waiting for the scan in progress or scanning
+        now if no index was loaded or built yet, e.g. on a cold start.
+        """
+        if self.etag is not None:
+            return
+        with self._refresh_lock:
+            if self.etag is None:
+                self._scan(force=True)
+
+    def _swap_entries(self, entries: Dict[str, dict]):
+        """Replace the entries and derived state with those of a completed scan."""
+        live_hashes = {entry["sha256"] for entry in entries.values()}
+        with self._lock:
+            self._entries = entries
+            self._gzipped = {
+                sha: data for sha, data in self._gzipped.items() if sha in live_hashes
+            }
+            self._update_etag()
+        # Saves are serialized by the refresh lock
+        self._save_index(entries)
+
+    def scores(self) -> List[dict]:
+        """Return the entries of all scores, sorted by filename."""
+        self._wait_for_index()
+        self.refresh()
+        with self._lock:
+            return [self._entries[name] for name in sorted(self._entries)]
+
+    def get(self, filename: str) -> Optional[dict]:
+        """Return the entry of `filename`, or None if there is no such score."""
+        self._wait_for_index()
+        self.refresh()
+        with self._lock:
+            return self._entries.get(filename)
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.musicxml_dir, filename)
+
+    def gzipped(self, filename: str) -> Optional[bytes]:
+        """Return the gzipped contents of `filename`, compressing it on first use."""
+        entry = self.get(filename)
+        if entry is None:
+            return None
+        with self._lock:
+            data = self._gzipped.get(entry["sha256"])
+        if data is None:
+            with open(self.path(filename), "rb") as f:
+                data = gzip.compress(f.read(), mtime=0)
+            with self._lock:
+                self._gzipped[entry["sha256"]] = data
+        return data
+
+    def _update_entry(self, dir_entry, entry: Optional[dict]) -> dict:
+        """Return the entry for a file, reusing its current `entry` if unchanged."""
+        stat = dir_entry.stat()
+        if (
+            entry is not None
+            and entry["size"] == stat.st_size
+            and entry["mtime_ns"] == stat.st_mtime_ns
+        ):
+            return entry
+
+        sha256 = file_digest(dir_entry.path)
+        if entry is not None and entry["sha256"] == sha256:
+            metadata, error = entry["metadata"], entry["error"]
+        else:
+            metadata, error = None, None
+            try:
+                metadata = self.read_metadata(dir_entry.path)
+            except Exception as e:
+                logger.error(f"Could not read metadata of {dir_entry.name}: {e!r}")
+                error = str(e) or type(e).__name__
+
+        return {
+            "filename": dir_entry.name,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": sha256,
+            "metadata": metadata,
+            "error": error,
+        }
+
+    def _update_etag(self):
+        listing = sorted((name, entry["sha256"]) for name, entry in self._entries.items())
+        self.etag = hashlib.sha256(json.dumps(listing).encode("utf-8")).hexdigest()
+
+    def _load_index(self):
+        if self.index_path is None or not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path) as f:
+                self._entries = {entry["filename"]: entry for entry in json.load(f)}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable score index {self.index_path}: {e!r}")
+            self._entries = {}
+        self._update_etag()
+
+    def _save_index(self, entries: Dict[str, dict]):
+        if self.index_path is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self.index_path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(suffix=".json", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(list(entries.values()), f, indent=2)
+            os.replace(tmp_name, self.index_path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
@@ -1,6 +1,10 @@
 from .otw import OnlineTimeWarping as OTW
+import bisect
+import time
 import numpy as np
+from .alignment_path import AlignmentPath
 from .features_cens import CENSFeatures
+from . import tracing
 
 
 class ScoreFollower:
@@ -15,7 +19,9 @@ class ScoreFollower:
     reference : str
         Path to the reference audio file.
     c:  int, optional
-        Width of the DTW search window (default: 10).
+        Width of the DTW search window (default: 10). Ceiling of the window if `min_c` is set.
+    min_c : int, optional
+        Floor of the adaptive DTW search window. If None (default), the window is fixed at `c`.
     max_run_count : int, optional
         Slope constraint for how many steps can occur in one direction before switching (default: 3).
     diag_weight : float, optional
@@ -24,8 +30,28 @@ class ScoreFollower:
         Sample rate for audio processing (default: 44100).
     win_length : int, optional
         Number of samples per audio frame (FFT window length, default: 8192).
+    hop_length : int, optional
+        Number of samples between the starts of consecutive frames. Defaults to
+        `win_length` (non-overlapping windows).
     features_cls : Type[Features], optional
         Feature extraction class to use (default: CENSFeatures).
+    silence_threshold : float, optional
+        RMS level in dBFS below which a window is treated as silent. Silent windows
+        skip the OTW update and hold the current position. Disabled if None (default).
+    silence_hangover : int, optional
+        Number of consecutive silent windows that are still aligned before gating
+        starts, so note releases are tracked (default: 2).
+    path_log : str, optional
+        Path of a `.npy` file to which alignment points are appended as they are
+        computed. Disabled if None (default).
+    ref_features : Features, optional
+        Precomputed reference features, e.g. prepared by a synthesis job. If given,
+        `ref_filename` is not loaded. They must have been computed with the same
+        sample rate, window length and hop length.
+    max_history : int, optional
+        Number of most recent live windows whose alignment costs OTW keeps, which
+        bounds its memory for long performances. If None (default), every window is
+        kept.
 
     Attributes
     ----------
@@ -33,12 +59,26 @@ class ScoreFollower:
         Matrix of reference CENS feature vectors (shape: [n_frames, 12]).
     otw : OTW
         Online time warping object for matching features.
-    path : list of tuple
-        List of (ref_index, live_index) alignment points.
+    path : AlignmentPath
+        Array-backed (ref_index, live_index) alignment points. `live_index` counts
+        every window, including gated ones, so it always maps to live time.
     sample_rate : int
         Sample rate of the audio signal.
     win_length : int
         Number of samples per feature frame.
+    hop_length : int
+        Number of samples between consecutive feature frames.
+    live_index : int
+        Index of the latest live window, including gated windows.
+    gated_frames : int
+        Number of windows that skipped the OTW update because they were silent.
+    coasted_frames : int
+        Number of windows that were not analysed and followed the recent tempo instead.
+    timings : Dict[str, float]
+        Seconds spent in feature extraction (`features`) and in the OTW update (`otw`)
+        during the latest call to `step`.
+    effective_c : int
+        Current width of the DTW search window.
     """
 
     def __init__(
@@ -49,107 +89,273 @@ class ScoreFollower:
         diag_weight: float = 0.4,
         sample_rate: int = 44100,
         win_length: int = 8192,
+        hop_length: int = None,
         features_cls=CENSFeatures,
+        silence_threshold: float = None,
+        silence_hangover: int = 2,
+        path_log: str = None,
+        min_c: int = None,
+        ref_features=None,
+        max_history: int = None,
     ):
         self.sample_rate = sample_rate
         self.win_length = win_length
+        self.hop_length = hop_length if hop_length is not None else win_length
 
-        self.ref_features = features_cls.from_file(
-            filepath=ref_filename,
-            sr=sample_rate,
-            win_len=win_length,
-            hop_len=win_length,
-        )
+        if not 0 < self.hop_length <= self.win_length:
+            raise ValueError("hop_length must be in the range (0, win_length]")
+
+        if ref_features is None:
+            ref_features = features_cls.from_file(
+                filepath=ref_filename,
+                sr=sample_rate,
+                win_len=win_length,
+                hop_len=self.hop_length,
+            )
+        elif (ref_features.sr, ref_features.win_len, ref_features.hop_len) != (
+            sample_rate,
+            win_length,
+            self.hop_length,
+        ):
+            raise ValueError(
+                "ref_features were computed with a different sample rate, window "
+                "length or hop length"
+            )
+        self.ref_features = ref_features
 
         # Initialize OTW object
         self.otw = OTW(
-            self.ref_features, sample_rate, win_length, c, max_run_count, diag_weight
+            self.ref_features,
+            sample_rate,
+            win_length,
+            c,
+            max_run_count,
+            diag_weight,
+            min_c=min_c,
+            max_history=max_history,
         )
 
         # Online DTW alignment path
-        self.path = []
+        self.path = AlignmentPath(
+            capacity=self.otw.live.num_features, log_path=path_log
+        )
+
+        # Samples received but not yet consumed by a complete hop
+        self._pending = np.zeros(0, dtype=np.float32)
+
+        # Latest estimated position in the reference audio (in seconds)
+        self.position = 0.0
+
+        # Silence gate
+        self.silence_threshold = silence_threshold
+        self.silence_hangover = silence_hangover
+        self._silence_rms = (
+            10 ** (silence_threshold / 20) if silence_threshold is not None else None
+        )
+        self._silent_run = 0  # Number of consecutive silent windows
+
+        self.live_index = -1
+        self.gated_frames = 0
+        # OTW live index of the next analysed window after each gated window
+        self._gated_before = []
+
+        # Coasting through windows without analysing them
+        self.coasted_frames = 0
+        self._coast_position = None  # Predicted reference index, None when not coasting
+        self._coast_rate = 1.0  # Reference windows per live window
+
+        self.timings = {"features": 0.0, "otw": 0.0}
+
+    @property
+    def effective_c(self) -> int:
+        """Current width of the DTW search window."""
+        return self.otw.window_size
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Number of bytes held by the score follower. Frozen reference features are
+        shared with other score followers and are not counted.
+        """
+        return (
+            (0 if self.ref_features.frozen else self.ref_features.nbytes)
+            + self.otw.nbytes
+            + self.path.nbytes
+            + self._pending.nbytes
+        )
 
-    def step(self, frames: np.ndarray) -> float:
+    def close(self):
+        """Write the final header of the alignment path log and close it, if any."""
+        self.path.close()
+
+    # Number of recent alignment points used to estimate the tempo when coasting
+    COAST_TEMPO_WINDOWS = 16
+
+    @tracing.traced("score_follower.step")
+    def step(
+        self, frames: np.ndarray, window_cap: int = None, coast: bool = False
+    ) -> float:
         """
         Process the next chunk of mono audio samples and update alignment path.
 
+        Incoming samples are accumulated and framed into windows of `win_length`
+        samples spaced `hop_length` apart, matching the framing of the reference
+        features. One OTW step is run per complete window, so a chunk may trigger
+        zero, one or several steps regardless of its size.
+
         Parameters
         ----------
         frames : np.ndarray
-            1D array of mono audio samples. Must be at least `win_length` in length.
-            If fewer, zero-padding is applied.
+            Array of mono audio samples of any length, shaped (n,) or (1, n).
+        window_cap : int, optional
+            Upper bound on the DTW search window for the windows of this chunk,
+            trading accuracy for speed when falling behind real time.
+        coast : bool, optional
+            Skip feature extraction for the windows of this chunk and advance along
+            the recently estimated tempo instead. The OTW state is advanced with the
+            predicted reference features, so alignment resumes seamlessly with the
+            next analysed chunk. Used to drop stale audio under overload.
 
         Returns
         -------
         float
-            Estimated position in the reference audio (in seconds).
+            Latest estimated position in the reference audio (in seconds).
         """
-        # If the number of frames is too small, pad with zeros
-        if frames.shape[-1] < self.win_length:
-            frames = np.pad(
-                frames,
-                ((0, 0), (0, self.win_length - frames.shape[-1])),
-                mode="constant",
-                constant_values=((0, 0), (0, 0)),
+        self.timings = {"features": 0.0, "otw": 0.0}
+        samples = np.asarray(frames, dtype=np.float32).reshape(-1)
+        if self._pending.size:
+            samples = np.concatenate((self._pending, samples))
+
+        # Run one OTW step for every window that is complete
+        start = 0
+        while start + self.win_length <= samples.shape[0]:
+            self._step_window(
+                samples[start : start + self.win_length], window_cap, coast
             )
+            start += self.hop_length
+
+        # Keep the samples needed by the next window
+        self._pending = samples[start:].copy()
+
+        return self.position
+
+    def _step_window(
+        self, window: np.ndarray, window_cap: int = None, coast: bool = False
+    ):
+        """Run a single OTW step on one window of `win_length` samples."""
+        self.live_index += 1
+
+        if self._is_silent(window):
+            self._silent_run += 1
+        else:
+            self._silent_run = 0
 
-        # Calculate position in reference audio
-        ref_index = self.otw.insert(frames)
+        if self._silent_run > self.silence_hangover:
+            # Hold the current position instead of aligning silence
+            ref_index = self.otw.last_ref_index
+            self.gated_frames += 1
+            self._gated_before.append(self.otw.live_index + 1)
+        else:
+            start = time.perf_counter()
+            with tracing.span("score_follower.features"):
+                if coast:
+                    feature = self._coast_feature()
+                    self.coasted_frames += 1
+                else:
+                    self._coast_position = None
+                    feature = self.otw.live.make_feature(window)
+            extracted = time.perf_counter()
+
+            # Calculate position in reference audio
+            ref_index = self.otw.insert_feature(feature, window_cap)
+            self.timings["features"] += extracted - start
+            self.timings["otw"] += time.perf_counter() - extracted
 
         # Record position in alignment path
-        self.path.append((ref_index, self.otw.live_index))
+        self.path.append(ref_index, self.live_index)
+
+        # Timestamp of the end of the matched reference window in seconds
+        self.position = (
+            ref_index * self.hop_length + self.win_length
+        ) / self.sample_rate
+
+    def _coast_feature(self) -> np.ndarray:
+        """Return the reference feature at the position predicted from the recent tempo."""
+        if self._coast_position is None:
+            self._coast_position = float(self.otw.ref_index)
+            self._coast_rate = self._estimate_rate()
+        self._coast_position = min(
+            self._coast_position + self._coast_rate, self.otw.ref_len - 1
+        )
+        return self.ref_features.get_feature(int(round(self._coast_position)))
 
-        # Return timestamp in the reference audio in seconds
-        return (ref_index + 1) * self.win_length / self.sample_rate
+    def _estimate_rate(self) -> float:
+        """Reference windows advanced per live window over the recent alignment path."""
+        points = self.path.as_array()[-self.COAST_TEMPO_WINDOWS :]
+        if len(points) < 2 or points[-1, 1] == points[0, 1]:
+            return 1.0
+        rate = (points[-1, 0] - points[0, 0]) / (points[-1, 1] - points[0, 1])
+        max_run_count = self.otw.max_run_count
+        return float(np.clip(rate, 1 / max_run_count, max_run_count))
+
+    def _is_silent(self, window: np.ndarray) -> bool:
+        """Return True if the RMS level of `window` is below the silence threshold."""
+        if self._silence_rms is None:
+            return False
+        rms = np.sqrt(np.dot(window, window) / window.shape[0])
+        return rms < self._silence_rms
 
     def get_backwards_path(self, b):
         """
-        Traces a backwards path from the current alignment position using the accumulated cost matrix.
+        Traces a backwards path from the current alignment position using the
+        predecessor pointers recorded by OTW as the cost matrix is filled in.
 
         Parameters
         ----------
         b : int
-            Number of steps to trace backward from the current reference index.
+            Number of reference frames to trace backward from the current reference index.
 
         Returns
         -------
         list of tuple
             A list of (ref_index, live_index) coordinates representing the backward path.
+            Live indices count every window, including gated ones, like `path`.
 
         Notes
         -----
-        Used to analyze or visualize local sections of the DTW path.
+        Used to analyze or visualize local sections of the DTW path. Runs in time
+        proportional to the length of the returned path, so it is cheap enough to
+        call on every frame.
         """
-        cost_matrix = self.otw.accumulated_cost
-        ref_index = self.otw.ref_index  # row index
-        live_index = self.otw.live_index  # column index
-
-        j = ref_index
-        t = live_index
-        backwards_path = []
-
-        while j > ref_index - b and (0, 0) not in backwards_path:
-            down, left, diagonal = (
-                cost_matrix[j - 1, t],
-                cost_matrix[j, t - 1],
-                cost_matrix[j - 1, t - 1],
+        # OTW only counts the windows it analysed
+        return [
+            (
+                ref_index,
+                live_index + bisect.bisect_right(self._gated_before, live_index),
             )
-            minimum_cost = min(down, left, diagonal)
-            if minimum_cost == down:
-                backwards_path.append((j - 1, t))
-                j -= 1
-            elif minimum_cost == left:
-                backwards_path.append((j, t - 1))
-                t -= 1
-            else:
-                backwards_path.append((j - 1, t - 1))
-                j -= 1
-                t -= 1
-
-        return backwards_path
+            for ref_index, live_index in self.otw.get_backwards_path(b)
+        ]
 
     def get_path_difference(self, back_path):
-        return [x for x in self.path if x not in back_path]
+        """
+        Return the points of `self.path` that are not on `back_path`, from the
+        earliest live index of `back_path` on.
+
+        Only the tail of the path covered by `back_path` is compared, found by
+        binary search on the live indices, so the cost does not grow with the
+        length of the performance.
+        """
+        if not back_path:
+            return []
+        points = self.path.as_array()
+        # back_path is ordered most recent first
+        start = np.searchsorted(points[:, 1], back_path[-1][1])
+        back_points = set(back_path)
+        return [
+            point
+            for point in map(tuple, points[start:].tolist())
+            if point not in back_points
+        ]
 
 
 if __name__ == "__main__":
@@ -168,7 +374,7 @@ if __name__ == "__main__":
     source_audio = source_audio[0].reshape((1, -1))
 
     score_follower = ScoreFollower(
-        reference=reference,
+        ref_filename=reference,
         c=50,
         max_run_count=3,
         diag_weight=0.5,
@@ -185,4 +391,4 @@ if __name__ == "__main__":
             f"Estimated time: {estimated_time}, Ref index: {score_follower.otw.ref_index * score_follower.win_length / score_follower.sample_rate}"
         )
 
-    print(score_follower.path)
+    print(score_follower.path.as_array())
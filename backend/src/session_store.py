@@ -0,0 +1,242 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def value_nbytes(value) -> int:
+    """Return the bytes held by a session value that reports them through `nbytes`, else 0."""
+    nbytes = getattr(value, "nbytes", None)
+    return int(nbytes) if isinstance(nbytes, (int, float)) else 0
+
+
+def close_value(value):
+    """Release the resources of a session value that defines `close()`, e.g. a Synchronizer."""
+    close = getattr(value, "close", None)
+    if not callable(close):
+        return
+    try:
+        close()
+    except Exception:
+        logger.exception(f"Failed to close session value {type(value).__name__}")
+
+
+class _SessionEntry:
+    def __init__(self, now: float):
+        self.data: Dict = {}
+        self.created_at = now
+        self.last_access = now
+        self.nbytes = 0
+
+    def measure(self) -> int:
+        self.nbytes = sum(value_nbytes(value) for value in self.data.values())
+        return self.nbytes
+
+
+class SessionStore:
+    """
+    Thread-safe store of per-client session data.
+
+    Sessions are plain dicts of values such as the session's `Synchronizer`. Each
+    session's memory footprint is the sum of the `nbytes` of its values. Sessions
+    idle for longer than `ttl` are removed by `reap()`, which a background reaper
+    thread can call periodically. Whenever the total footprint exceeds `max_bytes`,
+    the least recently used sessions are evicted.
+
+    Values must be stored with `set()` rather than by mutating the dict returned by
+    `get()`, so that the footprint of the session is updated. Values that define
+    `close()` are closed when they are replaced or their session is removed.
+
+    Parameters
+    ----------
+    ttl : float, optional
+        Seconds a session may stay idle before it is removed (default: 1800).
+    max_bytes : int, optional
+        Memory budget for all sessions. Unlimited if None (default).
+    clock : Callable[[], float], optional
+        Time source, in seconds (default: time.monotonic).
+
+    Attributes
+    ----------
+    evictions : int
+        Number of sessions removed for exceeding the memory budget.
+    expirations : int
+        Number of sessions removed for being idle longer than `ttl`.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 1800,
+        max_bytes: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+
+        self.evictions = 0
+        self.expirations = 0
+
+        self._sessions: "OrderedDict[str, _SessionEntry]" = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.RLock()
+
+        self._reaper = None
+        self._stop_reaper = threading.Event()
+
+    def create(self, token: str):
+        """Create an empty session for `token`."""
+        with self._lock:
+            if token in self._sessions:
+                raise KeyError(f"Session {token[:8]} already exists")
+            self._sessions[token] = _SessionEntry(self.clock())
+
+    def get(self, token: str) -> Optional[Dict]:
+        """Return the data of session `token` and mark it as used, or None if it does not exist."""
+        with self._lock:
+            entry = self._touch(token)
+            return entry.data if entry is not None else None
+
+    def set(self, token: str, key: str, value):
+        """
+        Store `value` under `key` in session `token`.
+
+        Least recently used sessions other than `token` are evicted if the new value
+        pushes the store over its memory budget.
+
+        Raises
+        ------
+        KeyError
+            If the session does not exist.
+        """
+        with self._lock:
+            entry = self._touch(token)
+            if entry is None:
+                raise KeyError(f"Session {token[:8]} not found")
+            previous = entry.data.get(key)
+            entry.data[key] = value
+            if previous is not None and previous is not value:
+                close_value(previous)
+            self._nbytes -= entry.nbytes
+            self._nbytes += entry.measure()
+            self._enforce_budget(keep=token)
+
+    def remove(self, token: str) -> bool:
+        """Remove session `token`. Return whether it existed."""
+        with self._lock:
+            entry = self._sessions.pop(token, None)
+            if entry is None:
+                return False
+            self._nbytes -= entry.nbytes
+        for value in entry.data.values():
+            close_value(value)
+        return True
+
+    def nbytes(self) -> int:
+        """Return the total memory footprint of all sessions in bytes."""
+        with self._lock:
+            return self._nbytes
+
+    def reap(self) -> int:
+        """
+        Remove idle sessions, re-measure the rest and enforce the memory budget.
+
+        Returns
+        -------
+        int
+            Number of sessions removed.
+        """
+        removed = 0
+        with self._lock:
+            cutoff = self.clock() - self.ttl
+            for token, entry in list(self._sessions.items()):
+                if entry.last_access >= cutoff:
+                    break  # Sessions are kept in order of last access
+                self.remove(token)
+                self.expirations += 1
+                removed += 1
+                logger.info(f"Session {token[:8]} expired after {self.ttl:.0f} s idle")
+
+            # Values such as alignment paths can grow after they are stored
+            self._nbytes = sum(entry.measure() for entry in self._sessions.values())
+            removed += self._enforce_budget()
+        return removed
+
+    def start_reaper(self, interval: float = 60):
+        """Start a daemon thread that calls `reap()` every `interval` seconds."""
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        self._stop_reaper.clear()
+
+        def run():
+            while not self._stop_reaper.wait(interval):
+                try:
+                    self.reap()
+                except Exception:
+                    logger.exception("Session reaper failed")
+
+        self._reaper = threading.Thread(target=run, name="session-reaper", daemon=True)
+        self._reaper.start()
+
+    def stop_reaper(self):
+        """Stop the reaper thread, if running."""
+        self._stop_reaper.set()
+        if self._reaper is not None:
+            self._reaper.join()
+            self._reaper = None
+
+    def snapshot(self) -> List[Dict]:
+        """
+        Return a summary of every session, most recently used last.
+
+        Tokens are truncated so that the summary does not expose credentials.
+        """
+        now = self.clock()
+        with self._lock:
+            return [
+                {
+                    "session": token[:8],
+                    "age": now - entry.created_at,
+                    "idle": now - entry.last_access,
+                    "nbytes": entry.nbytes,
+                    "values": {
+                        key: value_nbytes(value) for key, value in entry.data.items()
+                    },
+                }
+                for token, entry in self._sessions.items()
+            ]
+
+    def _touch(self, token: str) -> Optional[_SessionEntry]:
+        entry = self._sessions.get(token)
+        if entry is not None:
+            entry.last_access = self.clock()
+            self._sessions.move_to_end(token)
+        return entry
+
+    def _enforce_budget(self, keep: str = None) -> int:
+        """Evict least recently used sessions until the store fits its budget."""
+        if self.max_bytes is None:
+            return 0
+        evicted = 0
+        for token in list(self._sessions):
+            if self._nbytes <= self.max_bytes:
+                break
+            if token == keep:
+                continue
+            nbytes = self._sessions[token].nbytes
+            self.remove(token)
+            self.evictions += 1
+            evicted += 1
+            logger.info(f"Session {token[:8]} evicted to free {nbytes} bytes")
+        return evicted
+
+    def __contains__(self, token) -> bool:
+        with self._lock:
+            return token in self._sessions
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
@@ -1,5 +1,8 @@
+import time
+
 from .score_follower import ScoreFollower
 from .audio_buffer import AudioBuffer
+from .deadline_monitor import DeadlineMonitor
 from simple_pid import PID
 
 
@@ -23,13 +26,36 @@ class Synchronizer:
     win_length : int, optional
         Window length for CENS feature generation
     hop_length : int, optional
-        Hop length for phase vocoder
+        Hop length between score follower windows
     c : int, optional
-        Search width for OTW
+        Search width for OTW (ceiling of the search width if `min_c` is set)
     max_run_count : int, optional
         Slope constraint for OTW
     diag_weight : int, optional
         Diagonal weight for OTW. Values less than 2 bias toward diagonal steps.
+    silence_threshold : float, optional
+        RMS level in dBFS below which live audio skips the OTW update. Disabled if None.
+    silence_hangover : int, optional
+        Number of silent windows still aligned before the silence gate engages
+    min_c : int, optional
+        Floor of the adaptive OTW search width. If None, the search width is fixed at `c`.
+    ref_features : Features, optional
+        Precomputed reference features. If given, `reference` is not loaded.
+    catch_up_latency : float, optional
+        Latency in seconds above which the score follower narrows its search window
+        to catch up. Disabled if None.
+    drop_latency : float, optional
+        Latency in seconds above which stale audio is no longer analysed and the
+        score follower coasts along the recent tempo. Disabled if None.
+    catch_up_c : int, optional
+        Search width while catching up. Defaults to `min_c`, or half of `c`.
+    clock : Callable, optional
+        Monotonic clock in seconds used to measure latency.
+    on_deadline_miss : Callable[[Dict], None], optional
+        Called with the record of every chunk processed slower than real time.
+    max_history : int, optional
+        Number of most recent live windows whose OTW costs are kept. If None, the
+        whole performance is kept.
 
     Attributes
     ----------
@@ -41,8 +67,44 @@ class Synchronizer:
         ScoreFollower object to perform OTW
     PID : simple_pid.PID
         PID controller to adjust playback rate
+    latency : float
+        How far the latest chunk was processed behind the live audio, in seconds
+    mode : str
+        How the latest chunk was processed: NORMAL, CATCH_UP or DROP
+    catch_up_steps : int
+        Number of chunks processed with a narrowed search window
+    dropped_steps : int
+        Number of chunks whose audio was not analysed
+    timings : Dict[str, float]
+        Seconds spent in each stage of the latest `step` (or `step_batch`):
+        feature extraction, OTW update, PID controller and the whole step
+    effective_c : int
+        Width of the OTW search window used by the latest step: the adaptive width
+        of the score follower, capped at `catch_up_c` while catching up
+    deadlines : DeadlineMonitor
+        Processing/real-time ratio of each step, missed deadlines and the slowest
+        steps with the OTW indices at that moment
+
+    Notes
+    -----
+    Latency is measured against the audio clock: the first chunk sets the expected
+    arrival time of each following chunk from the amount of audio received, and the
+    earliest arrival seen so far is taken as on time. Client timestamps are positions
+    in the accompaniment, which runs at a varying playback rate, so they are not
+    comparable with the server clock. A backlog drains much faster than real time once
+    processing is cheaper, so a latency that persists, e.g. after the client paused
+    sending, is gradually accepted as the new baseline. Degrading under load keeps
+    the latency bounded instead of letting a backlog of chunks build up behind a slow
+    alignment.
     """
 
+    NORMAL = "normal"
+    CATCH_UP = "catch_up"
+    DROP = "drop"
+
+    # Seconds of persistent latency accepted as the new baseline per second of audio
+    BASELINE_DRIFT = 0.5
+
     def __init__(
         self,
         reference: str,
@@ -56,18 +118,51 @@ class Synchronizer:
         c: int = 10,
         max_run_count: int = 3,
         diag_weight: int = 0.4,
+        silence_threshold: float = None,
+        silence_hangover: int = 2,
+        min_c: int = None,
+        ref_features=None,
+        catch_up_latency: float = 0.25,
+        drop_latency: float = 1.0,
+        catch_up_c: int = None,
+        clock=time.monotonic,
+        on_deadline_miss=None,
+        max_history: int = None,
     ):
         self.sample_rate = sample_rate
         self.c = c
 
+        # Graceful degradation when processing falls behind the live audio
+        self.catch_up_latency = catch_up_latency
+        self.drop_latency = drop_latency
+        if catch_up_c is None:
+            catch_up_c = min_c if min_c is not None else max(1, c // 2)
+        self.catch_up_c = min(catch_up_c, c)
+        self.clock = clock
+        self._audio_time = 0.0  # Seconds of live audio received
+        self._min_offset = None  # Earliest arrival time minus audio time seen
+        self.latency = 0.0
+        self.mode = self.NORMAL
+        self.catch_up_steps = 0
+        self.dropped_steps = 0
+        self.timings = {}
+        self.effective_c = c
+        self.deadlines = DeadlineMonitor("Synchronizer", on_miss=on_deadline_miss)
+
         # Create a score follower to track the soloist
         self.score_follower = ScoreFollower(
-            reference=reference,
+            ref_filename=reference,
             c=c,
             max_run_count=max_run_count,
             diag_weight=diag_weight,
             sample_rate=sample_rate,
             win_length=win_length,
+            hop_length=hop_length,
+            silence_threshold=silence_threshold,
+            silence_hangover=silence_hangover,
+            min_c=min_c,
+            ref_features=ref_features,
+            max_history=max_history,
         )
 
         # Create an audio buffer to store the live soloist audio
@@ -83,18 +178,22 @@ class Synchronizer:
             setpoint=0,
             starting_output=1.0,
             output_limits=(1 / max_run_count, max_run_count),
-            sample_time=win_length / sample_rate,
+            sample_time=hop_length / sample_rate,
         )
 
-    def step(self, frames, accompanist_time):
+    def step(self, frames, accompanist_time, dt=None):
         """
 
         Parameters
         ----------
         frames : np.ndarray
-            Audio frames from the soloist
+            Audio frames from the soloist. Any number of frames is accepted; the
+            score follower buffers them until a complete hop is available.
         accompanist_time : float
             Time in the accompanist audio
+        dt : float, optional
+            Time step for the PID controller in seconds. Defaults to the wall-clock
+            time since the previous step.
 
         Returns
         -------
@@ -104,19 +203,104 @@ class Synchronizer:
             Estimated time in the soloist audio
 
         """
+        start = time.perf_counter()
         self.live_buffer.write(frames)  # Save the live soloist audio
+
+        self.mode = self._select_mode(frames.shape[-1])
+        live_index = self.score_follower.live_index
         estimated_time = self.score_follower.step(
-            frames
+            frames,
+            window_cap=self.catch_up_c if self.mode != self.NORMAL else None,
+            coast=self.mode == self.DROP,
         )  # Perform OTW on the live soloist audio
 
+        followed = time.perf_counter()
         error = accompanist_time - estimated_time
-        playback_rate = self.PID(error)
+        playback_rate = self.PID(error, dt=dt)
 
+        end = time.perf_counter()
+        self.timings = dict(
+            self.score_follower.timings, pid=end - followed, total=end - start
+        )
+        self.effective_c = self.score_follower.effective_c
+        if self.mode != self.NORMAL:
+            self.effective_c = min(self.effective_c, self.catch_up_c)
+        self.deadlines.record(
+            end - start,
+            frames.shape[-1] / self.sample_rate,
+            steps=self.score_follower.live_index - live_index,
+            live_index=self.score_follower.live_index,
+            ref_index=self.score_follower.otw.ref_index,
+            window_size=self.score_follower.otw.window_size,
+            mode=self.mode,
+        )
         return playback_rate, estimated_time
 
+    def step_batch(self, chunks, accompanist_times):
+        """Step through consecutive chunks that arrived together, e.g. after a network stall.
+
+        The PID controller is advanced by the audio duration of each chunk rather than
+        by wall-clock time, so a batch gives the same playback rates as the chunks
+        would have given one at a time.
+
+        Parameters
+        ----------
+        chunks : List[np.ndarray]
+            Consecutive audio frames from the soloist, oldest first
+        accompanist_times : List[float]
+            Time in the accompanist audio when each chunk was sent
+
+        Returns
+        -------
+        List[Tuple[float, float]]
+            Playback rate and estimated time in the soloist audio after each chunk
+        """
+        results = []
+        timings = {}
+        for frames, accompanist_time in zip(chunks, accompanist_times):
+            results.append(
+                self.step(
+                    frames, accompanist_time, dt=frames.shape[-1] / self.sample_rate
+                )
+            )
+            for stage, seconds in self.timings.items():
+                timings[stage] = timings.get(stage, 0.0) + seconds
+        self.timings = timings
+        return results
+
+    def _select_mode(self, num_frames: int) -> str:
+        """Update the latency estimate with a chunk of `num_frames` and pick its mode."""
+        duration = num_frames / self.sample_rate
+        self._audio_time += duration
+        offset = self.clock() - self._audio_time
+        if self._min_offset is None or offset < self._min_offset:
+            self._min_offset = offset
+        else:
+            self._min_offset = min(
+                self._min_offset + self.BASELINE_DRIFT * duration, offset
+            )
+        self.latency = offset - self._min_offset
+
+        if self.drop_latency is not None and self.latency >= self.drop_latency:
+            self.dropped_steps += 1
+            return self.DROP
+        if self.catch_up_latency is not None and self.latency >= self.catch_up_latency:
+            self.catch_up_steps += 1
+            return self.CATCH_UP
+        return self.NORMAL
+
+    @property
+    def nbytes(self) -> int:
+        """Number of bytes held by the score follower and live audio buffer"""
+        return self.score_follower.nbytes + self.live_buffer.nbytes
+
     def get_live_time(self):
         """Get the timestamp in the live soloist audio"""
         return self.live_buffer.get_time()
 
     def save_performance(self, path):
         self.live_buffer.save(path)
+
+    def close(self):
+        """Close the alignment path log of the score follower, if any."""
+        self.score_follower.close()
@@ -0,0 +1,281 @@
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pretty_midi
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+# Synths kept per soundfont and sample rate by each process. Every synth holds its
+# own copy of the soundfont, a few hundred MB for FluidR3_GM.
+DEFAULT_MAX_SYNTHS = 2
+
+# Order of events at the same time: release notes before changing controllers and
+# before starting notes, so that repeated notes are restruck
+_NOTE_OFF, _CONTROL, _NOTE_ON = 0, 1, 2
+
+
+def import_fluidsynth():
+    """Import pyFluidSynth, raising RuntimeError if it or FluidSynth is missing."""
+    try:
+        import fluidsynth
+    except ImportError as e:
+        raise RuntimeError(
+            f"pyFluidSynth is not available ({e}). Please install FluidSynth and "
+            "pyFluidSynth before rendering audio."
+        ) from e
+    return fluidsynth
+
+
+class SynthRenderer:
+    """
+    Renders pretty_midi instruments offline with one FluidSynth synthesizer.
+
+    The soundfont is loaded once, when the renderer is created; every render resets
+    the synthesizer and reuses it. No audio driver is started: samples are pulled
+    from the synthesizer as fast as it produces them. A renderer must only be used
+    by one thread at a time.
+
+    Parameters
+    ----------
+    soundfont_path : Path or str
+        Path to the soundfont file.
+    sample_rate : int, optional
+        Sample rate of the rendered audio (default: 44100).
+    gain : float, optional
+        Master gain of the synthesizer (default: 0.2, as the fluidsynth command).
+
+    Raises
+    ------
+    FileNotFoundError
+        If the soundfont file cannot be found.
+    RuntimeError
+        If pyFluidSynth or the FluidSynth library is not installed, or the soundfont
+        cannot be loaded.
+    """
+
+    def __init__(self, soundfont_path, sample_rate: int = 44100, gain: float = 0.2):
+        if not os.path.exists(soundfont_path):
+            raise FileNotFoundError(f"Soundfont not found: {soundfont_path}")
+        fluidsynth = import_fluidsynth()
+
+        self.soundfont_path = str(soundfont_path)
+        self.sample_rate = sample_rate
+        self.synth = fluidsynth.Synth(gain=gain, samplerate=sample_rate)
+        self.sfid = self.synth.sfload(self.soundfont_path)
+        if self.sfid == -1:
+            self.synth.delete()
+            raise RuntimeError(f"FluidSynth could not load {self.soundfont_path}")
+
+    def render(self, instrument: pretty_midi.Instrument) -> np.ndarray:
+        """
+        Render `instrument` from time 0 to its last event.
+
+        Returns
+        -------
+        np.ndarray
+            16-bit stereo samples shaped (n, 2), as written by `fluidsynth -F`.
+        """
+        channel = 9 if instrument.is_drum else 0
+        self.synth.system_reset()
+        self.synth.program_select(
+            channel, self.sfid, 128 if instrument.is_drum else 0, instrument.program
+        )
+
+        # (time, order, function, arguments) of every MIDI event
+        synth = self.synth
+        events = []
+        for note in instrument.notes:
+            note_on = (channel, note.pitch, note.velocity)
+            events.append((note.start, _NOTE_ON, synth.noteon, note_on))
+            events.append((note.end, _NOTE_OFF, synth.noteoff, (channel, note.pitch)))
+        for cc in instrument.control_changes:
+            events.append((cc.time, _CONTROL, synth.cc, (channel, cc.number, cc.value)))
+        for bend in instrument.pitch_bends:
+            pitch_bend = (channel, bend.pitch)
+            events.append((bend.time, _CONTROL, synth.pitch_bend, pitch_bend))
+        events.sort(key=lambda event: event[:2])
+
+        length = int(round(instrument.get_end_time() * self.sample_rate))
+        audio = np.zeros((length, 2), dtype=np.int16)
+        rendered = 0
+        for time, _, send, args in events:
+            position = min(int(round(time * self.sample_rate)), length)
+            if position > rendered:
+                audio[rendered:position] = self._samples(position - rendered)
+                rendered = position
+            send(*args)
+        if rendered < length:
+            audio[rendered:] = self._samples(length - rendered)
+        return audio
+
+    def render_to_file(self, instrument: pretty_midi.Instrument, output_file):
+        """Render `instrument` to a 16-bit stereo WAV file."""
+        audio = self.render(instrument)
+        sf.write(str(output_file), audio, self.sample_rate, subtype="PCM_16")
+
+    def _samples(self, num_samples: int) -> np.ndarray:
+        return np.asarray(self.synth.get_samples(num_samples)).reshape(-1, 2)
+
+    def close(self):
+        self.synth.delete()
+
+
+class SynthPool:
+    """
+    Thread-safe pool of warmed `SynthRenderer`s for one soundfont and sample rate.
+
+    Renderers are created on demand, up to `max_synths`, and kept for later renders,
+    so the soundfont is loaded once per renderer rather than once per render.
+    Callers beyond `max_synths` wait for a renderer to be released.
+
+    Parameters
+    ----------
+    soundfont_path : Path or str
+        Path to the soundfont file.
+    sample_rate : int, optional
+        Sample rate of the rendered audio (default: 44100).
+    max_synths : int, optional
+        Maximum number of renderers (default: DEFAULT_MAX_SYNTHS).
+
+    Attributes
+    ----------
+    loads : int
+        Number of times the soundfont was loaded, i.e. renderers created.
+    """
+
+    def __init__(
+        self,
+        soundfont_path,
+        sample_rate: int = 44100,
+        max_synths: int = DEFAULT_MAX_SYNTHS,
+    ):
+        self.soundfont_path = str(soundfont_path)
+        self.sample_rate = sample_rate
+        self.max_synths = max_synths
+        self.loads = 0
+        self._idle: "queue.LifoQueue[SynthRenderer]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def warm(self):
+        """Create a renderer if there is none, so the first render does not wait."""
+        with self.synth():
+            pass
+
+    @contextmanager
+    def synth(self):
+        """Borrow a renderer for the duration of the `with` block."""
+        renderer = self._acquire()
+        try:
+            yield renderer
+        finally:
+            self._idle.put(renderer)
+
+    def _acquire(self) -> SynthRenderer:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self.loads < self.max_synths
+            if create:
+                self.loads += 1
+        if not create:
+            return self._idle.get()
+        try:
+            logger.info(f"Loading soundfont {self.soundfont_path} into a new synth")
+            return SynthRenderer(self.soundfont_path, self.sample_rate)
+        except Exception:
+            with self._lock:
+                self.loads -= 1
+            raise
+
+    def render_to_file(self, instrument: pretty_midi.Instrument, output_file):
+        with self.synth() as renderer:
+            renderer.render_to_file(instrument, output_file)
+
+    def close(self):
+        """Delete the idle renderers."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# (soundfont path, sample rate) -> pool of this process
+_pools: Dict[Tuple[str, int], SynthPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_synth_pool(soundfont_path, sample_rate: int = 44100) -> SynthPool:
+    """Return this process's pool of renderers for a soundfont and sample rate."""
+    key = (os.path.abspath(soundfont_path), int(sample_rate))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = SynthPool(soundfont_path, sample_rate)
+        return pool
+
+
+def warm_synth(soundfont_path, sample_rate: int = 44100):
+    """
+    Load the soundfont into this process's pool ahead of the first render.
+
+    Meant as the initializer of worker processes. Failures are logged rather than
+    raised, since a failing initializer breaks the whole process pool; renders then
+    raise the error themselves.
+    """
+    try:
+        get_synth_pool(soundfont_path, sample_rate).warm()
+    except Exception as e:
+        logger.error(f"Could not warm a synth with {soundfont_path}: {e!r}")
+
+
+def render_executor(soundfont_path, sample_rate: int = 44100, max_workers: int = None):
+    """
+    Return a process pool whose workers load the soundfont when they start.
+
+    Renders submitted through `render_instruments_parallel` then run in parallel,
+    each worker reusing its warmed synth for every instrument it is given.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        # Spawn rather than fork: the server process runs request threads
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=warm_synth,
+        initargs=(str(soundfont_path), sample_rate),
+    )
+
+
+def _render_to_file(instrument, output_file, soundfont_path, sample_rate):
+    get_synth_pool(soundfont_path, sample_rate).render_to_file(instrument, output_file)
+    return output_file
+
+
+def render_instruments_parallel(
+    instruments: List[pretty_midi.Instrument],
+    output_files: List,
+    soundfont_path,
+    sample_rate: int,
+    executor: Executor,
+) -> List:
+    """Render each instrument to its output file on `executor`, waiting for all."""
+    futures = [
+        executor.submit(
+            _render_to_file,
+            instrument,
+            str(output_file),
+            str(soundfont_path),
+            sample_rate,
+        )
+        for instrument, output_file in zip(instruments, output_files)
+    ]
+    return [future.result() for future in futures]
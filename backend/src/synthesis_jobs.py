@@ -0,0 +1,336 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Executor
+from typing import Dict, Optional
+
+from .audio_generator import AudioGenerator
+from .features_cens import CENSFeatures
+from .render_cache import RenderCache
+from .synth_pool import render_executor
+
+logger = logging.getLogger(__name__)
+
+
+def render_instruments(
+    cache: RenderCache,
+    score_path,
+    tempo: int,
+    soundfont_path,
+    sample_rate: int,
+    instrument_indices,
+):
+    """
+    Return the rendered audio path of each instrument, rendering only cache misses.
+
+    The score is only parsed if at least one instrument has to be rendered.
+    """
+    generator = None
+
+    def render(output_file, instrument_index):
+        nonlocal generator
+        if generator is None:
+            generator = AudioGenerator(score_path, soundfont_path=soundfont_path)
+        generator.generate_solo(
+            output_file,
+            tempo=tempo,
+            sample_rate=sample_rate,
+            instrument_index=instrument_index,
+        )
+
+    paths = []
+    for instrument_index in instrument_indices:
+        key = RenderCache.make_key(
+            score_path, tempo, soundfont_path, sample_rate, instrument_index
+        )
+        paths.append(
+            cache.get_or_render(
+                key, lambda output_file: render(output_file, instrument_index)
+            )
+        )
+    return paths
+
+
+def _render_job(
+    score_path, tempo, soundfont_path, sample_rate, cache_dir, cache_max_bytes
+):
+    """
+    Worker stage: render the reference (instrument 0) and accompaniment (instrument 1).
+
+    Returns their paths and the (hits, misses) of the worker's render cache lookups.
+    """
+    cache = RenderCache(cache_dir, cache_max_bytes)
+    paths = render_instruments(
+        cache, score_path, tempo, soundfont_path, sample_rate, (0, 1)
+    )
+    return paths, (cache.hits, cache.misses)
+
+
+def _extract_features_job(reference_path, sample_rate, win_length, hop_length):
+    """Worker stage: compute the reference features used by the score follower."""
+    return CENSFeatures.from_file(
+        filepath=str(reference_path),
+        sr=sample_rate,
+        win_len=win_length,
+        hop_len=hop_length,
+    )
+
+
+class SynthesisJob:
+    """
+    State of one asynchronous synthesis job.
+
+    Attributes
+    ----------
+    job_id : str
+        Unique identifier of the job.
+    session_token : str
+        Token of the session that submitted the job.
+    filename : str
+        Name of the score being synthesized.
+    tempo : int
+        Tempo of the rendered audio.
+    status : str
+        One of `QUEUED`, `RENDERING`, `EXTRACTING_FEATURES`, `DONE` or `FAILED`.
+    error : str or None
+        Error message if the job failed.
+    reference_path : Path or None
+        Rendered reference (soloist) audio, once rendering is done.
+    accompaniment_path : Path or None
+        Rendered accompaniment audio, once rendering is done.
+    ref_features : Features or None
+        Reference features for the score follower, once the job is done.
+    """
+
+    QUEUED = "queued"
+    RENDERING = "rendering"
+    EXTRACTING_FEATURES = "extracting_features"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = (QUEUED, RENDERING, EXTRACTING_FEATURES, DONE, FAILED)
+
+    def __init__(self, session_token: str, filename: str, tempo: int):
+        self.job_id = uuid.uuid4().hex
+        self.session_token = session_token
+        self.filename = filename
+        self.tempo = tempo
+
+        self.error = None
+        self.reference_path = None
+        self.accompaniment_path = None
+        self.ref_features = None
+
+        self.created_at = time.time()
+        self.finished_at = None
+
+        self._stage = self.RENDERING
+        self._future = None  # Future of the stage currently executing
+        self._changed = threading.Condition()
+
+    @property
+    def status(self) -> str:
+        with self._changed:
+            if self._stage == self.RENDERING and not (
+                self._future is not None and (self._future.running() or self._future.done())
+            ):
+                return self.QUEUED
+            return self._stage
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (self.DONE, self.FAILED)
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until the job changes stage or `timeout` expires. Return whether it finished."""
+        with self._changed:
+            if self._stage not in (self.DONE, self.FAILED):
+                self._changed.wait(timeout)
+        return self.finished
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "filename": self.filename,
+            "tempo": self.tempo,
+            "status": self.status,
+            "error": self.error,
+            "elapsed": (self.finished_at or time.time()) - self.created_at,
+        }
+
+    def _set_stage(self, stage: str, future=None, error: str = None):
+        with self._changed:
+            self._stage = stage
+            self._future = future
+            if error is not None:
+                self.error = error
+            if stage in (self.DONE, self.FAILED):
+                self.finished_at = time.time()
+            self._changed.notify_all()
+
+
+class SynthesisJobQueue:
+    """
+    Runs score rendering and reference feature extraction off the request thread.
+
+    Each job renders the solo and accompaniment tracks through the render cache and
+    then computes the reference features, both in a pool of worker processes, so a
+    request handler only has to submit the job and later build a `Synchronizer` from
+    the prepared features.
+
+    Parameters
+    ----------
+    cache_dir : Path or str
+        Directory of the render cache shared by the workers.
+    cache_max_bytes : int
+        Size budget of the render cache.
+    soundfont_path : Path or str
+        Soundfont used for rendering.
+    sample_rate : int
+        Sample rate of the rendered audio and reference features.
+    win_length : int
+        Window length of the reference features.
+    hop_length : int
+        Hop length of the reference features.
+    max_workers : int, optional
+        Number of worker processes (default: 2).
+    retention : float, optional
+        Seconds a finished job is kept before it is forgotten (default: 600).
+    executor : concurrent.futures.Executor, optional
+        Executor to run the jobs on instead of a new process pool.
+    feature_registry : FeatureRegistry, optional
+        Registry through which finished jobs share their reference features. Jobs
+        whose features are already registered skip feature extraction.
+    render_cache : RenderCache, optional
+        Render cache of this process, to which the cache lookups of the workers are
+        added so that its hit and miss counts cover every render.
+    """
+
+    def __init__(
+        self,
+        cache_dir,
+        cache_max_bytes: int,
+        soundfont_path,
+        sample_rate: int,
+        win_length: int,
+        hop_length: int,
+        max_workers: int = 2,
+        retention: float = 600,
+        executor: Executor = None,
+        feature_registry=None,
+        render_cache: RenderCache = None,
+    ):
+        self.cache_dir = str(cache_dir)
+        self.cache_max_bytes = cache_max_bytes
+        self.soundfont_path = str(soundfont_path)
+        self.sample_rate = sample_rate
+        self.win_length = win_length
+        self.hop_length = hop_length
+        self.retention = retention
+        self.feature_registry = feature_registry
+        self.render_cache = render_cache
+
+        if executor is None:
+            # Workers keep a synth with the soundfont loaded between jobs
+            executor = render_executor(soundfont_path, sample_rate, max_workers)
+        self.executor = executor
+
+        self._jobs: Dict[str, SynthesisJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, session_token: str, score_path, filename: str, tempo: int):
+        """Queue a synthesis job for `score_path` and return it."""
+        job = SynthesisJob(session_token, filename, tempo)
+        with self._lock:
+            self._expire()
+            self._jobs[job.job_id] = job
+
+        future = self.executor.submit(
+            _render_job,
+            str(score_path),
+            tempo,
+            self.soundfont_path,
+            self.sample_rate,
+            self.cache_dir,
+            self.cache_max_bytes,
+        )
+        job._set_stage(SynthesisJob.RENDERING, future)
+        future.add_done_callback(lambda f: self._on_rendered(job, f))
+        logger.info(f"Queued synthesis job {job.job_id} for {filename} at {tempo} BPM")
+        return job
+
+    def get(self, job_id: str) -> Optional[SynthesisJob]:
+        """Return the job with id `job_id`, or None if it is unknown or expired."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status_counts(self) -> Dict[str, int]:
+        """Return the number of known jobs in each status."""
+        counts = dict.fromkeys(SynthesisJob.STATUSES, 0)
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        return counts
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
+
+    def _on_rendered(self, job: SynthesisJob, future):
+        try:
+            (job.reference_path, job.accompaniment_path), lookups = future.result()
+            if self.render_cache is not None:
+                self.render_cache.record_lookups(*lookups)
+            if self.feature_registry is not None:
+                job.ref_features = self.feature_registry.peek(
+                    job.reference_path, self.sample_rate, self.win_length, self.hop_length
+                )
+                if job.ref_features is not None:
+                    self._done(job)
+                    return
+            features_future = self.executor.submit(
+                _extract_features_job,
+                str(job.reference_path),
+                self.sample_rate,
+                self.win_length,
+                self.hop_length,
+            )
+        except Exception as e:
+            self._fail(job, e)
+            return
+        job._set_stage(SynthesisJob.EXTRACTING_FEATURES, features_future)
+        features_future.add_done_callback(lambda f: self._on_features(job, f))
+
+    def _on_features(self, job: SynthesisJob, future):
+        try:
+            features = future.result()
+            if self.feature_registry is not None:
+                features = self.feature_registry.get(
+                    job.reference_path,
+                    self.sample_rate,
+                    self.win_length,
+                    self.hop_length,
+                    compute=lambda: features,
+                )
+            job.ref_features = features
+        except Exception as e:
+            self._fail(job, e)
+            return
+        self._done(job)
+
+    def _done(self, job: SynthesisJob):
+        job._set_stage(SynthesisJob.DONE)
+        logger.info(f"Synthesis job {job.job_id} done")
+
+    def _fail(self, job: SynthesisJob, error: Exception):
+        logger.error(f"Synthesis job {job.job_id} failed: {error!r}")
+        job._set_stage(SynthesisJob.FAILED, error=str(error) or type(error).__name__)
+
+    def _expire(self):
+        """Forget finished jobs older than the retention period. Caller holds the lock."""
+        cutoff = time.time() - self.retention
+        for job_id in [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]:
+            del self._jobs[job_id]
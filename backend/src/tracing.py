@@ -0,0 +1,244 @@
+"""
+Opt-in span tracing of the real-time hot paths, exportable as a Chrome trace.
+
+Instrumented code wraps its stages in `with tracing.span("otw.row"):`, or whole
+functions in `@tracing.traced(...)`. While the tracer is disabled (the default) a
+span is a shared no-op object, so the cost is a method call and an attribute check.
+While enabled, the start and end of each span are written into preallocated arrays
+used as a ring, keeping the most recent `capacity` spans without allocating per
+span. Garbage collections are recorded as spans as well, and every span keeps the
+id of its thread and the CPU time the thread spent in it: a span whose wall time is
+much longer than its CPU time was switched out, e.g. waiting for the GIL.
+
+The trace is exported in the Chrome trace event format, which Perfetto
+(https://ui.perfetto.dev) and chrome://tracing open directly.
+"""
+
+import functools
+import gc
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Number of spans kept by default, about 2 MB of arrays
+DEFAULT_CAPACITY = 1 << 16
+
+
+class _NullSpan:
+    """Span returned while tracing is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name_id", "start", "cpu_start")
+
+    def __init__(self, tracer: "Tracer", name_id: int):
+        self.tracer = tracer
+        self.name_id = name_id
+
+    def __enter__(self):
+        self.cpu_start = time.thread_time_ns()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter_ns()
+        cpu = time.thread_time_ns() - self.cpu_start
+        self.tracer.record(self.name_id, self.start, end, cpu)
+        return False
+
+
+class Tracer:
+    """
+    Records spans into a ring of preallocated arrays.
+
+    Parameters
+    ----------
+    capacity : int, optional
+        Number of most recent spans kept (default: DEFAULT_CAPACITY).
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.enabled = False
+        self._names: List[str] = []
+        self._name_ids: Dict[str, int] = {}
+        # Python thread ident -> (native thread id, thread name)
+        self._threads: Dict[int, Tuple[int, str]] = {}
+        self._names_lock = threading.Lock()
+        self._gc_start = None
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._name = np.zeros(capacity, dtype=np.int32)
+        # Arrays rather than a list of tuples, so that recording does not keep
+        # objects alive that would make the garbage collector run more often
+        self._start = np.zeros(capacity, dtype=np.int64)
+        self._end = np.zeros(capacity, dtype=np.int64)
+        self._cpu = np.zeros(capacity, dtype=np.int64)
+        self._thread = np.zeros(capacity, dtype=np.int64)
+        self._counter = itertools.count()  # next() is atomic under the GIL
+        self._recorded = 0
+
+    def enable(self, capacity: int = None):
+        """Start recording, reallocating the ring if `capacity` changes."""
+        if capacity is not None and capacity != self.capacity:
+            self._allocate(capacity)
+        if not self.enabled:
+            gc.callbacks.append(self._on_gc)
+            self.enabled = True
+
+    def disable(self):
+        """Stop recording. Recorded spans are kept until `clear` or `enable`."""
+        if self.enabled:
+            self.enabled = False
+            gc.callbacks.remove(self._on_gc)
+
+    def clear(self):
+        """Discard the recorded spans."""
+        self._allocate(self.capacity)
+
+    def __len__(self) -> int:
+        return min(self._recorded, self.capacity)
+
+    def span(self, name: str):
+        """
+        Return a context manager recording the `with` block as a span named `name`.
+
+        Names are dotted, e.g. `otw.row`; the part before the first dot is used as
+        the category of the span.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = self._intern(name)
+        return _Span(self, name_id)
+
+    def traced(self, name: str):
+        """Decorator recording every call of the decorated function as a span."""
+
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def _intern(self, name: str) -> int:
+        with self._names_lock:
+            if name not in self._name_ids:
+                self._name_ids[name] = len(self._names)
+                self._names.append(name)
+            return self._name_ids[name]
+
+    def record(self, name_id: int, start: int, end: int, cpu: int):
+        """Write one span, with times in nanoseconds of `time.perf_counter_ns`."""
+        index = next(self._counter)
+        slot = index % self.capacity
+        # get_ident avoids the system call of get_native_id on every span
+        thread = self._threads.get(threading.get_ident())
+        if thread is None:
+            thread = (threading.get_native_id(), threading.current_thread().name)
+            self._threads[threading.get_ident()] = thread
+        self._name[slot] = name_id
+        self._start[slot] = start
+        self._end[slot] = end
+        self._cpu[slot] = cpu
+        self._thread[slot] = thread[0]
+        self._recorded = max(self._recorded, index + 1)
+
+    def _on_gc(self, phase: str, info: dict):
+        # Collections run with the GIL held and do not nest, one at a time
+        if phase == "start":
+            self._gc_start = (time.perf_counter_ns(), time.thread_time_ns())
+        elif self._gc_start is not None:
+            start, cpu_start = self._gc_start
+            self._gc_start = None
+            name_id = self._intern(f"gc.gen{info['generation']}")
+            self.record(
+                name_id, start, time.perf_counter_ns(), time.thread_time_ns() - cpu_start
+            )
+
+    def spans(self) -> List[dict]:
+        """
+        Return the recorded spans, oldest first.
+
+        Each span is a dict with its `name`, `thread` id and `start`, `end` and `cpu`
+        times in nanoseconds. Spans still being written by other threads may be torn.
+        """
+        recorded = self._recorded
+        count = min(recorded, self.capacity)
+        order = (np.arange(recorded - count, recorded) % self.capacity).tolist()
+        return [
+            {
+                "name": self._names[self._name[slot]],
+                "thread": int(self._thread[slot]),
+                "start": int(self._start[slot]),
+                "end": int(self._end[slot]),
+                "cpu": int(self._cpu[slot]),
+            }
+            for slot in order
+        ]
+
+    def chrome_trace(self) -> dict:
+        """Return the recorded spans in the Chrome trace event format."""
+        pid = os.getpid()
+        events = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": thread,
+                "args": {"name": name},
+            }
+            for thread, name in list(self._threads.values())
+        ]
+        for span in self.spans():
+            events.append(
+                {
+                    "name": span["name"],
+                    "cat": span["name"].split(".", 1)[0],
+                    "ph": "X",
+                    "ts": span["start"] / 1000,
+                    "dur": (span["end"] - span["start"]) / 1000,
+                    "pid": pid,
+                    "tid": span["thread"],
+                    "args": {"cpu_us": span["cpu"] / 1000},
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path: str):
+        """Write the Chrome trace to `path`, to be opened in Perfetto."""
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+# Tracer of the process, used by the instrumented modules
+TRACER = Tracer()
+span = TRACER.span
+traced = TRACER.traced
+enable = TRACER.enable
+disable = TRACER.disable
+export_chrome_trace = TRACER.export_chrome_trace
@@ -0,0 +1,255 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Executor, as_completed
+from typing import List, Tuple
+
+from .feature_registry import FeatureRegistry
+from .render_cache import RenderCache
+from .synth_pool import render_executor
+from .synthesis_jobs import render_instruments
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_item(
+    score_path,
+    tempo,
+    soundfont_path,
+    sample_rate,
+    win_length,
+    hop_length,
+    render_cache_dir,
+    render_cache_max_bytes,
+    feature_cache_dir,
+):
+    """
+    Worker: render both instruments of one score and cache the reference features.
+
+    Returns the (hits, misses) of the worker's render cache lookups.
+    """
+    cache = RenderCache(render_cache_dir, render_cache_max_bytes)
+    reference, _ = render_instruments(
+        cache, score_path, tempo, soundfont_path, sample_rate, (0, 1)
+    )
+    FeatureRegistry(cache_dir=feature_cache_dir).get(
+        reference, sample_rate, win_length, hop_length
+    )
+    return cache.hits, cache.misses
+
+
+class Warmup:
+    """
+    Background task that prepares the reference assets of every score.
+
+    Renders each MusicXML score in `musicxml_dir` at each of `tempos` into the render
+    cache and stores the reference features in the feature registry's on-disk cache,
+    so the first session for a score does not pay for conversion, rendering and
+    feature extraction. Both caches are keyed by content hashes, so a score and tempo
+    whose assets are already cached is skipped and an interrupted warm-up resumes
+    where it stopped.
+
+    Parameters
+    ----------
+    musicxml_dir : Path or str
+        Directory scanned for `.musicxml` files.
+    tempos : List[int]
+        Tempos at which every score is rendered.
+    render_cache : RenderCache
+        Cache for the rendered audio.
+    feature_registry : FeatureRegistry
+        Registry whose `cache_dir` receives the reference features.
+    soundfont_path : Path or str
+        Soundfont used for rendering.
+    sample_rate : int
+        Sample rate of the rendered audio and reference features.
+    win_length : int
+        Window length of the reference features.
+    hop_length : int
+        Hop length of the reference features.
+    max_workers : int, optional
+        Number of worker processes (default: 1).
+    executor : concurrent.futures.Executor, optional
+        Executor to run the work on instead of a new process pool.
+    """
+
+    IDLE = "idle"
+    RUNNING = "running"
+    DONE = "done"
+
+    def __init__(
+        self,
+        musicxml_dir,
+        tempos: List[int],
+        render_cache: RenderCache,
+        feature_registry: FeatureRegistry,
+        soundfont_path,
+        sample_rate: int,
+        win_length: int,
+        hop_length: int,
+        max_workers: int = 1,
+        executor: Executor = None,
+    ):
+        if feature_registry.cache_dir is None:
+            raise ValueError("Warm-up needs a feature registry with a cache_dir")
+
+        self.musicxml_dir = musicxml_dir
+        self.tempos = list(tempos)
+        self.render_cache = render_cache
+        self.feature_registry = feature_registry
+        self.soundfont_path = str(soundfont_path)
+        self.sample_rate = sample_rate
+        self.win_length = win_length
+        self.hop_length = hop_length
+        self.max_workers = max_workers
+        self.executor = executor
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._reset(self.IDLE)
+
+    def plan(self) -> List[Tuple[str, int]]:
+        """Return the (score path, tempo) pairs to warm up."""
+        scores = sorted(
+            f for f in os.listdir(self.musicxml_dir) if f.endswith(".musicxml")
+        )
+        return [
+            (os.path.join(self.musicxml_dir, score), tempo)
+            for score in scores
+            for tempo in self.tempos
+        ]
+
+    def is_up_to_date(self, score_path, tempo: int) -> bool:
+        """Return whether the rendered audio and reference features of a score are cached."""
+        paths = []
+        for instrument_index in (0, 1):
+            key = RenderCache.make_key(
+                score_path, tempo, self.soundfont_path, self.sample_rate, instrument_index
+            )
+            path = self.render_cache.path_for(key)
+            if not path.exists():
+                return False
+            paths.append(path)
+        return self.feature_registry.is_cached(
+            paths[0], self.sample_rate, self.win_length, self.hop_length
+        )
+
+    def start(self) -> bool:
+        """Start warming up in a background thread. Return False if it is already running."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._reset(self.RUNNING)
+            self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+            self._thread.start()
+            return True
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait for a running warm-up to finish. Return whether it is finished."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def progress(self) -> dict:
+        """Return the status and counters of the current or last warm-up."""
+        with self._lock:
+            finished = self._finished_at or time.time()
+            return {
+                "status": self._status,
+                "total": self._total,
+                "completed": self._completed,
+                "skipped": self._skipped,
+                "failed": len(self._errors),
+                "errors": list(self._errors),
+                "elapsed": finished - self._started_at if self._started_at else 0.0,
+            }
+
+    def _reset(self, status: str):
+        self._status = status
+        self._total = 0
+        self._completed = 0
+        self._skipped = 0
+        self._errors = []
+        self._started_at = time.time() if status == self.RUNNING else None
+        self._finished_at = None
+
+    def _run(self):
+        try:
+            plan = self.plan()
+            with self._lock:
+                self._total = len(plan)
+            pending = []
+            for score_path, tempo in plan:
+                try:
+                    up_to_date = self.is_up_to_date(score_path, tempo)
+                except OSError as e:
+                    self._record_error(score_path, tempo, e)
+                    continue
+                if up_to_date:
+                    with self._lock:
+                        self._skipped += 1
+                else:
+                    pending.append((score_path, tempo))
+            logger.info(
+                f"Warm-up: {len(pending)} of {len(plan)} score/tempo pairs need rendering"
+            )
+            if pending:
+                self._warm(pending)
+        except Exception:
+            logger.exception("Warm-up failed")
+        finally:
+            with self._lock:
+                self._status = self.DONE
+                self._finished_at = time.time()
+            logger.info(f"Warm-up finished: {self.progress()}")
+
+    def _warm(self, pending):
+        executor = self.executor
+        own_executor = executor is None
+        if own_executor:
+            executor = render_executor(
+                self.soundfont_path, self.sample_rate, self.max_workers
+            )
+        try:
+            futures = {
+                executor.submit(
+                    _warm_item,
+                    score_path,
+                    tempo,
+                    self.soundfont_path,
+                    self.sample_rate,
+                    self.win_length,
+                    self.hop_length,
+                    str(self.render_cache.cache_dir),
+                    self.render_cache.max_bytes,
+                    str(self.feature_registry.cache_dir),
+                ): (score_path, tempo)
+                for score_path, tempo in pending
+            }
+            for future in as_completed(futures):
+                score_path, tempo = futures[future]
+                try:
+                    lookups = future.result()
+                except Exception as e:
+                    self._record_error(score_path, tempo, e)
+                else:
+                    self.render_cache.record_lookups(*lookups)
+                    with self._lock:
+                        self._completed += 1
+        finally:
+            if own_executor:
+                executor.shutdown()
+
+    def _record_error(self, score_path, tempo, error: Exception):
+        logger.error(f"Warm-up of {score_path} at {tempo} BPM failed: {error!r}")
+        with self._lock:
+            self._errors.append(
+                {
+                    "score": os.path.basename(score_path),
+                    "tempo": tempo,
+                    "error": str(error) or type(error).__name__,
+                }
+            )
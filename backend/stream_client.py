@@ -0,0 +1,99 @@
+"""
+Local test client for the /stream WebSocket endpoint.
+
+Starts a session, synthesizes a score, then streams a WAV file to the server in
+fixed-size chunks and reports the round-trip latency of each synchronization
+update. Run the Flask server (python app.py) first.
+
+Example:
+    python stream_client.py --score ode_to_joy_baseline.musicxml --tempo 100 \
+        --audio data/audio/ode_to_joy_baseline/instrument_0.wav
+"""
+
+import argparse
+import json
+import struct
+from time import perf_counter, sleep
+
+import librosa
+import numpy as np
+import requests
+import simple_websocket
+
+STREAM_TIMESTAMP = struct.Struct("<d")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--score", required=True, help="MusicXML file name on the server")
+    parser.add_argument("--tempo", type=int, default=100)
+    parser.add_argument("--audio", required=True, help="WAV file to stream as the soloist")
+    parser.add_argument("--chunk", type=int, default=2048, help="Samples per message")
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument(
+        "--realtime", action="store_true", help="Pace chunks at the audio rate"
+    )
+    args = parser.parse_args()
+
+    session_token = requests.post(f"{args.url}/start-session").json()["session_token"]
+    headers = {"session-token": session_token}
+
+    response = requests.get(
+        f"{args.url}/synthesize-audio/{args.score}/{args.tempo}", headers=headers
+    )
+    response.raise_for_status()
+
+    audio, _ = librosa.load(args.audio, sr=args.sample_rate, mono=True)
+    audio = audio.astype("<f4")
+
+    ws_url = args.url.replace("http", "ws", 1) + f"/stream?session_token={session_token}"
+    ws = simple_websocket.Client.connect(ws_url)
+
+    chunk_duration = args.chunk / args.sample_rate
+    accompanist_time = 0.0
+    latencies = []
+    start = perf_counter()
+
+    try:
+        for i in range(0, audio.shape[-1], args.chunk):
+            if args.realtime:
+                sleep(max(0.0, start + i / args.sample_rate - perf_counter()))
+
+            message = STREAM_TIMESTAMP.pack(accompanist_time) + audio[
+                i : i + args.chunk
+            ].tobytes()
+
+            sent = perf_counter()
+            ws.send(message)
+            reply = json.loads(ws.receive())
+            latencies.append(perf_counter() - sent)
+
+            if "error" in reply:
+                print(f"Error: {reply['error']}")
+                break
+
+            accompanist_time += reply["playback_rate"] * chunk_duration
+            print(
+                f"Soloist time: {i / args.sample_rate:.2f}, "
+                f"Estimated time: {reply['estimated_position']:.2f}, "
+                f"Playback rate: {reply['playback_rate']:.2f}, "
+                f"Round trip: {latencies[-1] * 1000:.1f} ms"
+            )
+    finally:
+        ws.close()
+        requests.post(f"{args.url}/stop-session", headers=headers)
+
+    if latencies:
+        latencies_ms = np.array(latencies) * 1000
+        print(
+            f"\n{len(latencies_ms)} chunks of {chunk_duration * 1000:.1f} ms: "
+            f"p50 {np.percentile(latencies_ms, 50):.1f} ms, "
+            f"p95 {np.percentile(latencies_ms, 95):.1f} ms, "
+            f"p99 {np.percentile(latencies_ms, 99):.1f} ms, "
+            f"max {latencies_ms.max():.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()